@@ -1,15 +1,30 @@
 import streamlit as st
-from elasticsearch import Elasticsearch
 import math
+import html
 import os
 from streamlit_pdf_viewer import pdf_viewer
+import busca
+import busca_local
+from instrumentacao import iniciar_servidor, medir
+from recursos import (
+    obter_backend, obter_modelo_embeddings, obter_cache_resultados, embedding_consulta,
+    obter_gerador_sob_demanda, opcoes_vetores
+)
 
 # Configurações
-INDEX = "documentos_ifal_llm"
-ES_URL = "http://localhost:9200"
+INDEX = busca.INDEX
 RESULTS_PER_PAGE = 10
+
+# Com IFAL_BACKEND=local, a busca usa o índice local em vez do Elasticsearch
+if busca_local.usar_indice_local():
+    ResultadoBusca, carregar_documento = busca_local.ResultadoLocal, busca_local.carregar_documento
+else:
+    ResultadoBusca, carregar_documento = busca.ResultadoPaginado, busca.carregar_documento
 PDF_BASE_PATH = "documentos/pdfs/"
 
+# Endpoint /metrics (com IFAL_INSTRUMENTACAO_PORTA); só sobe na primeira execução do script
+iniciar_servidor()
+
 # Título do app
 st.set_page_config(page_title="Busca IFAL", layout="wide")
 st.title("Documentos IFAL")
@@ -32,13 +47,14 @@ if 'termo_busca' not in st.session_state:
 # =============================================
 
 def conectar_elasticsearch():
-    """Conecta ao Elasticsearch"""
+    """Obtém o cliente Elasticsearch (ou o índice local) compartilhado pelo processo"""
     try:
-        es = Elasticsearch(ES_URL)
-        es.info()
-        return es
+        return obter_backend()
     except Exception as e:
-        st.error(f"❌ Erro ao conectar com Elasticsearch: {e}")
+        if busca_local.usar_indice_local():
+            st.error(f"❌ Erro ao abrir o índice local: {e}")
+        else:
+            st.error(f"❌ Erro ao conectar com Elasticsearch: {e}")
         return None
 
 def mostrar_pdf_com_viewer(nome_arquivo):
@@ -64,86 +80,108 @@ def extrair_nome_pdf(arquivo_nome):
     else:
         return f"{arquivo_nome}.pdf"
 
-def busca_unificada(termo, pagina=1, tamanho_pagina=10):
-    """Busca unificada (full-text + semântica)"""
+def formatar_destaque(destaque):
+    """Escapa o trecho destacado, preservando só as marcações do Elasticsearch"""
+    return (
+        html.escape(destaque)
+        .replace("&lt;mark&gt;", "<mark>")
+        .replace("&lt;/mark&gt;", "</mark>")
+    )
+
+def congelar_filtros(filtros):
+    """Converte os filtros em algo que possa ser usado como chave de cache"""
+    return tuple(
+        (campo, tuple(sorted(valor)) if isinstance(valor, (list, tuple, set)) else valor)
+        for campo, valor in sorted((filtros or {}).items())
+    )
+
+def mostrar_ementa_sob_demanda(doc_id, local, acompanhamentos):
+    """Oferece gerar a ementa agora e reserva o espaço do texto em geração.
+    
+    A geração não é acompanhada aqui, senão o resto da página esperaria o
+    modelo: o espaço e a tarefa vão para ``acompanhamentos``, e
+    ``acompanhar_ementas`` os preenche depois que a página foi desenhada.
+    """
+    try:
+        gerador = obter_gerador_sob_demanda()
+    except Exception:
+        st.info("⏳ Ementa em processamento...")
+        return
+    
+    tarefa = gerador.tarefa(doc_id)
+    if tarefa is None or tarefa.estado == "erro":
+        if tarefa is not None:
+            st.error(f"❌ Não foi possível gerar a ementa: {tarefa.erro}")
+        else:
+            st.caption("⏳ Ementa ainda não gerada para este documento.")
+        if not st.button("✨ Gerar ementa agora", key=f"gerar_{local}_{doc_id}"):
+            return
+        tarefa = gerador.solicitar(doc_id)
+        if tarefa is None:
+            st.warning("⚠️ Muitas ementas sendo geradas agora. Tente novamente em instantes.")
+            return
+    
+    if not tarefa.concluida:
+        if tarefa.estado == "na_fila":
+            st.caption("⏳ Aguardando na fila...")
+        acompanhamentos.append((st.empty(), tarefa))
+        return
+    
+    mostrar_ementa_gerada(tarefa)
+
+def mostrar_ementa_gerada(tarefa):
+    if tarefa.estado == "erro":
+        st.error(f"❌ Não foi possível gerar a ementa: {tarefa.erro}")
+    else:
+        st.markdown(tarefa.ementa.replace("\n", "  \n"))
+
+def acompanhar_ementas(acompanhamentos):
+    """Mostra o texto das ementas em geração, uma de cada vez, nos espaços reservados"""
+    for espaco, tarefa in acompanhamentos:
+        with espaco.container():
+            st.write_stream(tarefa.acompanhar())
+        with espaco.container():
+            mostrar_ementa_gerada(tarefa)
+
+def busca_unificada(termo, pagina=1, tamanho_pagina=10, filtros=None):
+    """Busca unificada (full-text + semântica) em uma única requisição.
+    
+    O conjunto de resultados fica em cache (por termo e filtros) e é
+    compartilhado entre páginas, reexecuções e sessões.
+    """
     if not es:
         return [], 0
     
     try:
-        # Primeiro: busca textual (sempre funciona)
-        query_textual = {
-            "size": tamanho_pagina,
-            "from": (pagina - 1) * tamanho_pagina,
-            "query": {
-                "multi_match": {
-                    "query": termo,
-                    "fields": ["conteudo", "arquivo", "ementa"],
-                    "fuzziness": "AUTO"
-                }
-            },
-            "_source": ["arquivo", "conteudo", "ementa", "tem_ementa"]
-        }
+        cache = obter_cache_resultados()
+        with medir("busca_unificada"):
+            chave = (" ".join(termo.split()), congelar_filtros(filtros))
         
-        # Tenta busca semântica se disponível
-        try:
-            from sentence_transformers import SentenceTransformer
-            embedder = SentenceTransformer("all-MiniLM-L6-v2")
-            emb = embedder.encode(termo).tolist()
+            # Tenta busca híbrida (BM25 + kNN) se disponível
+            try:
+                resultado = cache.obter_ou_criar(
+                    chave + ("hibrida",),
+                    lambda: ResultadoBusca(es, termo, embedding_consulta(termo), filtros,
+                                           **opcoes_vetores())
+                )
             
-            # Query semântica separada
-            query_semantica = {
-                "size": tamanho_pagina,
-                "from": (pagina - 1) * tamanho_pagina,
-                "query": {
-                    "script_score": {
-                        "query": {"match_all": {}},
-                        "script": {
-                            "source": "knn_score",
-                            "lang": "knn",
-                            "params": {
-                                "field": "embedding",
-                                "query_value": emb,
-                                "space_type": "cosinesimil"
-                            }
-                        }
-                    }
-                },
-                "_source": ["arquivo", "conteudo", "ementa", "tem_ementa"]
-            }
+            except ImportError:
+                # Fallback: apenas busca textual
+                st.info("🔍 Buscando apenas por texto (semântica desativada)")
+                resultado = cache.obter_ou_criar(
+                    chave + ("textual",),
+                    lambda: ResultadoBusca(es, termo, None, filtros)
+                )
             
-            # Executa ambas as buscas
-            resultado_textual = es.search(index=INDEX, body=query_textual)
-            resultado_semantica = es.search(index=INDEX, body=query_semantica)
-            
-            # Combina resultados (remove duplicatas)
-            documentos_textual = resultado_textual['hits']['hits']
-            documentos_semantica = resultado_semantica['hits']['hits']
-            
-            # Junta e remove duplicatas por _id
-            todos_documentos = {}
-            for doc in documentos_textual + documentos_semantica:
-                todos_documentos[doc['_id']] = doc
-            
-            documentos = list(todos_documentos.values())
-            total = len(documentos)
-            
-            return documentos, total
-            
-        except ImportError:
-            # Fallback: apenas busca textual
-            st.info("🔍 Buscando apenas por texto (semântica desativada)")
-            resultado = es.search(index=INDEX, body=query_textual)
-            total = resultado['hits']['total']['value']
-            documentos = resultado['hits']['hits']
-            return documentos, total
-            
-        except Exception as e_semantica:
-            # Se houver erro na semântica, usa apenas textual
-            st.warning(f"⚠️ Busca semântica temporariamente indisponível")
-            resultado = es.search(index=INDEX, body=query_textual)
-            total = resultado['hits']['total']['value']
-            documentos = resultado['hits']['hits']
-            return documentos, total
+            except Exception as e_semantica:
+                # Se houver erro na semântica, usa apenas textual
+                st.warning(f"⚠️ Busca semântica temporariamente indisponível")
+                resultado = cache.obter_ou_criar(
+                    chave + ("textual",),
+                    lambda: ResultadoBusca(es, termo, None, filtros)
+                )
+        
+            return resultado.pagina(pagina, tamanho_pagina), resultado.total
         
     except Exception as e:
         st.error(f"Erro na busca: {e}")
@@ -155,6 +193,12 @@ def busca_unificada(termo, pagina=1, tamanho_pagina=10):
 
 es = conectar_elasticsearch()
 
+# Carrega e aquece o modelo de embeddings antes da primeira busca
+try:
+    obter_modelo_embeddings()
+except ImportError:
+    pass
+
 # =============================================
 # INTERFACE DE BUSCA
 # =============================================
@@ -223,6 +267,9 @@ if st.session_state.resultados:
 # LISTA DE RESULTADOS
 # =============================================
 
+# Ementas em geração, acompanhadas só no fim da página
+acompanhamentos = []
+
 if st.session_state.resultados:
     st.markdown("## 📄 Documentos Encontrados")
     
@@ -235,7 +282,7 @@ if st.session_state.resultados:
     
     for i, doc in enumerate(documentos_pagina):
         arquivo = doc['_source']['arquivo']
-        conteudo = doc['_source']['conteudo']
+        destaques = doc.get('highlight', {}).get('conteudo', [])
         ementa = doc['_source'].get('ementa', '')
         tem_ementa = doc['_source'].get('tem_ementa', False)
         
@@ -253,17 +300,19 @@ if st.session_state.resultados:
                     </div>
                     """, unsafe_allow_html=True)
             else:
-                st.info("⏳ Ementa em processamento...")
+                with st.expander("📋 **EMENTA**", expanded=False):
+                    mostrar_ementa_sob_demanda(doc['_id'], "lista", acompanhamentos)
             
-            # Preview do conteúdo
-            #preview = conteudo[:500] + "..." if len(conteudo) > 500 else conteudo
-            #st.write(preview)
+            # Trechos em que o termo aparece (destacados pelo Elasticsearch)
+            for destaque in destaques:
+                st.markdown(f"… {formatar_destaque(destaque)} …", unsafe_allow_html=True)
             
             # Botão para ver documento completo
             col_btn1, col_btn2 = st.columns([1, 4])
             with col_btn1:
                 if st.button("📖 Ver Documento Completo", key=f"ver_{doc['_id']}", use_container_width=True):
-                    st.session_state.doc_selecionado = doc
+                    # Guarda só o ID; o conteúdo é carregado ao abrir o documento
+                    st.session_state.doc_selecionado = doc['_id']
                     st.rerun()
             
             st.markdown("---")
@@ -272,8 +321,15 @@ if st.session_state.resultados:
 # PÁGINA DO DOCUMENTO INDIVIDUAL
 # =============================================
 
-if st.session_state.doc_selecionado:
-    doc = st.session_state.doc_selecionado
+doc = None
+if st.session_state.doc_selecionado and es:
+    try:
+        doc = carregar_documento(es, st.session_state.doc_selecionado)
+    except Exception as e:
+        st.error(f"❌ Não foi possível carregar o documento: {e}")
+        st.session_state.doc_selecionado = None
+
+if doc:
     arquivo = doc['_source']['arquivo']
     conteudo = doc['_source']['conteudo']
     ementa = doc['_source'].get('ementa', '')
@@ -298,7 +354,8 @@ if st.session_state.doc_selecionado:
             </div>
             """, unsafe_allow_html=True)
     else:
-        st.warning("ℹ️ Ementa não disponível para este documento")
+        with st.expander("📋 **EMENTA**", expanded=True):
+            mostrar_ementa_sob_demanda(st.session_state.doc_selecionado, "documento", acompanhamentos)
     
     
     # Extrair nome do arquivo PDF
@@ -317,4 +374,7 @@ st.markdown("""
 <strong>Sistema de Busca de Documentos IFAL</strong><br>
 Busca unificada: textual + semântica • Ementas 
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# Com a página inteira já desenhada, acompanha as ementas em geração
+acompanhar_ementas(acompanhamentos)
\ No newline at end of file
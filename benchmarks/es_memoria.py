@@ -0,0 +1,520 @@
+import json
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from elasticsearch import NotFoundError
+from elasticsearch.serializer import JsonSerializer
+
+# =====================================================
+# 🧪 ELASTICSEARCH EM MEMÓRIA PARA OS BENCHMARKS
+# =====================================================
+# Implementa só o que o projeto usa do cliente: _bulk, get/update, count,
+# busca BM25 (multi_match, bool, term/terms/ids/range), kNN sobre o campo
+# nested dos trechos, fusão RRF ou ponderada, destaque, point-in-time com
+# search_after e o _meta do mapeamento. Não tenta reproduzir as notas do
+# Elasticsearch, só o formato das respostas e uma ordem de custo parecida.
+
+PADRAO_PALAVRA = re.compile(r"\w+", re.UNICODE)
+
+# Campos de texto indexados pelo BM25 simplificado
+CAMPOS_TEXTO = ("conteudo", "arquivo", "ementa")
+
+# Parâmetros do BM25
+K1 = 1.2
+B = 0.75
+
+
+def _termos(texto) -> List[str]:
+    return PADRAO_PALAVRA.findall(str(texto).lower())
+
+
+class _Resposta(dict):
+    """Dicionário com ``.body``, como as respostas do cliente oficial"""
+
+    @property
+    def body(self):
+        return self
+
+
+def _nao_encontrado(mensagem: str):
+    return NotFoundError(mensagem, meta=None, body={"error": mensagem})
+
+
+class _Indice:
+    def __init__(self, mapeamento: Dict):
+        self.mapeamento = mapeamento
+        self.configuracoes = {}
+        self.documentos: "OrderedDict[str, Dict]" = OrderedDict()
+        # Ordem de chegada, usada como desempate (o _shard_doc do PIT)
+        self.sequencia: Dict[str, int] = {}
+        self._proxima_sequencia = 0
+
+        # BM25: termo -> {doc_id: frequência} e tamanho de cada documento
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.tamanhos: Dict[str, int] = {}
+
+        # kNN: matriz de todos os trechos, reconstruída quando o índice muda
+        self._vetores = None
+        self._donos = None
+        self._vetores_sujos = True
+
+    def guardar(self, doc_id: str, fonte: Dict):
+        self.remover(doc_id)
+        # Vetores em float32: listas de floats do Python ocupariam 6x mais
+        for trecho in fonte.get("trechos") or []:
+            if "embedding" in trecho:
+                trecho["embedding"] = np.asarray(trecho["embedding"], dtype=np.float32)
+        if "embedding" in fonte:
+            fonte["embedding"] = np.asarray(fonte["embedding"], dtype=np.float32)
+        self.documentos[doc_id] = fonte
+        self.sequencia[doc_id] = self._proxima_sequencia
+        self._proxima_sequencia += 1
+
+        frequencias = Counter()
+        for campo in CAMPOS_TEXTO:
+            frequencias.update(_termos(fonte.get(campo, "")))
+        for termo, frequencia in frequencias.items():
+            self.postings.setdefault(termo, {})[doc_id] = frequencia
+        self.tamanhos[doc_id] = sum(frequencias.values())
+        self._vetores_sujos = True
+
+    def remover(self, doc_id: str) -> bool:
+        fonte = self.documentos.pop(doc_id, None)
+        if fonte is None:
+            return False
+        for campo in CAMPOS_TEXTO:
+            for termo in set(_termos(fonte.get(campo, ""))):
+                self.postings.get(termo, {}).pop(doc_id, None)
+        self.tamanhos.pop(doc_id, None)
+        self.sequencia.pop(doc_id, None)
+        self._vetores_sujos = True
+        return True
+
+    def matriz_trechos(self):
+        if self._vetores_sujos:
+            vetores, donos = [], []
+            for doc_id, fonte in self.documentos.items():
+                for trecho in fonte.get("trechos") or []:
+                    if "embedding" in trecho:
+                        vetores.append(trecho["embedding"])
+                        donos.append(doc_id)
+            if vetores:
+                matriz = np.stack(vetores)
+                matriz /= np.maximum(np.linalg.norm(matriz, axis=1, keepdims=True), 1e-12)
+            else:
+                matriz = np.zeros((0, 0), dtype=np.float32)
+            self._vetores, self._donos = matriz, np.asarray(donos, dtype=object)
+            self._vetores_sujos = False
+        return self._vetores, self._donos
+
+    def bm25(self, consulta: str) -> Dict[str, float]:
+        n = len(self.documentos) or 1
+        media = (sum(self.tamanhos.values()) / n) or 1.0
+        notas: Dict[str, float] = {}
+        for termo in set(_termos(consulta)):
+            postings = self.postings.get(termo)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequencia in postings.items():
+                normalizacao = K1 * (1 - B + B * self.tamanhos[doc_id] / media)
+                notas[doc_id] = notas.get(doc_id, 0.0) + idf * frequencia * (K1 + 1) / (frequencia + normalizacao)
+        return notas
+
+
+class _IndicesMemoria:
+    def __init__(self, es: "ElasticsearchMemoria"):
+        self._es = es
+
+    def exists(self, index: str) -> bool:
+        return index in self._es._indices
+
+    def create(self, index: str, body: Dict = None, mappings: Dict = None, **_):
+        mapeamento = (body or {}).get("mappings") or mappings or {}
+        self._es._indices[index] = _Indice(json.loads(json.dumps(mapeamento)))
+        return _Resposta(acknowledged=True, index=index)
+
+    def delete(self, index: str, **_):
+        if self._es._indices.pop(index, None) is None:
+            raise _nao_encontrado(f"no such index [{index}]")
+        return _Resposta(acknowledged=True)
+
+    def get_mapping(self, index: str, **_):
+        return _Resposta({index: {"mappings": self._es._indice(index).mapeamento}})
+
+    def put_mapping(self, index: str, meta: Dict = None, properties: Dict = None, **_):
+        mapeamento = self._es._indice(index).mapeamento
+        if meta is not None:
+            mapeamento["_meta"] = dict(meta)
+        if properties:
+            mapeamento.setdefault("properties", {}).update(properties)
+        return _Resposta(acknowledged=True)
+
+    def get_settings(self, index: str, **_):
+        return _Resposta({index: {"settings": dict(self._es._indice(index).configuracoes)}})
+
+    def put_settings(self, index: str, settings: Dict, **_):
+        for chave, valor in settings.get("index", settings).items():
+            self._es._indice(index).configuracoes[f"index.{chave}"] = valor
+        return _Resposta(acknowledged=True)
+
+    def refresh(self, index: str = None, **_):
+        return _Resposta(_shards={"failed": 0})
+
+    def forcemerge(self, index: str = None, **_):
+        return _Resposta(_shards={"failed": 0})
+
+
+class ElasticsearchMemoria:
+    """Substituto em processo do cliente ``Elasticsearch`` para medições"""
+
+    def __init__(self):
+        self._indices: Dict[str, _Indice] = {}
+        self._pits: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self.indices = _IndicesMemoria(self)
+
+        serializador = JsonSerializer()
+        self.transport = type("Transporte", (), {})()
+        self.transport.serializers = type("Serializadores", (), {"get_serializer": lambda _, tipo: serializador})()
+
+    # ---------------------------------------------
+    # Cliente
+    # ---------------------------------------------
+
+    def options(self, **_):
+        return self
+
+    def info(self):
+        return _Resposta(version={"number": "8.11.0-memoria"})
+
+    def _indice(self, index: str) -> _Indice:
+        if index not in self._indices:
+            raise _nao_encontrado(f"no such index [{index}]")
+        return self._indices[index]
+
+    def bulk(self, operations: List, **_):
+        linhas = [json.loads(linha) if isinstance(linha, (str, bytes)) else linha for linha in operations]
+        itens = []
+        with self._lock:
+            i = 0
+            while i < len(linhas):
+                operacao, meta = next(iter(linhas[i].items()))
+                indice = self._indices.setdefault(meta["_index"], _Indice({}))
+                doc_id = meta.get("_id")
+                if operacao == "delete":
+                    status = 200 if indice.remover(doc_id) else 404
+                    i += 1
+                elif operacao == "update":
+                    parcial = linhas[i + 1].get("doc", {})
+                    if doc_id in indice.documentos:
+                        indice.guardar(doc_id, {**indice.documentos[doc_id], **parcial})
+                        status = 200
+                    else:
+                        status = 404
+                    i += 2
+                else:
+                    status = 200 if doc_id in indice.documentos else 201
+                    indice.guardar(doc_id, linhas[i + 1])
+                    i += 2
+                itens.append({operacao: {"_index": meta["_index"], "_id": doc_id, "status": status}})
+        erros = any(item[next(iter(item))]["status"] >= 300 for item in itens)
+        return _Resposta(took=0, errors=erros, items=itens)
+
+    def get(self, index: str, id: str, source_includes: List[str] = None, **_):
+        with self._lock:
+            fonte = self._indice(index).documentos.get(id)
+        if fonte is None:
+            raise _nao_encontrado(f"document [{id}] missing")
+        return _Resposta(_index=index, _id=id, found=True, _source=_filtrar_fonte(fonte, source_includes))
+
+    def update(self, index: str, id: str, doc: Dict, **_):
+        with self._lock:
+            indice = self._indice(index)
+            if id not in indice.documentos:
+                raise _nao_encontrado(f"document [{id}] missing")
+            indice.guardar(id, {**indice.documentos[id], **doc})
+        return _Resposta(result="updated")
+
+    def count(self, index: str, query: Dict = None, **_):
+        with self._lock:
+            return _Resposta(count=len(self._avaliar(self._indice(index), query or {"match_all": {}})))
+
+    def open_point_in_time(self, index: str, keep_alive: str = None, **_):
+        self._indice(index)
+        pit_id = f"pit-{len(self._pits) + 1}"
+        self._pits[pit_id] = index
+        return _Resposta(id=pit_id)
+
+    def close_point_in_time(self, id: str = None, body: Dict = None, **_):
+        self._pits.pop(id or (body or {}).get("id"), None)
+        return _Resposta(succeeded=True)
+
+    # ---------------------------------------------
+    # Busca
+    # ---------------------------------------------
+
+    def search(self, index: str = None, body: Dict = None, **parametros):
+        corpo = dict(body or {})
+        corpo.update(parametros)
+
+        pit = corpo.get("pit")
+        if pit:
+            if pit["id"] not in self._pits:
+                raise _nao_encontrado(f"point in time [{pit['id']}] expired")
+            index = self._pits[pit["id"]]
+
+        with self._lock:
+            indice = self._indice(index)
+            notas = self._notas(indice, corpo)
+
+            ordenados = sorted(notas.items(), key=lambda par: (-par[1], indice.sequencia[par[0]]))
+            total = len(ordenados)
+
+            cursor = corpo.get("search_after")
+            if cursor is not None:
+                nota_cursor, sequencia_cursor = cursor
+                ordenados = [
+                    (doc_id, nota) for doc_id, nota in ordenados
+                    if (-nota, indice.sequencia[doc_id]) > (-nota_cursor, sequencia_cursor)
+                ]
+
+            inicio = corpo.get("from", 0)
+            selecionados = ordenados[inicio:inicio + corpo.get("size", 10)]
+
+            hits = []
+            for doc_id, nota in selecionados:
+                fonte = indice.documentos[doc_id]
+                hit = {"_index": index, "_id": doc_id, "_score": nota}
+                if corpo.get("_source", True) is not False:
+                    hit["_source"] = _filtrar_fonte(fonte, corpo.get("_source"))
+                if "highlight" in corpo:
+                    hit["highlight"] = _destacar(fonte, corpo)
+                if pit or "sort" in corpo:
+                    hit["sort"] = [nota, indice.sequencia[doc_id]]
+                hits.append(hit)
+
+        resposta = _Resposta(took=0, timed_out=False, hits={
+            "total": {"value": total, "relation": "eq"},
+            "max_score": hits[0]["_score"] if hits else None,
+            "hits": hits,
+        })
+        if pit:
+            resposta["pit_id"] = pit["id"]
+        return resposta
+
+    def msearch(self, searches: List[Dict], index: str = None, **_):
+        """Pares cabeçalho/corpo, como no _msearch; erros vão na resposta de cada busca"""
+        respostas = []
+        for cabecalho, corpo in zip(searches[::2], searches[1::2]):
+            try:
+                respostas.append(dict(self.search(index=cabecalho.get("index", index), body=corpo)))
+            except Exception as e:
+                respostas.append({"error": {"type": type(e).__name__, "reason": str(e)}, "status": 400})
+        return _Resposta(took=0, responses=respostas)
+
+    def _notas(self, indice: _Indice, corpo: Dict) -> Dict[str, float]:
+        knn = corpo.get("knn")
+        query = corpo.get("query")
+        textuais = self._avaliar(indice, query) if query else {}
+        if not knn:
+            return textuais if query else self._avaliar(indice, {"match_all": {}})
+
+        semanticas = self._knn(indice, knn)
+        rrf = corpo.get("rank", {}).get("rrf")
+        if rrf is not None:
+            janela = rrf.get("window_size", knn["k"])
+            constante = rrf.get("rank_constant", 60)
+            notas: Dict[str, float] = {}
+            for ranking in (textuais, semanticas):
+                primeiros = sorted(ranking.items(), key=lambda par: -par[1])[:janela]
+                for posicao, (doc_id, _) in enumerate(primeiros, 1):
+                    notas[doc_id] = notas.get(doc_id, 0.0) + 1.0 / (constante + posicao)
+            return notas
+
+        peso = knn.get("boost", 1.0)
+        notas = dict(textuais)
+        for doc_id, nota in semanticas.items():
+            notas[doc_id] = notas.get(doc_id, 0.0) + peso * nota
+        return notas
+
+    def _knn(self, indice: _Indice, knn: Dict) -> Dict[str, float]:
+        matriz, donos = indice.matriz_trechos()
+        if not len(matriz):
+            return {}
+
+        vetor = np.asarray(knn["query_vector"], dtype=np.float32)
+        vetor /= max(np.linalg.norm(vetor), 1e-12)
+        # Nota do Elasticsearch para similaridade cosseno
+        similaridades = (1.0 + matriz @ vetor) / 2.0
+
+        permitidos = None
+        if knn.get("filter"):
+            permitidos = self._avaliar(indice, {"bool": {"filter": knn["filter"]}})
+
+        # Cada documento entra uma vez, com o seu trecho mais próximo
+        notas: Dict[str, float] = {}
+        for posicao in np.argsort(-similaridades):
+            doc_id = donos[posicao]
+            if doc_id in notas or (permitidos is not None and doc_id not in permitidos):
+                continue
+            notas[doc_id] = float(similaridades[posicao])
+            if len(notas) >= knn["k"]:
+                break
+        return notas
+
+    def _avaliar(self, indice: _Indice, query: Dict) -> Dict[str, float]:
+        """Documentos que casam com a query, com a nota de cada um"""
+        tipo, parametros = next(iter(query.items()))
+
+        if tipo == "match_all":
+            return {doc_id: 1.0 for doc_id in indice.documentos}
+        if tipo in ("multi_match", "match"):
+            texto = parametros["query"] if tipo == "multi_match" else next(iter(parametros.values()))
+            texto = texto["query"] if isinstance(texto, dict) else texto
+            return indice.bm25(texto)
+        if tipo == "ids":
+            return {doc_id: 1.0 for doc_id in parametros["values"] if doc_id in indice.documentos}
+        if tipo in ("term", "terms"):
+            campo, valor = next(iter(parametros.items()))
+            valores = set(valor) if tipo == "terms" else {valor["value"] if isinstance(valor, dict) else valor}
+            return {
+                doc_id: 1.0 for doc_id, fonte in indice.documentos.items()
+                if fonte.get(campo) in valores
+            }
+        if tipo == "range":
+            campo, limites = next(iter(parametros.items()))
+            return {
+                doc_id: 1.0 for doc_id, fonte in indice.documentos.items()
+                if fonte.get(campo) is not None and _no_intervalo(fonte[campo], limites)
+            }
+        if tipo == "exists":
+            return {
+                doc_id: 1.0 for doc_id, fonte in indice.documentos.items()
+                if fonte.get(parametros["field"]) is not None
+            }
+        if tipo == "bool":
+            return self._avaliar_bool(indice, parametros)
+
+        raise ValueError(f"Query não suportada pelo Elasticsearch em memória: {tipo}")
+
+    def _avaliar_bool(self, indice: _Indice, parametros: Dict) -> Dict[str, float]:
+        def lista(chave):
+            valor = parametros.get(chave, [])
+            return valor if isinstance(valor, list) else [valor]
+
+        notas: Optional[Dict[str, float]] = None
+        for clausula in lista("must") + lista("filter"):
+            casados = self._avaliar(indice, clausula)
+            pontua = clausula in lista("must")
+            if notas is None:
+                notas = {doc_id: (nota if pontua else 0.0) for doc_id, nota in casados.items()}
+            else:
+                notas = {
+                    doc_id: nota + (casados[doc_id] if pontua else 0.0)
+                    for doc_id, nota in notas.items() if doc_id in casados
+                }
+
+        opcionais = lista("should")
+        if opcionais:
+            somas: Dict[str, float] = {}
+            for clausula in opcionais:
+                for doc_id, nota in self._avaliar(indice, clausula).items():
+                    somas[doc_id] = somas.get(doc_id, 0.0) + nota
+            if notas is None:
+                notas = somas
+            else:
+                notas = {doc_id: nota + somas.get(doc_id, 0.0) for doc_id, nota in notas.items()}
+
+        if notas is None:
+            notas = {doc_id: 0.0 for doc_id in indice.documentos}
+
+        for clausula in lista("must_not"):
+            for doc_id in self._avaliar(indice, clausula):
+                notas.pop(doc_id, None)
+
+        peso = parametros.get("boost", 1.0)
+        return {doc_id: nota * peso for doc_id, nota in notas.items()}
+
+
+def _no_intervalo(valor, limites: Dict) -> bool:
+    return (
+        ("gt" not in limites or valor > limites["gt"])
+        and ("gte" not in limites or valor >= limites["gte"])
+        and ("lt" not in limites or valor < limites["lt"])
+        and ("lte" not in limites or valor <= limites["lte"])
+    )
+
+
+def _filtrar_fonte(fonte: Dict, campos) -> Dict:
+    if not campos or campos is True:
+        return dict(fonte)
+    return {campo: fonte[campo] for campo in campos if campo in fonte}
+
+
+def _texto_consultado(corpo: Dict) -> str:
+    """Texto do multi_match da consulta, onde quer que ele esteja"""
+    pilha = [corpo.get("highlight", {}).get("highlight_query") or corpo.get("query", {})]
+    while pilha:
+        item = pilha.pop()
+        if isinstance(item, dict):
+            if "multi_match" in item:
+                return item["multi_match"]["query"]
+            pilha.extend(item.values())
+        elif isinstance(item, list):
+            pilha.extend(item)
+    return ""
+
+
+def _destacar(fonte: Dict, corpo: Dict) -> Dict[str, List[str]]:
+    """Fragmentos do conteúdo em volta das primeiras ocorrências dos termos"""
+    destaque = corpo["highlight"]
+    abre, fecha = destaque.get("pre_tags", ["<em>"])[0], destaque.get("post_tags", ["</em>"])[0]
+    termos = sorted(set(_termos(_texto_consultado(corpo))), key=len, reverse=True)
+    if not termos:
+        return {}
+    padrao = re.compile(r"\b(" + "|".join(map(re.escape, termos)) + r")\b", re.IGNORECASE)
+    resultado = {}
+
+    for campo, opcoes in destaque.get("fields", {}).items():
+        texto = str(fonte.get(campo, ""))
+        tamanho = opcoes.get("fragment_size", 100)
+        fragmentos = []
+        fim_anterior = -1
+        for ocorrencia in padrao.finditer(texto):
+            if ocorrencia.start() < fim_anterior:
+                continue
+            inicio = max(0, ocorrencia.start() - tamanho // 2)
+            fim_anterior = min(len(texto), inicio + tamanho)
+            fragmentos.append(padrao.sub(rf"{abre}\1{fecha}", texto[inicio:fim_anterior]))
+            if len(fragmentos) >= opcoes.get("number_of_fragments", 5):
+                break
+        if fragmentos:
+            resultado[campo] = fragmentos
+    return resultado
+
+
+class ElasticsearchMemoriaAsync:
+    """Interface do ``AsyncElasticsearch`` sobre um ``ElasticsearchMemoria``.
+
+    Só o que o ``async_streaming_bulk`` usa; cada _bulk roda em uma thread,
+    como uma requisição que não bloqueia o loop de eventos.
+    """
+
+    def __init__(self, es: ElasticsearchMemoria):
+        self._es = es
+        self.transport = es.transport
+
+    def options(self, **_):
+        return self
+
+    async def bulk(self, operations: List, **parametros):
+        import asyncio
+        return await asyncio.to_thread(self._es.bulk, operations, **parametros)
+
+    async def close(self):
+        pass
@@ -0,0 +1,587 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import contextlib
+import platform
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+# Os módulos do projeto ficam na pasta acima desta
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import busca
+import indexar_pdfs
+from busca_local import EscritorIndiceLocal, IndiceLocal, ResultadoLocal
+from cache_resultados import CacheResultados
+from manifesto import Manifesto
+from extracao_pdfs import ExtratorParalelo, BACKENDS_EXTRACAO, BACKEND_EXTRACAO_PADRAO
+from indexacao_async import indexar_pdfs_async
+from indexacao_bulk import indexar_em_lote, perfil_carga_em_lote
+from processador_ementas import processar_documento_para_ementa
+from quantizacao import ArmazemVetores, FATOR_REESCORE, bytes_por_vetor, nota_cosseno, quantizar, recall, reescorar
+from trechos import dividir_em_trechos, juntar_paragrafos
+
+from es_memoria import ElasticsearchMemoria, ElasticsearchMemoriaAsync
+from falsos import LlamaFalso, ModeloEmbeddingsFalso
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DOS BENCHMARKS
+# =====================================================
+
+PASTA_AMOSTRAS = os.path.join(RAIZ, "documentos", "pdfs")
+PASTA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+# Quantas vezes os PDFs de amostra são replicados em cada corpus sintético
+ESCALAS = [10, 100, 1000]
+
+# Índice usado quando os benchmarks rodam contra um Elasticsearch real
+INDICE_BENCHMARK = "documentos_ifal_benchmark"
+
+# Consultas da medição de busca, sorteadas com semente fixa
+CONSULTAS = [
+    "edital", "monitores", "seleção de monitores", "inscrição", "bolsa",
+    "resultado final", "retificação", "prazo de inscrição", "documentos exigidos",
+    "campus rio largo", "estudantes", "vagas", "cronograma", "recurso",
+    "auxílio financeiro", "carga horária", "requisitos", "entrevista",
+    "classificação", "professor orientador",
+]
+
+# Uma marca a cada tantas palavras deixa os trechos de cada cópia diferentes
+# (senão o cache e a deduplicação de textos tornariam a medição trivial)
+PALAVRAS_ENTRE_MARCAS = 40
+
+# =====================================================
+# 📚 CORPUS SINTÉTICO
+# =====================================================
+
+def extrair_amostras(pasta: str = PASTA_AMOSTRAS) -> List[Dict]:
+    """Texto, por página, dos PDFs de amostra"""
+    caminhos = sorted(
+        os.path.join(pasta, arquivo) for arquivo in os.listdir(pasta) if arquivo.endswith(".pdf")
+    )
+    amostras = [r for r in ExtratorParalelo(workers=1).extrair(caminhos) if not r["erro"]]
+    if not amostras:
+        raise SystemExit(f"❌ Nenhum PDF legível em {pasta}")
+    return sorted(amostras, key=lambda r: r["arquivo"])
+
+
+def replicar_pdfs(amostras: List[Dict], escala: int, destino: str) -> List[str]:
+    """Cria ``escala`` cópias (links) de cada PDF de amostra"""
+    caminhos = []
+    for copia in range(escala):
+        for amostra in amostras:
+            caminho = os.path.join(destino, f"{copia:05d}_{amostra['arquivo']}")
+            try:
+                os.link(amostra["caminho"], caminho)
+            except OSError:
+                shutil.copyfile(amostra["caminho"], caminho)
+            caminhos.append(caminho)
+    return caminhos
+
+
+def _marcar(texto: str, copia: int) -> str:
+    palavras = texto.split()
+    for posicao in range(len(palavras) - 1, -1, -PALAVRAS_ENTRE_MARCAS):
+        palavras.insert(posicao, f"c{copia}")
+    return " ".join(palavras)
+
+
+def documentos_sinteticos(amostras: List[Dict], escala: int) -> Iterator[Dict]:
+    """Ações _bulk de ``escala`` cópias de cada amostra, como as de ``gerar_acoes``"""
+    for copia in range(escala):
+        for amostra in amostras:
+            paginas = [_marcar(pagina, copia) for pagina in amostra["paginas"]]
+            arquivo = f"{copia:05d}_{amostra['arquivo']}"
+            yield {
+                "_op_type": "index",
+                "_index": indexar_pdfs.INDEX,
+                "_id": arquivo,
+                "_source": {
+                    "arquivo": arquivo,
+                    "conteudo": juntar_paragrafos(paginas),
+                    "hash_conteudo": f"{copia}-{amostra['arquivo']}",
+                    "trechos": dividir_em_trechos(paginas),
+                },
+            }
+
+# =====================================================
+# ⏱️ MEDIÇÕES
+# =====================================================
+
+def percentis(latencias: List[float]) -> Dict:
+    ms = np.asarray(latencias) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "media_ms": float(ms.mean()),
+    }
+
+
+def medir_extracao(amostras: List[Dict], escala: int, workers: int, backend: str = BACKEND_EXTRACAO_PADRAO) -> Dict:
+    # Sem cache de textos: as cópias têm o mesmo hash e seriam lidas uma vez só
+    with tempfile.TemporaryDirectory(prefix="benchmark_pdfs_") as pasta:
+        caminhos = replicar_pdfs(amostras, escala, pasta)
+        extrator = ExtratorParalelo(workers=workers, backend=backend)
+        documentos = sum(1 for _ in extrator.extrair(caminhos))
+
+    return {
+        "documentos": documentos,
+        "paginas": extrator.paginas_extraidas,
+        "segundos": extrator.tempo_total,
+        "paginas_por_segundo": extrator.paginas_por_segundo(),
+        "workers": extrator.workers,
+        "backend": backend,
+    }
+
+
+def medir_embeddings(model, amostras: List[Dict], escala: int, tamanho_lote: int) -> Dict:
+    documentos = trechos = 0
+    inicio = time.perf_counter()
+    for acao in indexar_pdfs.adicionar_embeddings(model, documentos_sinteticos(amostras, escala), None, tamanho_lote):
+        documentos += 1
+        trechos += len(acao["_source"]["trechos"])
+    segundos = time.perf_counter() - inicio
+
+    return {
+        "documentos": documentos,
+        "trechos": trechos,
+        "segundos": segundos,
+        "documentos_por_segundo": documentos / segundos,
+        "trechos_por_segundo": trechos / segundos,
+    }
+
+
+def _com_vetores_das_amostras(model, amostras: List[Dict], escala: int) -> Iterator[Dict]:
+    """Documentos sintéticos com os vetores das amostras originais.
+
+    A carga mede o envio ao Elasticsearch; os vetores de cada amostra são
+    calculados uma vez e repetidos em todas as cópias.
+    """
+    vetores = {}
+    for acao in indexar_pdfs.adicionar_embeddings(model, documentos_sinteticos(amostras, 1)):
+        vetores[acao["_source"]["hash_conteudo"].split("-", 1)[1]] = acao["_source"]
+
+    for acao in documentos_sinteticos(amostras, escala):
+        original = vetores[acao["_source"]["hash_conteudo"].split("-", 1)[1]]
+        acao["_source"]["embedding"] = original["embedding"]
+        for trecho, trecho_original in zip(acao["_source"]["trechos"], original["trechos"]):
+            trecho["embedding"] = trecho_original["embedding"]
+        yield acao
+
+
+def medir_bulk(es, model, amostras: List[Dict], escala: int, workers_bulk: int) -> Dict:
+    indexar_pdfs.recriar_indice(es)
+
+    inicio = time.perf_counter()
+    with perfil_carga_em_lote(es, indexar_pdfs.INDEX):
+        sucessos, falhas = indexar_em_lote(es, _com_vetores_das_amostras(model, amostras, escala),
+                                           workers=workers_bulk)
+    segundos = time.perf_counter() - inicio
+
+    return {
+        "documentos": sucessos,
+        "falhas": falhas,
+        "segundos": segundos,
+        "documentos_por_segundo": sucessos / segundos,
+        "workers_bulk": workers_bulk,
+    }
+
+
+def medir_pipeline(es, model, amostras: List[Dict], escala: int, workers: int, workers_bulk: int,
+                   backend: str = BACKEND_EXTRACAO_PADRAO, es_url: str = None) -> Dict:
+    """Indexação completa dos PDFs replicados, em sequência e com as etapas sobrepostas"""
+    # Contra um Elasticsearch real o indexador cria o próprio cliente assíncrono
+    cliente = ElasticsearchMemoriaAsync(es) if isinstance(es, ElasticsearchMemoria) else None
+
+    resultado = {}
+    with tempfile.TemporaryDirectory(prefix="benchmark_pipeline_") as pasta:
+        caminhos = replicar_pdfs(amostras, escala, pasta)
+        for modo in ("sincrono", "async"):
+            indexar_pdfs.recriar_indice(es)
+            manifesto = Manifesto(os.path.join(pasta, f"manifesto_{modo}.json"))
+            entradas, _ = manifesto.comparar(caminhos)
+
+            inicio = time.perf_counter()
+            # Sem a linha de cada documento indexado
+            with contextlib.redirect_stdout(io.StringIO()):
+                if modo == "async":
+                    processados = indexar_pdfs_async(es_url, model, entradas, manifesto, workers,
+                                                     workers_bulk=workers_bulk, backend_extracao=backend,
+                                                     cliente=cliente)
+                else:
+                    processados = indexar_pdfs.indexar_pdfs(es, model, entradas, manifesto, workers,
+                                                            workers_bulk=workers_bulk, backend_extracao=backend)
+            segundos = time.perf_counter() - inicio
+
+            resultado[modo] = {
+                "documentos": processados,
+                "segundos": segundos,
+                "documentos_por_segundo": processados / segundos,
+            }
+
+    resultado["aceleracao"] = resultado["sincrono"]["segundos"] / resultado["async"]["segundos"]
+    return resultado
+
+
+def medir_busca(es, model, total_consultas: int, concorrencia: int, semente: int = 42,
+                classe_resultado=busca.ResultadoPaginado) -> Dict:
+    """Latência do caminho do ``busca_unificada`` (embedding + janela híbrida + primeira página)"""
+    sorteio = random.Random(semente)
+    consultas = [sorteio.choice(CONSULTAS) for _ in range(total_consultas)]
+
+    def buscar(termo: str, cache: CacheResultados = None) -> float:
+        inicio = time.perf_counter()
+        criar = lambda: classe_resultado(es, termo, model.encode(termo).tolist())
+        if cache is None:
+            resultado = criar()
+            resultado.pagina(1, 10)
+            resultado.fechar()
+        else:
+            cache.obter_ou_criar((termo, (), "hibrida"), criar).pagina(1, 10)
+        return time.perf_counter() - inicio
+
+    medicoes = {}
+    for nome, cache in (("sem_cache", None), ("com_cache", CacheResultados(lambda: 0))):
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            latencias = list(executor.map(lambda termo: buscar(termo, cache), consultas))
+        segundos = time.perf_counter() - inicio
+        medicoes[nome] = {
+            **percentis(latencias),
+            "consultas": len(latencias),
+            "consultas_por_segundo": len(latencias) / segundos,
+        }
+        if cache is not None:
+            medicoes[nome]["taxa_acerto"] = cache.acertos / max(1, cache.acertos + cache.faltas)
+
+    medicoes["concorrencia"] = concorrencia
+    return medicoes
+
+
+def medir_busca_local(model, amostras: List[Dict], escala: int, total_consultas: int, concorrencia: int) -> Dict:
+    """Gravação do índice local, abertura (mmap) e latência da busca sobre ele, sem Elasticsearch"""
+    pasta = tempfile.mkdtemp(prefix="indice_local_")
+    try:
+        inicio = time.perf_counter()
+        documentos, _ = EscritorIndiceLocal(pasta).gravar(_com_vetores_das_amostras(model, amostras, escala))
+        segundos_gravacao = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        indice = IndiceLocal(pasta)
+        abertura_ms = (time.perf_counter() - inicio) * 1000
+
+        medicoes = medir_busca(indice, model, total_consultas, concorrencia, classe_resultado=ResultadoLocal)
+        medicoes.update({
+            "documentos": documentos,
+            "segundos_gravacao": segundos_gravacao,
+            "documentos_por_segundo": documentos / segundos_gravacao,
+            "abertura_ms": abertura_ms,
+            "ivf": indice.atual().versao.centroides is not None,
+        })
+        return medicoes
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def medir_quantizacao(es, model, amostras: List[Dict], escala: int, tamanho_lote: int, k: int = 10,
+                      fator_reescore: int = FATOR_REESCORE) -> Dict:
+    """Memória e recall@k dos vetores quantizados (modo byte) contra o float exato.
+
+    A referência é a busca exaustiva nos vetores completos. A primeira fase
+    é o kNN do índice nos vetores compactos; a segunda reordena
+    ``k * fator_reescore`` candidatos com os vetores completos.
+    """
+    with tempfile.TemporaryDirectory(prefix="benchmark_vetores_") as pasta:
+        armazem = ArmazemVetores(pasta)
+        indexar_pdfs.recriar_indice(es, "byte")
+        acoes = indexar_pdfs.adicionar_embeddings(model, documentos_sinteticos(amostras, escala), None,
+                                                  tamanho_lote, "byte", armazem)
+        indexar_em_lote(es, acoes)
+        es.indices.refresh(index=indexar_pdfs.INDEX)
+
+        documentos = {doc_id: np.array(armazem.vetores(doc_id)) for doc_id in armazem.posicoes}
+        vetores = sum(len(matriz) for matriz in documentos.values())
+
+        def ids_knn(vetor, quantidade: int) -> List[Dict]:
+            consulta = busca.montar_consulta_semantica(quantizar(vetor).tolist(), quantidade)
+            return es.search(index=indexar_pdfs.INDEX, body=consulta)["hits"]["hits"]
+
+        recalls = {"primeira_fase": [], "com_reescore": []}
+        latencias = {"primeira_fase": [], "com_reescore": []}
+        for termo in CONSULTAS:
+            vetor = np.asarray(model.encode(termo), dtype=np.float32)
+            vetor /= max(np.linalg.norm(vetor), 1e-12)
+            notas = {doc_id: nota_cosseno(vetor, matriz) for doc_id, matriz in documentos.items()}
+            esperados = sorted(notas, key=lambda doc_id: -notas[doc_id])[:k]
+
+            inicio = time.perf_counter()
+            hits = ids_knn(vetor, k)
+            latencias["primeira_fase"].append(time.perf_counter() - inicio)
+            recalls["primeira_fase"].append(recall([hit["_id"] for hit in hits], esperados))
+
+            inicio = time.perf_counter()
+            hits = reescorar(ids_knn(vetor, k * fator_reescore), vetor, armazem)[:k]
+            latencias["com_reescore"].append(time.perf_counter() - inicio)
+            recalls["com_reescore"].append(recall([hit["_id"] for hit in hits], esperados))
+
+    bytes_float = vetores * bytes_por_vetor("float")
+    bytes_byte = vetores * bytes_por_vetor("byte")
+    return {
+        "vetores": vetores,
+        "mb_vetores_float": bytes_float / 1024 ** 2,
+        "mb_vetores_byte": bytes_byte / 1024 ** 2,
+        "economia_memoria": 1 - bytes_byte / bytes_float,
+        "k": k,
+        "fator_reescore": fator_reescore,
+        **{f"recall_{fase}": float(np.mean(valores)) for fase, valores in recalls.items()},
+        **{f"{fase}_p50_ms": percentis(valores)["p50_ms"] for fase, valores in latencias.items()},
+    }
+
+
+class ContadorTokens:
+    """Repassa as chamadas ao modelo e soma o uso de tokens informado nas respostas"""
+
+    def __init__(self, llm):
+        self._llm = llm
+        self.tokens_prompt = 0
+        self.tokens_gerados = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, nome):
+        return getattr(self._llm, nome)
+
+    def __call__(self, prompt, **parametros):
+        resposta = self._llm(prompt, **parametros)
+        uso = resposta.get("usage", {})
+        with self._lock:
+            self.tokens_prompt += uso.get("prompt_tokens", 0)
+            self.tokens_gerados += uso.get("completion_tokens", 0)
+        return resposta
+
+
+def medir_ementas(llm, amostras: List[Dict], documentos: int) -> Dict:
+    contador = ContadorTokens(llm)
+    textos = [acao["_source"]["conteudo"] for acao in documentos_sinteticos(amostras, documentos)][:documentos]
+
+    inicio = time.perf_counter()
+    for texto in textos:
+        processar_documento_para_ementa(texto, contador)
+    segundos = time.perf_counter() - inicio
+
+    return {
+        "documentos": len(textos),
+        "segundos": segundos,
+        "tokens_prompt": contador.tokens_prompt,
+        "tokens_gerados": contador.tokens_gerados,
+        "tokens_gerados_por_segundo": contador.tokens_gerados / segundos,
+        "documentos_por_segundo": len(textos) / segundos,
+    }
+
+# =====================================================
+# 🔌 BACKENDS
+# =====================================================
+
+def usar_indice(nome: str):
+    """Aponta o indexador e a busca para outro índice (nunca o de produção)"""
+    indexar_pdfs.INDEX = nome
+    busca.INDEX = nome
+
+
+def criar_backends(args) -> Dict:
+    backends = {}
+
+    if args.es_url:
+        from elasticsearch import Elasticsearch
+        usar_indice(INDICE_BENCHMARK)
+        es = Elasticsearch(args.es_url, request_timeout=120)
+        backends["elasticsearch"] = {"tipo": "real", "url": args.es_url, "versao": es.info()["version"]["number"]}
+    else:
+        es = ElasticsearchMemoria()
+        backends["elasticsearch"] = {"tipo": "memoria"}
+
+    if args.embeddings == "real":
+        from sentence_transformers import SentenceTransformer
+        from embeddings import MODELO_EMBEDDINGS
+        model = SentenceTransformer(MODELO_EMBEDDINGS)
+        backends["embeddings"] = {"tipo": "real", "modelo": MODELO_EMBEDDINGS}
+    else:
+        model = ModeloEmbeddingsFalso()
+        backends["embeddings"] = {"tipo": "falso"}
+
+    if args.modelo_llm:
+        from llama_cpp import Llama
+        from gerar_ementas import N_CTX
+        from pool_llm import THREADS_POR_WORKER
+        llm = Llama(model_path=args.modelo_llm, n_ctx=N_CTX, n_threads=THREADS_POR_WORKER, verbose=False)
+        backends["llm"] = {"tipo": "real", "modelo": os.path.basename(args.modelo_llm)}
+    else:
+        llm = LlamaFalso()
+        backends["llm"] = {"tipo": "falso"}
+
+    return {"es": es, "model": model, "llm": llm, "descricao": backends}
+
+# =====================================================
+# 📊 COMPARAÇÃO ENTRE EXECUÇÕES
+# =====================================================
+
+def _achatar(dados: Dict, prefixo: str = "") -> Dict[str, float]:
+    valores = {}
+    for chave, valor in dados.items():
+        nome = f"{prefixo}.{chave}" if prefixo else chave
+        if isinstance(valor, dict):
+            valores.update(_achatar(valor, nome))
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            valores[nome] = valor
+    return valores
+
+
+def comparar(anterior: Dict, atual: Dict):
+    """Mostra a variação de cada métrica em relação a uma execução anterior"""
+    antes = _achatar(anterior.get("medicoes", {}))
+    depois = _achatar(atual.get("medicoes", {}))
+    print("\n📊 Comparação com a execução anterior:")
+    for nome in sorted(set(antes) & set(depois)):
+        if not nome.endswith(("_por_segundo", "_ms")):
+            continue
+        variacao = (depois[nome] - antes[nome]) / antes[nome] * 100 if antes[nome] else 0.0
+        print(f"   {nome}: {antes[nome]:.2f} → {depois[nome]:.2f} ({variacao:+.1f}%)")
+
+# =====================================================
+# 🚀 EXECUÇÃO
+# =====================================================
+
+ETAPAS = ["extracao", "embeddings", "bulk", "busca", "pipeline", "busca_local", "quantizacao", "ementas"]
+
+
+def executar(args) -> Dict:
+    backends = criar_backends(args)
+    es, model, llm = backends["es"], backends["model"], backends["llm"]
+
+    print("📚 Extraindo os PDFs de amostra...")
+    amostras = extrair_amostras(args.pasta_amostras)
+    print(f"   {len(amostras)} PDFs, {sum(len(a['paginas']) for a in amostras)} páginas")
+
+    medicoes = {}
+    for escala in args.escalas:
+        print(f"\n🔁 Escala {escala}x ({escala * len(amostras)} documentos)")
+        resultado = medicoes.setdefault(f"{escala}x", {})
+
+        if "extracao" in args.etapas:
+            resultado["extracao"] = medir_extracao(amostras, escala, args.workers, args.backend_extracao)
+            print(f"   📄 Extração: {resultado['extracao']['paginas_por_segundo']:.1f} páginas/s")
+
+        if "embeddings" in args.etapas:
+            resultado["embeddings"] = medir_embeddings(model, amostras, escala, args.tamanho_lote_embeddings)
+            print(f"   🧠 Embeddings: {resultado['embeddings']['documentos_por_segundo']:.1f} documentos/s")
+
+        if "bulk" in args.etapas or "busca" in args.etapas:
+            # A busca precisa do índice carregado nesta escala
+            resultado["bulk"] = medir_bulk(es, model, amostras, escala, args.workers_bulk)
+            print(f"   🚚 Bulk: {resultado['bulk']['documentos_por_segundo']:.1f} documentos/s")
+
+        if "busca" in args.etapas:
+            resultado["busca"] = medir_busca(es, model, args.consultas, args.concorrencia)
+            sem_cache = resultado["busca"]["sem_cache"]
+            print(f"   🔍 Busca: p50 {sem_cache['p50_ms']:.1f} ms, p95 {sem_cache['p95_ms']:.1f} ms, "
+                  f"p99 {sem_cache['p99_ms']:.1f} ms ({args.concorrencia} em paralelo)")
+
+        if "pipeline" in args.etapas:
+            resultado["pipeline"] = medir_pipeline(es, model, amostras, escala, args.workers, args.workers_bulk,
+                                                   args.backend_extracao, args.es_url)
+            pipeline = resultado["pipeline"]
+            print(f"   🔀 Indexação completa: {pipeline['sincrono']['documentos_por_segundo']:.1f} documentos/s "
+                  f"em sequência, {pipeline['async']['documentos_por_segundo']:.1f} com as etapas sobrepostas "
+                  f"({pipeline['aceleracao']:.2f}x)")
+
+        if "busca_local" in args.etapas:
+            resultado["busca_local"] = medir_busca_local(model, amostras, escala, args.consultas, args.concorrencia)
+            local = resultado["busca_local"]
+            print(f"   💾 Índice local: gravação {local['documentos_por_segundo']:.1f} documentos/s, "
+                  f"abertura {local['abertura_ms']:.1f} ms, busca p50 {local['sem_cache']['p50_ms']:.1f} ms, "
+                  f"p95 {local['sem_cache']['p95_ms']:.1f} ms")
+
+        if "quantizacao" in args.etapas:
+            resultado["quantizacao"] = medir_quantizacao(es, model, amostras, escala, args.tamanho_lote_embeddings)
+            quantizacao = resultado["quantizacao"]
+            print(f"   🗜️ Vetores byte: {quantizacao['economia_memoria']:.0%} menos memória, "
+                  f"recall@{quantizacao['k']} {quantizacao['recall_primeira_fase']:.2f} "
+                  f"({quantizacao['recall_com_reescore']:.2f} com reescore)")
+
+    if "ementas" in args.etapas:
+        print(f"\n📝 Ementas ({args.documentos_ementa} documentos)")
+        medicoes["ementas"] = medir_ementas(llm, amostras, args.documentos_ementa)
+        print(f"   {medicoes['ementas']['tokens_gerados_por_segundo']:.1f} tokens gerados/s")
+
+    if args.es_url:
+        es.indices.delete(index=INDICE_BENCHMARK)
+    if isinstance(llm, LlamaFalso):
+        llm.fechar()
+
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "maquina": {
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "sistema": platform.platform(),
+        },
+        "backends": backends["descricao"],
+        "parametros": {
+            "escalas": args.escalas,
+            "etapas": args.etapas,
+            "consultas": args.consultas,
+            "concorrencia": args.concorrencia,
+        },
+        "medicoes": medicoes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de extração, embeddings, indexação, busca e ementas")
+    parser.add_argument("--escalas", type=int, nargs="+", default=ESCALAS,
+                        help="Cópias dos PDFs de amostra em cada corpus (padrão: 10 100 1000)")
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=ETAPAS)
+    parser.add_argument("--pasta-amostras", default=PASTA_AMOSTRAS)
+    parser.add_argument("--workers", type=int, default=None, help="Processos da extração (padrão: núcleos)")
+    parser.add_argument("--backend-extracao", choices=sorted(BACKENDS_EXTRACAO), default=BACKEND_EXTRACAO_PADRAO)
+    parser.add_argument("--workers-bulk", type=int, default=2)
+    parser.add_argument("--tamanho-lote-embeddings", type=int, default=64)
+    parser.add_argument("--consultas", type=int, default=200, help="Consultas por medição de busca")
+    parser.add_argument("--concorrencia", type=int, default=8, help="Consultas simultâneas")
+    parser.add_argument("--documentos-ementa", type=int, default=10)
+    parser.add_argument("--es-url", default=None,
+                        help=f"Usa um Elasticsearch real (índice '{INDICE_BENCHMARK}') em vez do em memória")
+    parser.add_argument("--embeddings", choices=["falso", "real"], default="falso")
+    parser.add_argument("--modelo-llm", default=None, help="GGUF para medir com o llama.cpp real")
+    parser.add_argument("--saida", default=None, help="Arquivo JSON do resultado")
+    parser.add_argument("--comparar", default=None, help="JSON de uma execução anterior")
+    args = parser.parse_args()
+
+    resultado = executar(args)
+
+    saida = args.saida or os.path.join(
+        PASTA_RESULTADOS, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultado salvo em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            comparar(json.load(f), resultado)
+
+
+if __name__ == "__main__":
+    main()
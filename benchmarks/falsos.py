@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+import zlib
+from typing import Dict, List
+
+import numpy as np
+
+from embeddings import DIMENSAO_EMBEDDINGS
+from processador_ementas import LIMITES_CAMPOS
+
+# =====================================================
+# 🧪 MODELOS FALSOS PARA OS BENCHMARKS
+# =====================================================
+# Substituem o SentenceTransformer e o Llama quando os modelos reais não
+# estão disponíveis. Medem o custo do código do projeto em volta dos
+# modelos (lotes, cache, chunks, prompts, leitura das respostas), não o
+# custo dos modelos em si.
+
+# Palavras distintas do vocabulário do modelo de embeddings falso
+TAMANHO_VOCABULARIO = 1 << 15
+
+
+class ModeloEmbeddingsFalso:
+    """Embeddings determinísticos: soma de vetores aleatórios fixos por palavra.
+
+    Textos com palavras em comum ficam próximos, o que basta para a busca
+    semântica devolver resultados com sentido nos benchmarks.
+    """
+
+    def __init__(self, dimensao: int = DIMENSAO_EMBEDDINGS, semente: int = 42):
+        gerador = np.random.default_rng(semente)
+        self._vocabulario = gerador.standard_normal((TAMANHO_VOCABULARIO, dimensao)).astype(np.float32)
+        self.dimensao = dimensao
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimensao
+
+    def encode(self, textos, batch_size: int = 32, normalize_embeddings: bool = False, **_):
+        unico = isinstance(textos, str)
+        lista = [textos] if unico else list(textos)
+
+        vetores = np.zeros((len(lista), self.dimensao), dtype=np.float32)
+        for i, texto in enumerate(lista):
+            # O modelo real trunca a entrada; aqui, nas primeiras 256 palavras
+            indices = [zlib.crc32(palavra.lower().encode("utf-8")) % TAMANHO_VOCABULARIO
+                       for palavra in texto.split()[:256]]
+            if indices:
+                vetores[i] = self._vocabulario[indices].sum(axis=0)
+
+        if normalize_embeddings:
+            vetores /= np.maximum(np.linalg.norm(vetores, axis=1, keepdims=True), 1e-12)
+        return vetores[0] if unico else vetores
+
+
+class LlamaFalso:
+    """Imita a interface do ``llama_cpp.Llama`` usada pelo processador de ementas.
+
+    Cada palavra é um token. A resposta é uma ementa fixa, em JSON quando a
+    chamada traz uma gramática e em texto livre caso contrário, com o uso de
+    tokens informado como no llama.cpp.
+    """
+
+    def __init__(self, n_ctx: int = 8192):
+        self._n_ctx = n_ctx
+        self.n_tokens = 0
+        self.input_ids = []
+        self._vocabulario: Dict[str, int] = {}
+        self._estado = None
+
+        # O cache de ementas identifica o modelo pelo arquivo
+        descritor, self.model_path = tempfile.mkstemp(suffix=".gguf", prefix="llama_falso_")
+        with os.fdopen(descritor, "wb") as f:
+            f.write(b"GGUF-falso")
+
+    def n_ctx(self) -> int:
+        return self._n_ctx
+
+    def tokenize(self, texto: bytes, add_bos: bool = True, special: bool = False) -> List[int]:
+        tokens = [self._vocabulario.setdefault(palavra, len(self._vocabulario) + 1)
+                  for palavra in texto.decode("utf-8").split()]
+        return ([0] if add_bos else []) + tokens
+
+    def reset(self):
+        self.n_tokens = 0
+        self.input_ids = []
+
+    def eval(self, tokens: List[int]):
+        self.input_ids = list(tokens)
+        self.n_tokens = len(tokens)
+
+    def save_state(self):
+        return (list(self.input_ids), self.n_tokens)
+
+    def load_state(self, estado):
+        self.input_ids, self.n_tokens = list(estado[0]), estado[1]
+
+    def _resposta(self, estruturada: bool) -> str:
+        campos = {campo: f"{campo} do documento " * 4 for campo in LIMITES_CAMPOS}
+        if estruturada:
+            return json.dumps({campo: valor.strip()[:LIMITES_CAMPOS[campo]] for campo, valor in campos.items()},
+                              ensure_ascii=False)
+        return "\n".join(f"{campo}: {valor.strip()}" for campo, valor in campos.items())
+
+    def __call__(self, prompt, max_tokens: int = 16, stream: bool = False, grammar=None, **_):
+        tokens_prompt = len(prompt) if isinstance(prompt, list) else len(self.tokenize(prompt.encode("utf-8")))
+        palavras = self._resposta(grammar is not None).split(" ")[:max_tokens]
+        self.eval(prompt if isinstance(prompt, list) else [])
+
+        if stream:
+            return ({"choices": [{"text": palavra + " "}]} for palavra in palavras)
+        return {
+            "choices": [{"text": " ".join(palavras), "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": tokens_prompt,
+                "completion_tokens": len(palavras),
+                "total_tokens": tokens_prompt + len(palavras),
+            },
+        }
+
+    def fechar(self):
+        if os.path.exists(self.model_path):
+            os.remove(self.model_path)
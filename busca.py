@@ -0,0 +1,392 @@
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from elasticsearch import ApiError, NotFoundError
+
+from instrumentacao import medir
+from quantizacao import FATOR_REESCORE, quantizar, reescorar
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DA BUSCA
+# =====================================================
+
+INDEX = "documentos_ifal_llm"
+
+# Campos consultados pelo BM25 e campos devolvidos em cada resultado. O texto
+# completo não vem na lista de resultados: só os trechos destacados
+CAMPOS_TEXTO = ["conteudo", "arquivo", "ementa"]
+CAMPOS_RETORNO = ["arquivo", "ementa", "tem_ementa"]
+CAMPOS_DOCUMENTO = ["arquivo", "conteudo", "ementa", "tem_ementa"]
+
+# Trechos destacados pelo Elasticsearch: tamanho em caracteres e quantidade
+TAMANHO_DESTAQUE = 160
+NUMERO_DESTAQUES = 3
+
+# Campo vetorial consultado pelo kNN (trechos de cada documento)
+CAMPO_VETOR = "trechos.embedding"
+
+# Vizinhos devolvidos pelo kNN e candidatos avaliados por shard no grafo HNSW
+KNN_K = 50
+KNN_NUM_CANDIDATOS = 200
+
+# "rrf" (reciprocal rank fusion, feito pelo Elasticsearch) ou "ponderada"
+# (soma das notas do BM25 e do kNN, cada uma multiplicada pelo seu peso)
+MODO_FUSAO = "rrf"
+CONSTANTE_RRF = 60
+PESO_TEXTUAL = 1.0
+PESO_SEMANTICO = 5.0
+
+# Primeiros resultados buscados de uma vez pela consulta híbrida; as páginas
+# dentro dessa janela não custam nenhuma requisição
+JANELA_HIBRIDA = 50
+
+# Tempo que o Elasticsearch mantém o point-in-time da paginação profunda
+KEEP_ALIVE_PIT = "10m"
+
+# Se o cluster recusar o RRF, passa a usar a fusão ponderada. A versão
+# responde 400; a licença (RRF exige uma licença paga na 8.11), 403. Só
+# conta como recusa o erro que fala do RRF ou do parâmetro ``rank``
+_rrf_disponivel = True
+_lock_rrf = threading.Lock()
+STATUS_RRF_RECUSADO = (400, 403)
+PADRAO_ERRO_RRF = re.compile(r"\b(rrf|rank)\b", re.IGNORECASE)
+
+
+def _rrf_recusado(erro: ApiError) -> bool:
+    """O erro é o cluster recusando o RRF (e não um problema da própria consulta)"""
+    return erro.status_code in STATUS_RRF_RECUSADO and bool(PADRAO_ERRO_RRF.search(f"{erro.message} {erro.body}"))
+
+
+def _marcar_rrf_indisponivel():
+    """Registra, uma vez para todas as sessões do app, que o cluster não aceita RRF"""
+    global _rrf_disponivel
+    with _lock_rrf:
+        _rrf_disponivel = False
+
+
+def montar_filtros(filtros: Optional[Dict]) -> List[Dict]:
+    """Converte {campo: valor ou lista de valores} em cláusulas term/terms"""
+    clausulas = []
+    for campo, valor in sorted((filtros or {}).items()):
+        if isinstance(valor, (list, tuple, set, frozenset)):
+            clausulas.append({"terms": {campo: sorted(valor)}})
+        else:
+            clausulas.append({"term": {campo: valor}})
+    return clausulas
+
+
+def montar_query_textual(termo: str, filtros: Optional[Dict] = None) -> Dict:
+    """Query BM25 com tolerância a erros de digitação"""
+    query = {
+        "multi_match": {
+            "query": termo,
+            "fields": CAMPOS_TEXTO,
+            "fuzziness": "AUTO"
+        }
+    }
+    if filtros:
+        query = {"bool": {"must": [query], "filter": montar_filtros(filtros)}}
+    return query
+
+
+def montar_destaque(tamanho_destaque: int = TAMANHO_DESTAQUE, numero_destaques: int = NUMERO_DESTAQUES) -> Dict:
+    """Trechos do conteúdo em que a consulta aparece, montados no servidor"""
+    return {
+        "pre_tags": ["<mark>"],
+        "post_tags": ["</mark>"],
+        "fields": {
+            "conteudo": {"fragment_size": tamanho_destaque, "number_of_fragments": numero_destaques}
+        }
+    }
+
+
+def montar_consulta_textual(termo: str, pagina: int = 1, tamanho_pagina: int = 10,
+                            filtros: Optional[Dict] = None, tamanho_destaque: int = TAMANHO_DESTAQUE,
+                            numero_destaques: int = NUMERO_DESTAQUES) -> Dict:
+    """Consulta BM25 paginada"""
+    consulta = {
+        "size": tamanho_pagina,
+        "from": (pagina - 1) * tamanho_pagina,
+        "query": montar_query_textual(termo, filtros),
+        "_source": CAMPOS_RETORNO
+    }
+    if numero_destaques > 0:
+        consulta["highlight"] = montar_destaque(tamanho_destaque, numero_destaques)
+    return consulta
+
+
+def montar_consulta_hibrida(termo: str, vetor: List[float], pagina: int = 1, tamanho_pagina: int = 10,
+                            modo_fusao: str = MODO_FUSAO, k: int = KNN_K,
+                            num_candidatos: int = KNN_NUM_CANDIDATOS, constante_rrf: int = CONSTANTE_RRF,
+                            peso_textual: float = PESO_TEXTUAL, peso_semantico: float = PESO_SEMANTICO,
+                            filtros: Optional[Dict] = None, tamanho_destaque: int = TAMANHO_DESTAQUE,
+                            numero_destaques: int = NUMERO_DESTAQUES) -> Dict:
+    """Consulta única com BM25 (multi_match) e kNN nativo sobre o HNSW dos trechos.
+
+    Como ``trechos`` é nested, o kNN devolve cada documento uma única vez,
+    com a nota do seu trecho mais próximo.
+    """
+    inicio = (pagina - 1) * tamanho_pagina
+    # O kNN precisa alcançar pelo menos a página pedida
+    k = max(k, inicio + tamanho_pagina)
+    num_candidatos = min(max(num_candidatos, k), 10000)
+
+    consulta = montar_consulta_textual(termo, pagina, tamanho_pagina, filtros, tamanho_destaque, numero_destaques)
+    consulta["knn"] = {
+        "field": CAMPO_VETOR,
+        "query_vector": vetor,
+        "k": k,
+        "num_candidates": num_candidatos
+    }
+    if filtros:
+        consulta["knn"]["filter"] = montar_filtros(filtros)
+
+    if modo_fusao == "rrf":
+        consulta["rank"] = {"rrf": {"window_size": k, "rank_constant": constante_rrf}}
+    elif modo_fusao == "ponderada":
+        consulta["query"] = {"bool": {"must": [consulta["query"]], "boost": peso_textual}}
+        consulta["knn"]["boost"] = peso_semantico
+    else:
+        raise ValueError(f"Modo de fusão desconhecido: {modo_fusao}")
+
+    return consulta
+
+
+def montar_consulta_semantica(vetor: List, k: int, num_candidatos: int = KNN_NUM_CANDIDATOS,
+                              filtros: Optional[Dict] = None) -> Dict:
+    """Só o kNN, sem o texto dos documentos: os ids e as notas dos ``k`` mais próximos"""
+    consulta = {
+        "size": k,
+        "_source": False,
+        "knn": {
+            "field": CAMPO_VETOR,
+            "query_vector": vetor,
+            "k": k,
+            "num_candidates": min(max(num_candidatos, k), 10000)
+        }
+    }
+    if filtros:
+        consulta["knn"]["filter"] = montar_filtros(filtros)
+    return consulta
+
+
+def fundir_resultados(textuais: List[Dict], semanticos: List[Dict], modo_fusao: str = MODO_FUSAO,
+                      constante_rrf: int = CONSTANTE_RRF, peso_textual: float = PESO_TEXTUAL,
+                      peso_semantico: float = PESO_SEMANTICO) -> List[Dict]:
+    """Funde as duas listas como o Elasticsearch faria (RRF ou soma ponderada)"""
+    notas, hits = {}, {}
+    for lista, peso in ((textuais, peso_textual), (semanticos, peso_semantico)):
+        for posicao, hit in enumerate(lista, 1):
+            contribuicao = 1.0 / (constante_rrf + posicao) if modo_fusao == "rrf" else peso * hit["_score"]
+            notas[hit["_id"]] = notas.get(hit["_id"], 0.0) + contribuicao
+            # O hit textual traz _source e destaques; o semântico, só o id
+            hits.setdefault(hit["_id"], hit)
+
+    ordem = sorted(notas, key=lambda doc_id: -notas[doc_id])
+    return [{**hits[doc_id], "_score": notas[doc_id]} for doc_id in ordem]
+
+
+def busca_textual(es, termo: str, pagina: int = 1, tamanho_pagina: int = 10,
+                  filtros: Optional[Dict] = None, **opcoes_destaque) -> Tuple[List[Dict], int]:
+    """Busca apenas pelo BM25"""
+    consulta = montar_consulta_textual(termo, pagina, tamanho_pagina, filtros, **opcoes_destaque)
+    resultado = es.search(index=INDEX, body=consulta)
+    return resultado["hits"]["hits"], resultado["hits"]["total"]["value"]
+
+
+def busca_hibrida(es, termo: str, vetor: List[float], pagina: int = 1, tamanho_pagina: int = 10,
+                  modo_fusao: str = MODO_FUSAO, modo_vetores: str = "float", armazem=None,
+                  **opcoes) -> Tuple[List[Dict], int]:
+    """Busca BM25 + kNN em uma única requisição, com as notas fundidas pelo Elasticsearch.
+
+    Em índices com vetores quantizados e com o ``armazem`` dos vetores
+    completos, a busca é feita em duas fases (``busca_hibrida_reescore``).
+    """
+    if modo_vetores != "float" and armazem is not None:
+        return busca_hibrida_reescore(es, termo, vetor, armazem, pagina, tamanho_pagina, modo_fusao,
+                                      modo_vetores, **opcoes)
+    if modo_vetores == "byte":
+        vetor = quantizar(vetor).tolist()
+
+    if modo_fusao == "rrf" and not _rrf_disponivel:
+        modo_fusao = "ponderada"
+
+    consulta = montar_consulta_hibrida(termo, vetor, pagina, tamanho_pagina, modo_fusao, **opcoes)
+    try:
+        resultado = es.search(index=INDEX, body=consulta)
+    except ApiError as e:
+        if modo_fusao != "rrf" or not _rrf_recusado(e):
+            raise
+        _marcar_rrf_indisponivel()
+        consulta = montar_consulta_hibrida(termo, vetor, pagina, tamanho_pagina, "ponderada", **opcoes)
+        resultado = es.search(index=INDEX, body=consulta)
+
+    return resultado["hits"]["hits"], resultado["hits"]["total"]["value"]
+
+
+def busca_hibrida_reescore(es, termo: str, vetor: List[float], armazem, pagina: int = 1, tamanho_pagina: int = 10,
+                           modo_fusao: str = MODO_FUSAO, modo_vetores: str = "byte", k: int = KNN_K,
+                           num_candidatos: int = KNN_NUM_CANDIDATOS, constante_rrf: int = CONSTANTE_RRF,
+                           peso_textual: float = PESO_TEXTUAL, peso_semantico: float = PESO_SEMANTICO,
+                           filtros: Optional[Dict] = None, tamanho_destaque: int = TAMANHO_DESTAQUE,
+                           numero_destaques: int = NUMERO_DESTAQUES,
+                           fator_reescore: int = FATOR_REESCORE) -> Tuple[List[Dict], int]:
+    """Busca híbrida em duas fases, para índices com vetores quantizados.
+
+    Uma requisição ``_msearch`` traz o BM25 e ``k * fator_reescore``
+    candidatos do kNN sobre os vetores compactos. Os candidatos são
+    reordenados com os vetores completos do armazém e fundidos aqui com o
+    BM25. Os documentos que só vieram do kNN recebem ``_source`` e destaques
+    em uma segunda requisição.
+    """
+    inicio = (pagina - 1) * tamanho_pagina
+    k = max(k, inicio + tamanho_pagina)
+    vetor_indice = quantizar(vetor).tolist() if modo_vetores == "byte" else vetor
+
+    textual = montar_consulta_textual(termo, 1, k, filtros, tamanho_destaque, numero_destaques)
+    semantica = montar_consulta_semantica(vetor_indice, k * fator_reescore, num_candidatos * fator_reescore, filtros)
+    respostas = es.msearch(index=INDEX, searches=[{}, textual, {}, semantica])["responses"]
+    for resposta in respostas:
+        if "error" in resposta:
+            raise RuntimeError(f"Erro na busca híbrida: {resposta['error']}")
+
+    hits_textuais = respostas[0]["hits"]["hits"]
+    hits_semanticos = reescorar(respostas[1]["hits"]["hits"], vetor, armazem)[:k]
+    fundidos = fundir_resultados(hits_textuais, hits_semanticos, modo_fusao, constante_rrf,
+                                 peso_textual, peso_semantico)
+    hits = fundidos[inicio:inicio + tamanho_pagina]
+
+    faltantes = [hit["_id"] for hit in hits if "_source" not in hit]
+    if faltantes:
+        consulta = {"size": len(faltantes), "query": {"ids": {"values": faltantes}}, "_source": CAMPOS_RETORNO}
+        if numero_destaques > 0:
+            consulta["highlight"] = {**montar_destaque(tamanho_destaque, numero_destaques),
+                                     "highlight_query": montar_query_textual(termo)}
+        completos = {hit["_id"]: hit for hit in es.search(index=INDEX, body=consulta)["hits"]["hits"]}
+        hits = [{**completos.get(hit["_id"], {}), **hit} if "_source" not in hit else hit for hit in hits]
+
+    total = max(respostas[0]["hits"]["total"]["value"], len(fundidos))
+    return hits, total
+
+
+class ResultadoPaginado:
+    """Conjunto de resultados de uma busca, paginado sob demanda.
+
+    Os primeiros ``janela`` resultados vêm de uma única consulta híbrida (ou
+    textual, sem vetor) e as páginas dentro dela são fatias em memória. Depois
+    da janela, a busca continua só pelo BM25, excluindo o que já apareceu,
+    com point-in-time e ``search_after``: cada página seguinte custa uma
+    requisição, sem o custo crescente do ``from``. O total é exato: o tamanho
+    da janela mais a contagem dos documentos que casam com o texto fora dela.
+    """
+
+    def __init__(self, es, termo: str, vetor: Optional[List[float]] = None, filtros: Optional[Dict] = None,
+                 janela: int = JANELA_HIBRIDA, tamanho_destaque: int = TAMANHO_DESTAQUE,
+                 numero_destaques: int = NUMERO_DESTAQUES, **opcoes_hibrida):
+        self.es = es
+        self.termo = termo
+        self.filtros = filtros
+        self.destaque = montar_destaque(tamanho_destaque, numero_destaques) if numero_destaques > 0 else None
+        self._lock = threading.Lock()
+
+        opcoes_destaque = {"tamanho_destaque": tamanho_destaque, "numero_destaques": numero_destaques}
+        with medir("busca_janela", modo="hibrida" if vetor is not None else "textual"):
+            if vetor is not None:
+                self.janela, _ = busca_hibrida(es, termo, vetor, 1, janela, filtros=filtros,
+                                               **opcoes_destaque, **opcoes_hibrida)
+            else:
+                self.janela, _ = busca_textual(es, termo, 1, janela, filtros, **opcoes_destaque)
+
+        self._ids_janela = [hit["_id"] for hit in self.janela]
+        self._pit_id = None
+        # posição na continuação -> valores de "sort" do último resultado antes dela
+        self._cursores = {0: None}
+
+        if len(self.janela) < janela:
+            # Tudo o que existe coube na janela
+            self.total = len(self.janela)
+        else:
+            contagem = self.es.count(index=INDEX, query=self._query_continuacao())
+            self.total = len(self.janela) + contagem["count"]
+
+    def _query_continuacao(self) -> Dict:
+        return {
+            "bool": {
+                "must": [montar_query_textual(self.termo, self.filtros)],
+                "must_not": [{"ids": {"values": self._ids_janela}}]
+            }
+        }
+
+    def pagina(self, pagina: int, tamanho_pagina: int) -> List[Dict]:
+        """Resultados de uma página (numeração a partir de 1)"""
+        inicio = (pagina - 1) * tamanho_pagina
+        fim = min(inicio + tamanho_pagina, self.total)
+        hits = self.janela[inicio:fim]
+
+        faltam = fim - inicio - len(hits)
+        if faltam > 0:
+            with self._lock, medir("busca_continuacao"):
+                hits = hits + self._continuacao(max(0, inicio - len(self.janela)), faltam)
+
+        return hits
+
+    def _continuacao(self, posicao: int, quantidade: int) -> List[Dict]:
+        """Busca ``quantidade`` resultados a partir de ``posicao`` da continuação"""
+        try:
+            return self._ler_continuacao(posicao, quantidade)
+        except NotFoundError:
+            # O point-in-time expirou: abre outro e recomeça os cursores
+            self._pit_id = None
+            self._cursores = {0: None}
+            return self._ler_continuacao(posicao, quantidade)
+
+    def _ler_continuacao(self, posicao: int, quantidade: int) -> List[Dict]:
+        if self._pit_id is None:
+            self._pit_id = self.es.open_point_in_time(index=INDEX, keep_alive=KEEP_ALIVE_PIT)["id"]
+
+        # Parte do cursor conhecido mais próximo e pula até a posição pedida
+        # (só acontece em saltos, como ir direto para a última página)
+        atual = max(p for p in self._cursores if p <= posicao)
+        while atual < posicao:
+            pulo = min(posicao - atual, 10000)
+            hits = self._buscar_com_pit(self._cursores[atual], pulo, com_source=False)
+            if not hits:
+                return []
+            atual += len(hits)
+            self._cursores[atual] = hits[-1]["sort"]
+
+        hits = self._buscar_com_pit(self._cursores[posicao], quantidade, com_source=True)
+        if hits:
+            self._cursores[posicao + len(hits)] = hits[-1]["sort"]
+        return hits
+
+    def _buscar_com_pit(self, cursor, quantidade: int, com_source: bool) -> List[Dict]:
+        corpo = {
+            "size": quantidade,
+            "query": self._query_continuacao(),
+            "pit": {"id": self._pit_id, "keep_alive": KEEP_ALIVE_PIT},
+            # O PIT acrescenta o desempate implícito por _shard_doc
+            "sort": [{"_score": "desc"}],
+            "track_total_hits": False,
+            "_source": CAMPOS_RETORNO if com_source else False
+        }
+        if cursor is not None:
+            corpo["search_after"] = cursor
+        if com_source and self.destaque:
+            corpo["highlight"] = self.destaque
+
+        resultado = self.es.search(body=corpo)
+        self._pit_id = resultado.get("pit_id", self._pit_id)
+        return resultado["hits"]["hits"]
+
+    def fechar(self):
+        """Libera o point-in-time no Elasticsearch"""
+        if self._pit_id is not None:
+            self.es.close_point_in_time(id=self._pit_id)
+            self._pit_id = None
+
+
+def carregar_documento(es, doc_id: str) -> Dict:
+    """Carrega o documento completo (com o conteúdo), só quando ele é aberto"""
+    return es.get(index=INDEX, id=doc_id, source_includes=CAMPOS_DOCUMENTO)
@@ -0,0 +1,675 @@
+import os
+import re
+import json
+import math
+import mmap
+import shutil
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import busca
+from embeddings import DIMENSAO_EMBEDDINGS
+from instrumentacao import medir
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DO ÍNDICE LOCAL
+# =====================================================
+# Alternativa ao Elasticsearch para instalações sem servidor: o índice fica
+# em arquivos .npy mapeados em memória e a busca roda no próprio processo.
+# Com IFAL_BACKEND=local, o indexador grava este índice e o app o lê.
+
+BACKEND = os.environ.get("IFAL_BACKEND", "elasticsearch")
+
+PASTA_INDICE_LOCAL = "cache/indice_local"
+
+# Campos pesquisados pelo BM25 (a nota do documento é a do melhor campo,
+# como no multi_match do Elasticsearch)
+CAMPOS_BM25 = ("conteudo", "arquivo", "ementa")
+
+# Parâmetros do BM25 (os mesmos padrões do Elasticsearch)
+K1 = 1.2
+B = 0.75
+
+# Termos mais longos que isso são truncados (na indexação e na consulta)
+TAMANHO_MAXIMO_TERMO = 40
+
+# A partir de quantos trechos os vetores são divididos em listas (IVF) e só
+# as listas mais próximas da consulta são comparadas
+LIMIAR_IVF = 50_000
+LISTAS_POR_RAIZ = 1.0  # listas = raiz do número de trechos x este fator
+SONDAGENS_IVF = 8
+ITERACOES_KMEANS = 10
+AMOSTRA_KMEANS = 100_000
+
+PADRAO_TERMO = re.compile(r"\w+")
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Termos em minúsculas, como o analisador padrão do Elasticsearch (sem fuzziness)"""
+    return [termo[:TAMANHO_MAXIMO_TERMO] for termo in PADRAO_TERMO.findall(str(texto or "").lower())]
+
+
+def usar_indice_local() -> bool:
+    return BACKEND == "local"
+
+# =====================================================
+# 🔤 ÍNDICE INVERTIDO (BM25) DE UM CAMPO
+# =====================================================
+
+def construir_campo(textos: List[str]) -> Dict[str, np.ndarray]:
+    """Postings de um campo: termos ordenados e, para cada um, documentos e frequências"""
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    tamanhos = np.zeros(len(textos), dtype=np.int32)
+    for posicao, texto in enumerate(textos):
+        frequencias = Counter(tokenizar(texto))
+        tamanhos[posicao] = sum(frequencias.values())
+        for termo, frequencia in frequencias.items():
+            postings.setdefault(termo, []).append((posicao, frequencia))
+
+    termos = sorted(postings)
+    quantidades = np.fromiter((len(postings[termo]) for termo in termos), dtype=np.int64, count=len(termos))
+    inicios = np.zeros(len(termos) + 1, dtype=np.int64)
+    np.cumsum(quantidades, out=inicios[1:])
+
+    documentos = np.empty(inicios[-1], dtype=np.int32)
+    frequencias = np.empty(inicios[-1], dtype=np.uint16)
+    for indice, termo in enumerate(termos):
+        pares = np.asarray(postings[termo], dtype=np.int64)
+        documentos[inicios[indice]:inicios[indice + 1]] = pares[:, 0]
+        frequencias[inicios[indice]:inicios[indice + 1]] = np.minimum(pares[:, 1], np.iinfo(np.uint16).max)
+
+    return {
+        # Bytes UTF-8 de tamanho fixo: ordenáveis e pesquisáveis direto do mmap
+        "termos": np.array([termo.encode("utf-8") for termo in termos] or [b""], dtype=bytes)[:len(termos)],
+        "inicios": inicios,
+        "documentos": documentos,
+        "frequencias": frequencias,
+        "tamanhos": tamanhos,
+    }
+
+
+class CampoBM25:
+    """Consulta BM25 sobre os arrays de ``construir_campo`` (em memória ou mapeados)"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.termos = arrays["termos"]
+        self.inicios = arrays["inicios"]
+        self.documentos = arrays["documentos"]
+        self.frequencias = arrays["frequencias"]
+        self.tamanhos = arrays["tamanhos"]
+        total = len(self.tamanhos)
+        media = float(self.tamanhos.sum()) / total if total else 1.0
+        self.normalizacao = K1 * (1 - B + B * np.asarray(self.tamanhos, dtype=np.float32) / max(media, 1e-9))
+
+    def notas(self, termos: List[str]) -> np.ndarray:
+        """Nota de cada documento (zero para os que não contêm nenhum termo)"""
+        total = len(self.tamanhos)
+        notas = np.zeros(total, dtype=np.float32)
+        if not total or not len(self.termos):
+            return notas
+
+        for termo in set(termos):
+            chave = termo.encode("utf-8")
+            posicao = int(np.searchsorted(self.termos, chave))
+            if posicao >= len(self.termos) or self.termos[posicao] != chave:
+                continue
+            inicio, fim = int(self.inicios[posicao]), int(self.inicios[posicao + 1])
+            documentos = self.documentos[inicio:fim]
+            frequencias = self.frequencias[inicio:fim].astype(np.float32)
+            idf = math.log(1 + (total - len(documentos) + 0.5) / (len(documentos) + 0.5))
+            notas[documentos] += idf * frequencias * (K1 + 1) / (frequencias + self.normalizacao[documentos])
+        return notas
+
+# =====================================================
+# 📦 ÍNDICE LOCAL (LEITURA)
+# =====================================================
+# Cada gravação cria uma pasta de versão; "atual.json" aponta para a vigente.
+# Quem está lendo continua com a versão que mapeou até recarregar. As ementas
+# mudam sem reindexar e ficam à parte, em "ementas.json".
+
+ARQUIVO_ATUAL = "atual.json"
+ARQUIVO_EMENTAS = "ementas.json"
+
+
+class _Versao:
+    """Arrays de uma versão do índice, mapeados em memória (nada é copiado)"""
+
+    def __init__(self, pasta: str):
+        self.pasta = pasta
+        with open(os.path.join(pasta, "documentos.json"), "r", encoding="utf-8") as f:
+            documentos = json.load(f)
+        self.ids: List[str] = documentos["ids"]
+        self.arquivos: List[str] = documentos["arquivos"]
+        self.hashes: List[str] = documentos["hashes"]
+        self.posicoes = {doc_id: posicao for posicao, doc_id in enumerate(self.ids)}
+
+        carregar = lambda nome: np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode="r")
+        self.deslocamentos = carregar("conteudo_deslocamentos")
+        self.vetores = carregar("trechos_vetores")
+        self.donos = carregar("trechos_documentos")
+        # Ordem de cada vetor entre os trechos do documento (versões antigas não têm)
+        self.numeros = None
+        if os.path.exists(os.path.join(pasta, "trechos_numeros.npy")):
+            self.numeros = carregar("trechos_numeros")
+        self.campos = {
+            campo: CampoBM25({parte: carregar(f"{campo}_{parte}")
+                              for parte in ("termos", "inicios", "documentos", "frequencias", "tamanhos")})
+            for campo in ("conteudo", "arquivo")
+        }
+
+        self.centroides = self.listas = None
+        if os.path.exists(os.path.join(pasta, "ivf_centroides.npy")):
+            self.centroides = carregar("ivf_centroides")
+            self.listas = carregar("ivf_inicios")
+
+        self._arquivo_conteudo = open(os.path.join(pasta, "conteudo.bin"), "rb")
+        tamanho = os.fstat(self._arquivo_conteudo.fileno()).st_size
+        self._conteudo = mmap.mmap(self._arquivo_conteudo.fileno(), 0, access=mmap.ACCESS_READ) if tamanho else b""
+
+    def conteudo_bytes(self, posicao: int) -> bytes:
+        return self._conteudo[int(self.deslocamentos[posicao]):int(self.deslocamentos[posicao + 1])]
+
+    def conteudo(self, posicao: int) -> str:
+        return self.conteudo_bytes(posicao).decode("utf-8")
+
+
+class Leitura:
+    """Uma versão do índice com as ementas lidas junto: tudo o que uma busca consulta.
+
+    Quem guarda uma ``Leitura`` (como ``ResultadoLocal``) continua vendo a
+    mesma versão mesmo que o índice seja regravado no meio da paginação.
+    """
+
+    def __init__(self, versao: _Versao, nome: str, ementas: Dict[str, Dict], ementas_lidas_em):
+        self.versao = versao
+        self.nome = nome
+        self.ementas = ementas
+        self.ementas_lidas_em = ementas_lidas_em
+        # As ementas são curtas: o índice invertido delas é montado aqui mesmo
+        textos = [ementas.get(doc_id, {}).get("ementa", "") for doc_id in versao.ids]
+        self.campo_ementa = CampoBM25(construir_campo(textos))
+
+    @property
+    def total_documentos(self) -> int:
+        return len(self.versao.ids)
+
+    def _fonte(self, posicao: int, campos) -> Dict:
+        versao = self.versao
+        ementa = self.ementas.get(versao.ids[posicao], {})
+        fonte = {
+            "arquivo": versao.arquivos[posicao],
+            "hash_conteudo": versao.hashes[posicao],
+            "ementa": ementa.get("ementa", ""),
+            "tem_ementa": bool(ementa.get("tem_ementa")),
+            "hash_conteudo_ementa": ementa.get("hash_conteudo_ementa"),
+        }
+        if "conteudo" in campos:
+            fonte["conteudo"] = versao.conteudo(posicao)
+        return {campo: fonte[campo] for campo in campos if campo in fonte}
+
+    def documento(self, doc_id: str, campos=busca.CAMPOS_DOCUMENTO) -> Dict:
+        """Documento no formato de um ``get`` do Elasticsearch"""
+        posicao = self.versao.posicoes.get(doc_id)
+        if posicao is None:
+            raise KeyError(f"Documento {doc_id} não está no índice local")
+        return {"_id": doc_id, "_source": self._fonte(posicao, campos)}
+
+    def vetores_documento(self, doc_id: str) -> Optional[np.ndarray]:
+        """Vetores dos trechos do documento, na ordem dos trechos (None se a versão não a guarda)"""
+        posicao = self.versao.posicoes.get(doc_id)
+        if posicao is None or self.versao.numeros is None:
+            return None
+        linhas = np.flatnonzero(self.versao.donos == posicao)
+        numeros = self.versao.numeros[linhas]
+        if np.any(numeros < 0):
+            return None
+        return np.asarray(self.versao.vetores[linhas[np.argsort(numeros)]])
+
+    def _mascara_filtros(self, filtros: Optional[Dict]) -> Optional[np.ndarray]:
+        if not filtros:
+            return None
+        total = self.total_documentos
+        mascara = np.ones(total, dtype=bool)
+        for campo, valor in filtros.items():
+            aceitos = set(valor) if isinstance(valor, (list, tuple, set, frozenset)) else {valor}
+            mascara &= np.fromiter((self._fonte(posicao, [campo]).get(campo) in aceitos for posicao in range(total)),
+                                   dtype=bool, count=total)
+        return mascara
+
+    def notas_textuais(self, termo: str, filtros: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Posições dos documentos que casam com o texto, da melhor para a pior nota"""
+        if not self.total_documentos:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        termos = tokenizar(termo)
+        campos = [self.versao.campos["conteudo"], self.versao.campos["arquivo"], self.campo_ementa]
+        notas = np.max([campo.notas(termos) for campo in campos], axis=0)
+
+        mascara = notas > 0
+        filtro = self._mascara_filtros(filtros)
+        if filtro is not None:
+            mascara &= filtro
+        posicoes = np.flatnonzero(mascara)
+        ordem = np.argsort(-notas[posicoes], kind="stable")
+        return posicoes[ordem], notas[posicoes[ordem]]
+
+    def notas_semanticas(self, vetor, k: int, filtros: Optional[Dict] = None,
+                         sondagens: int = SONDAGENS_IVF) -> Tuple[np.ndarray, np.ndarray]:
+        """Os ``k`` documentos com o trecho mais próximo do vetor (nota do cosseno como no Elasticsearch)"""
+        versao = self.versao
+        if not len(versao.vetores):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        consulta = np.asarray(vetor, dtype=np.float32)
+        consulta /= max(np.linalg.norm(consulta), 1e-12)
+
+        if versao.centroides is not None:
+            # Só as listas cujos centróides estão mais próximos da consulta
+            listas = np.argsort(-(versao.centroides @ consulta))[:sondagens]
+            linhas = np.concatenate([np.arange(versao.listas[lista], versao.listas[lista + 1]) for lista in listas])
+            similaridades = versao.vetores[linhas] @ consulta
+            donos = versao.donos[linhas]
+        else:
+            similaridades = versao.vetores @ consulta
+            donos = versao.donos
+
+        notas = np.full(self.total_documentos, -np.inf, dtype=np.float32)
+        np.maximum.at(notas, donos, similaridades)
+        filtro = self._mascara_filtros(filtros)
+        if filtro is not None:
+            notas[~filtro] = -np.inf
+
+        candidatos = np.flatnonzero(np.isfinite(notas))
+        k = min(k, len(candidatos))
+        melhores = candidatos[np.argpartition(-notas[candidatos], k - 1)[:k]] if k else candidatos
+        melhores = melhores[np.argsort(-notas[melhores], kind="stable")]
+        return melhores, (1.0 + notas[melhores]) / 2.0
+
+    def hits(self, posicoes, notas, termo: str, campos=busca.CAMPOS_RETORNO,
+             tamanho_destaque: int = busca.TAMANHO_DESTAQUE, numero_destaques: int = busca.NUMERO_DESTAQUES) -> List[Dict]:
+        """Resultados no formato dos hits do Elasticsearch, com os trechos destacados"""
+        padrao = _padrao_destaque(tokenizar(termo)) if numero_destaques > 0 else None
+        resultado = []
+        for posicao, nota in zip(posicoes, notas):
+            hit = {"_id": self.versao.ids[posicao], "_score": float(nota), "_source": self._fonte(posicao, campos)}
+            if padrao is not None:
+                fragmentos = _destacar(self.versao.conteudo(posicao), padrao, tamanho_destaque, numero_destaques)
+                hit["highlight"] = {"conteudo": fragmentos} if fragmentos else {}
+            resultado.append(hit)
+        return resultado
+
+    def posicoes_pendentes(self, a_partir_de: str = None) -> List[int]:
+        """Documentos sem ementa ou com ementa de outro conteúdo, em ordem de arquivo"""
+        versao = self.versao
+        pendentes = []
+        for posicao in sorted(range(len(versao.ids)), key=lambda p: versao.arquivos[p]):
+            if a_partir_de is not None and versao.arquivos[posicao] <= a_partir_de:
+                continue
+            ementa = self.ementas.get(versao.ids[posicao], {})
+            if ementa.get("tem_ementa") and ementa.get("hash_conteudo_ementa") == versao.hashes[posicao]:
+                continue
+            pendentes.append(posicao)
+        return pendentes
+
+
+class IndiceLocal:
+    """Índice local pronto para busca, recarregado quando o indexador grava outra versão"""
+
+    def __init__(self, pasta: str = PASTA_INDICE_LOCAL):
+        self.pasta = pasta
+        self._lock = threading.Lock()
+        self._leitura: Optional[Leitura] = None
+        self.recarregar_se_mudou()
+
+    @staticmethod
+    def existe(pasta: str = PASTA_INDICE_LOCAL) -> bool:
+        return os.path.exists(os.path.join(pasta, ARQUIVO_ATUAL))
+
+    def recarregar_se_mudou(self) -> Leitura:
+        """Passa a usar a versão mais recente e as ementas gravadas desde a última leitura"""
+        with self._lock:
+            with open(os.path.join(self.pasta, ARQUIVO_ATUAL), "r", encoding="utf-8") as f:
+                nome = json.load(f)["versao"]
+            caminho_ementas = os.path.join(self.pasta, ARQUIVO_EMENTAS)
+            lidas_em = os.stat(caminho_ementas).st_mtime_ns if os.path.exists(caminho_ementas) else None
+
+            atual = self._leitura
+            if atual is None or atual.nome != nome or atual.ementas_lidas_em != lidas_em:
+                versao = atual.versao if atual is not None and atual.nome == nome else _Versao(os.path.join(self.pasta, nome))
+                self._leitura = Leitura(versao, nome, _ler_ementas(self.pasta), lidas_em)
+            return self._leitura
+
+    def atual(self) -> Leitura:
+        return self.recarregar_se_mudou()
+
+    def geracao(self) -> Tuple:
+        """Muda sempre que o conteúdo ou as ementas mudam (para o cache de resultados)"""
+        leitura = self.atual()
+        return leitura.nome, leitura.ementas_lidas_em
+
+    def documento(self, doc_id: str, campos=busca.CAMPOS_DOCUMENTO) -> Dict:
+        return self.atual().documento(doc_id, campos)
+
+    def vetores_documento(self, doc_id: str) -> Optional[np.ndarray]:
+        return self.atual().vetores_documento(doc_id)
+
+    def contar_pendentes(self, a_partir_de: str = None) -> int:
+        return len(self.atual().posicoes_pendentes(a_partir_de))
+
+    def documentos_pendentes(self, a_partir_de: str = None) -> Iterator[Dict]:
+        """Documentos à espera de ementa, no formato dos hits do Elasticsearch"""
+        leitura = self.atual()
+        for posicao in leitura.posicoes_pendentes(a_partir_de):
+            yield {"_id": leitura.versao.ids[posicao],
+                   "_source": leitura._fonte(posicao, ["arquivo", "conteudo", "hash_conteudo"])}
+
+    def gravar_ementas(self, ementas: Dict[str, Dict]):
+        """Grava {doc_id: campos da ementa}, preservando as demais"""
+        with self._lock:
+            atuais = _ler_ementas(self.pasta)
+            atuais.update(ementas)
+            _gravar_json(os.path.join(self.pasta, ARQUIVO_EMENTAS), atuais)
+        self.recarregar_se_mudou()
+
+    def podar_ementas(self, ids):
+        """Descarta as ementas dos documentos que não estão em ``ids``"""
+        ids = set(ids)
+        with self._lock:
+            atuais = _ler_ementas(self.pasta)
+            if all(doc_id in ids for doc_id in atuais):
+                return
+            _gravar_json(os.path.join(self.pasta, ARQUIVO_EMENTAS),
+                         {doc_id: ementa for doc_id, ementa in atuais.items() if doc_id in ids})
+        self.recarregar_se_mudou()
+
+
+def _ler_ementas(pasta: str) -> Dict[str, Dict]:
+    caminho = os.path.join(pasta, ARQUIVO_EMENTAS)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _gravar_json(caminho: str, dados):
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def _padrao_destaque(termos: List[str]):
+    termos = sorted(set(termos), key=len, reverse=True)
+    if not termos:
+        return None
+    return re.compile(r"\b(" + "|".join(map(re.escape, termos)) + r")\b", re.IGNORECASE)
+
+
+def _destacar(texto: str, padrao, tamanho: int, numero: int) -> List[str]:
+    """Fragmentos em volta das primeiras ocorrências, com os termos entre <mark>"""
+    if padrao is None:
+        return []
+    fragmentos = []
+    fim_anterior = -1
+    for ocorrencia in padrao.finditer(texto):
+        if ocorrencia.start() < fim_anterior:
+            continue
+        inicio = max(0, ocorrencia.start() - tamanho // 2)
+        fim_anterior = min(len(texto), inicio + tamanho)
+        fragmentos.append(padrao.sub(r"<mark>\1</mark>", texto[inicio:fim_anterior]))
+        if len(fragmentos) >= numero:
+            break
+    return fragmentos
+
+# =====================================================
+# ✍️ GRAVAÇÃO DO ÍNDICE LOCAL
+# =====================================================
+
+class EscritorIndiceLocal:
+    """Monta uma nova versão do índice a partir da anterior e das ações do indexador.
+
+    Recebe as mesmas ações ``_bulk`` que iriam ao Elasticsearch (``index``
+    com os trechos já codificados, ou ``delete``). Documentos que não mudaram
+    são copiados da versão anterior: os vetores e o texto, sem recodificar;
+    só o índice invertido é refeito. As ementas gravadas no mesmo processo
+    devem passar pelo ``leitor`` do escritor, que as protege com o mesmo lock.
+    """
+
+    def __init__(self, pasta: str = PASTA_INDICE_LOCAL, dimensao: int = DIMENSAO_EMBEDDINGS):
+        self.pasta = pasta
+        self.dimensao = dimensao
+        self._leitor: Optional[IndiceLocal] = IndiceLocal(pasta) if IndiceLocal.existe(pasta) else None
+        self._anterior = self._leitor.atual().versao if self._leitor is not None else None
+        self._novos: Dict[str, Dict] = {}
+        self._removidos = set()
+
+    @property
+    def leitor(self) -> IndiceLocal:
+        """Leitor do índice gravado por este escritor (só existe depois da primeira versão)"""
+        if self._leitor is None:
+            self._leitor = IndiceLocal(self.pasta)
+        return self._leitor
+
+    @property
+    def vazio(self) -> bool:
+        return self._anterior is None
+
+    def limpar(self):
+        """Descarta a versão anterior: a próxima gravação começa do zero"""
+        self._anterior = None
+
+    def remover(self, doc_id: str):
+        self._novos.pop(doc_id, None)
+        self._removidos.add(doc_id)
+
+    def aplicar(self, acao: Dict):
+        if acao["_op_type"] == "delete":
+            self.remover(acao["_id"])
+            return
+        fonte = acao["_source"]
+        vetores = np.asarray([trecho["embedding"] for trecho in fonte["trechos"]], dtype=np.float32)
+        self._novos[acao["_id"]] = {
+            "arquivo": fonte["arquivo"],
+            "conteudo": fonte["conteudo"],
+            "hash_conteudo": fonte.get("hash_conteudo"),
+            "vetores": vetores.reshape(-1, self.dimensao),
+        }
+        self._removidos.discard(acao["_id"])
+
+    def gravar(self, acoes, ao_confirmar: Callable = None) -> Tuple[int, int]:
+        """Aplica as ações, grava a nova versão e só então confirma cada uma"""
+        confirmadas = []
+        for acao in acoes:
+            self.aplicar(acao)
+            confirmadas.append((acao["_op_type"], acao["_id"]))
+        self.salvar()
+        if ao_confirmar:
+            for operacao, doc_id in confirmadas:
+                ao_confirmar(True, {operacao: {"_id": doc_id}})
+        return len(confirmadas), 0
+
+    def salvar(self):
+        """Grava a nova versão e passa a apontar para ela"""
+        with medir("indice_local_gravacao") as span:
+            nome = f"v{time.time_ns()}"
+            destino = os.path.join(self.pasta, nome)
+            os.makedirs(destino)
+            documentos = self._gravar_versao(destino)
+            span.anotar(documentos=documentos)
+
+        _gravar_json(os.path.join(self.pasta, ARQUIVO_ATUAL), {"versao": nome})
+        self._descartar_versoes_antigas(nome)
+
+        # Ementas de documentos que saíram do índice não servem mais
+        atual = self.leitor.recarregar_se_mudou().versao
+        self.leitor.podar_ementas(atual.ids)
+
+        self._anterior = atual
+        self._novos, self._removidos = {}, set()
+
+    def _gravar_versao(self, destino: str) -> int:
+        anterior = self._anterior
+        mantidos = []
+        if anterior is not None:
+            mantidos = [posicao for posicao, doc_id in enumerate(anterior.ids)
+                        if doc_id not in self._removidos and doc_id not in self._novos]
+        novos = list(self._novos.items())
+
+        ids = [anterior.ids[p] for p in mantidos] + [doc_id for doc_id, _ in novos]
+        arquivos = [anterior.arquivos[p] for p in mantidos] + [doc["arquivo"] for _, doc in novos]
+        hashes = [anterior.hashes[p] for p in mantidos] + [doc["hash_conteudo"] for _, doc in novos]
+        _gravar_json(os.path.join(destino, "documentos.json"), {"ids": ids, "arquivos": arquivos, "hashes": hashes})
+
+        # Texto: os bytes dos documentos mantidos são copiados como estão
+        textos = []
+        deslocamentos = np.zeros(len(ids) + 1, dtype=np.int64)
+        with open(os.path.join(destino, "conteudo.bin"), "wb") as f:
+            for i, posicao in enumerate(mantidos):
+                dados = anterior.conteudo_bytes(posicao)
+                f.write(dados)
+                deslocamentos[i + 1] = deslocamentos[i] + len(dados)
+                textos.append(dados.decode("utf-8"))
+            for i, (_, doc) in enumerate(novos, len(mantidos)):
+                dados = doc["conteudo"].encode("utf-8")
+                f.write(dados)
+                deslocamentos[i + 1] = deslocamentos[i] + len(dados)
+                textos.append(doc["conteudo"])
+        np.save(os.path.join(destino, "conteudo_deslocamentos.npy"), deslocamentos)
+
+        for campo, valores in (("conteudo", textos), ("arquivo", arquivos)):
+            for parte, array in construir_campo(valores).items():
+                np.save(os.path.join(destino, f"{campo}_{parte}.npy"), array)
+
+        # Vetores: as linhas dos documentos mantidos, renumeradas, e as dos novos
+        partes_vetores, partes_donos, partes_numeros = [], [], []
+        if anterior is not None and mantidos:
+            nova_posicao = np.full(len(anterior.ids), -1, dtype=np.int64)
+            nova_posicao[mantidos] = np.arange(len(mantidos))
+            linhas = np.flatnonzero(nova_posicao[anterior.donos] >= 0)
+            partes_vetores.append(np.asarray(anterior.vetores[linhas]))
+            partes_donos.append(nova_posicao[anterior.donos[linhas]].astype(np.int32))
+            partes_numeros.append(np.asarray(anterior.numeros[linhas]) if anterior.numeros is not None
+                                  else np.full(len(linhas), -1, dtype=np.int32))
+        for i, (_, doc) in enumerate(novos, len(mantidos)):
+            vetores = doc["vetores"]
+            vetores = vetores / np.maximum(np.linalg.norm(vetores, axis=1, keepdims=True), 1e-12)
+            partes_vetores.append(vetores.astype(np.float32))
+            partes_donos.append(np.full(len(vetores), i, dtype=np.int32))
+            partes_numeros.append(np.arange(len(vetores), dtype=np.int32))
+
+        vetores = np.concatenate(partes_vetores) if partes_vetores else np.zeros((0, self.dimensao), np.float32)
+        donos = np.concatenate(partes_donos) if partes_donos else np.zeros(0, np.int32)
+        numeros = np.concatenate(partes_numeros) if partes_numeros else np.zeros(0, np.int32)
+
+        if len(vetores) >= LIMIAR_IVF:
+            ordem, centroides, inicios = construir_ivf(vetores)
+            vetores, donos, numeros = vetores[ordem], donos[ordem], numeros[ordem]
+            np.save(os.path.join(destino, "ivf_centroides.npy"), centroides)
+            np.save(os.path.join(destino, "ivf_inicios.npy"), inicios)
+
+        np.save(os.path.join(destino, "trechos_vetores.npy"), vetores)
+        np.save(os.path.join(destino, "trechos_documentos.npy"), donos)
+        np.save(os.path.join(destino, "trechos_numeros.npy"), numeros)
+        return len(ids)
+
+    def _descartar_versoes_antigas(self, atual: str):
+        for nome in os.listdir(self.pasta):
+            if nome.startswith("v") and nome != atual and os.path.isdir(os.path.join(self.pasta, nome)):
+                # No Windows a pasta de uma versão ainda mapeada por outro processo não pode
+                # ser apagada; fica para a próxima gravação
+                shutil.rmtree(os.path.join(self.pasta, nome), ignore_errors=True)
+
+
+def construir_ivf(vetores: np.ndarray, listas: int = None, iteracoes: int = ITERACOES_KMEANS,
+                  semente: int = 42) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Agrupa os vetores (k-means esférico) e devolve a ordem das linhas por lista.
+
+    Retorna ``(ordem, centroides, inicios)``: depois de reordenadas, as
+    linhas da lista ``i`` são ``inicios[i]:inicios[i + 1]``.
+    """
+    listas = listas or max(1, int(math.sqrt(len(vetores)) * LISTAS_POR_RAIZ))
+    gerador = np.random.default_rng(semente)
+    amostra = vetores[gerador.choice(len(vetores), min(len(vetores), AMOSTRA_KMEANS), replace=False)]
+    centroides = amostra[gerador.choice(len(amostra), listas, replace=False)].copy()
+
+    for _ in range(iteracoes):
+        atribuicao = np.argmax(amostra @ centroides.T, axis=1)
+        for lista in range(listas):
+            membros = amostra[atribuicao == lista]
+            # Lista vazia recebe um ponto qualquer da amostra
+            centroides[lista] = membros.sum(axis=0) if len(membros) else amostra[gerador.integers(len(amostra))]
+        centroides /= np.maximum(np.linalg.norm(centroides, axis=1, keepdims=True), 1e-12)
+
+    atribuicao = np.concatenate([
+        np.argmax(vetores[inicio:inicio + AMOSTRA_KMEANS] @ centroides.T, axis=1)
+        for inicio in range(0, len(vetores), AMOSTRA_KMEANS)
+    ])
+    ordem = np.argsort(atribuicao, kind="stable")
+    inicios = np.searchsorted(atribuicao[ordem], np.arange(listas + 1)).astype(np.int64)
+    return ordem, centroides.astype(np.float32), inicios
+
+# =====================================================
+# 🔎 RESULTADOS PAGINADOS
+# =====================================================
+
+class ResultadoLocal:
+    """O mesmo contrato de ``busca.ResultadoPaginado``, sobre o índice local.
+
+    A janela inicial funde o BM25 e o kNN (RRF ou soma ponderada, como na
+    busca do Elasticsearch); depois dela seguem os demais documentos que
+    casam com o texto. A ordem completa é calculada de uma vez e cada
+    página só monta os seus resultados.
+    """
+
+    def __init__(self, indice: IndiceLocal, termo: str, vetor: Optional[List[float]] = None,
+                 filtros: Optional[Dict] = None, janela: int = busca.JANELA_HIBRIDA,
+                 tamanho_destaque: int = busca.TAMANHO_DESTAQUE, numero_destaques: int = busca.NUMERO_DESTAQUES,
+                 modo_fusao: str = busca.MODO_FUSAO, k: int = busca.KNN_K, constante_rrf: int = busca.CONSTANTE_RRF,
+                 peso_textual: float = busca.PESO_TEXTUAL, peso_semantico: float = busca.PESO_SEMANTICO, **_):
+        # A paginação inteira usa a versão do índice lida agora
+        self.leitura = leitura = indice.atual()
+        self.termo = termo
+        self.tamanho_destaque = tamanho_destaque
+        self.numero_destaques = numero_destaques
+
+        with medir("busca_local", modo="hibrida" if vetor is not None else "textual"):
+            posicoes, notas = leitura.notas_textuais(termo, filtros)
+            if vetor is None:
+                self._ordem, self._notas = posicoes, notas
+            else:
+                textuais = [{"_id": int(p), "_score": float(n)} for p, n in zip(posicoes[:janela], notas[:janela])]
+                posicoes_knn, notas_knn = leitura.notas_semanticas(vetor, max(k, janela), filtros)
+                semanticos = [{"_id": int(p), "_score": float(n)} for p, n in zip(posicoes_knn, notas_knn)]
+                fundidos = busca.fundir_resultados(textuais, semanticos, modo_fusao, constante_rrf,
+                                                   peso_textual, peso_semantico)[:janela]
+
+                # Depois da janela, só o BM25, sem repetir o que já apareceu
+                na_janela = {hit["_id"] for hit in fundidos}
+                restantes = [i for i, p in enumerate(posicoes) if int(p) not in na_janela]
+                self._ordem = np.concatenate([
+                    np.asarray([hit["_id"] for hit in fundidos], dtype=np.int64), posicoes[restantes]
+                ]).astype(np.int64)
+                self._notas = np.concatenate([
+                    np.asarray([hit["_score"] for hit in fundidos], dtype=np.float32), notas[restantes]
+                ])
+
+        self.total = len(self._ordem)
+
+    def pagina(self, pagina: int, tamanho_pagina: int) -> List[Dict]:
+        """Resultados de uma página (numeração a partir de 1)"""
+        inicio = (pagina - 1) * tamanho_pagina
+        fim = min(inicio + tamanho_pagina, self.total)
+        return self.leitura.hits(self._ordem[inicio:fim], self._notas[inicio:fim], self.termo,
+                                tamanho_destaque=self.tamanho_destaque, numero_destaques=self.numero_destaques)
+
+    def fechar(self):
+        pass
+
+
+def carregar_documento(indice: IndiceLocal, doc_id: str) -> Dict:
+    """Documento completo, como ``busca.carregar_documento``"""
+    return indice.documento(doc_id, busca.CAMPOS_DOCUMENTO)
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Dict, Optional
+
+from instrumentacao import contar
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DO CACHE DE EMENTAS
+# =====================================================
+
+# Banco SQLite com as respostas do modelo e as ementas finais
+ARQUIVO_CACHE_EMENTAS = "cache/ementas.sqlite"
+
+# Tamanho máximo do texto guardado; acima disso as entradas usadas há mais
+# tempo são descartadas
+TAMANHO_MAXIMO_CACHE_EMENTAS = 256 * 1024 * 1024
+
+# Bytes lidos do início e do fim do GGUF para identificar o modelo
+BYTES_IDENTIDADE_MODELO = 1024 * 1024
+
+
+@lru_cache(maxsize=None)
+def identidade_modelo(model_path: str) -> str:
+    """Identifica o arquivo do modelo pelo tamanho e pelo hash das pontas.
+
+    Ler o GGUF inteiro levaria vários segundos; o início (cabeçalho e
+    metadados) e o fim bastam para distinguir modelos e quantizações.
+    """
+    tamanho = os.path.getsize(model_path)
+    h = hashlib.sha256(str(tamanho).encode("utf-8"))
+    with open(model_path, "rb") as f:
+        h.update(f.read(BYTES_IDENTIDADE_MODELO))
+        f.seek(max(0, tamanho - BYTES_IDENTIDADE_MODELO))
+        h.update(f.read(BYTES_IDENTIDADE_MODELO))
+    return f"{os.path.basename(model_path)}:{h.hexdigest()[:16]}"
+
+
+def chave_cache(*partes) -> str:
+    """Hash de tudo o que determina a resposta do modelo"""
+    return hashlib.sha256(json.dumps(partes, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class CacheEmentas:
+    """Cache em disco das respostas do LLM, com limite de tamanho e descarte LRU.
+
+    Guarda dois tipos de entrada: a resposta bruta do modelo para um chunk
+    (``"chunk"``) e a ementa final de um documento (``"ementa"``). As chaves
+    vêm de ``chave_cache`` e incluem o texto, o prompt, o modelo e os
+    parâmetros de geração, então mudar qualquer um deles invalida a entrada.
+    """
+
+    def __init__(self, caminho: str = ARQUIVO_CACHE_EMENTAS,
+                 tamanho_maximo: int = TAMANHO_MAXIMO_CACHE_EMENTAS):
+        self.caminho = caminho
+        self.tamanho_maximo = tamanho_maximo
+
+        self.acertos = {"chunk": 0, "ementa": 0}
+        self.faltas = {"chunk": 0, "ementa": 0}
+        self.despejos = 0
+
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("""
+            CREATE TABLE IF NOT EXISTS respostas (
+                chave TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                valor TEXT NOT NULL,
+                tamanho INTEGER NOT NULL,
+                usado_em REAL NOT NULL
+            )
+        """)
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS respostas_usado_em ON respostas (usado_em)")
+        self._conexao.commit()
+
+        self._tamanho_total = self._conexao.execute(
+            "SELECT COALESCE(SUM(tamanho), 0) FROM respostas"
+        ).fetchone()[0]
+
+    def obter(self, chave: str, tipo: str) -> Optional[str]:
+        """Retorna o texto guardado para a chave, ou None"""
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT valor FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None:
+                self.faltas[tipo] += 1
+                contar("cache_ementas", tipo=tipo, resultado="falta")
+                return None
+
+            self._conexao.execute("UPDATE respostas SET usado_em = ? WHERE chave = ?", (time.time(), chave))
+            self._conexao.commit()
+            self.acertos[tipo] += 1
+            contar("cache_ementas", tipo=tipo, resultado="acerto")
+            return linha[0]
+
+    def guardar(self, chave: str, tipo: str, valor: str):
+        tamanho = len(valor.encode("utf-8"))
+        with self._lock:
+            anterior = self._conexao.execute(
+                "SELECT tamanho FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO respostas (chave, tipo, valor, tamanho, usado_em) VALUES (?, ?, ?, ?, ?)",
+                (chave, tipo, valor, tamanho, time.time())
+            )
+            self._tamanho_total += tamanho - (anterior[0] if anterior else 0)
+            self._descartar_excesso()
+            self._conexao.commit()
+
+    def _descartar_excesso(self):
+        """Remove as entradas usadas há mais tempo até caber no limite"""
+        while self._tamanho_total > self.tamanho_maximo:
+            antigas = self._conexao.execute(
+                "SELECT chave, tamanho FROM respostas ORDER BY usado_em LIMIT 100"
+            ).fetchall()
+            if not antigas:
+                break
+            for chave, tamanho in antigas:
+                if self._tamanho_total <= self.tamanho_maximo:
+                    break
+                self._conexao.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+                self._tamanho_total -= tamanho
+                self.despejos += 1
+
+    def taxa_acerto(self, tipo: str = None) -> float:
+        tipos = [tipo] if tipo else list(self.acertos)
+        acertos = sum(self.acertos[t] for t in tipos)
+        consultas = acertos + sum(self.faltas[t] for t in tipos)
+        return acertos / consultas if consultas else 0.0
+
+    def estatisticas(self) -> Dict:
+        with self._lock:
+            entradas = self._conexao.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+        return {
+            "entradas": entradas,
+            "bytes": self._tamanho_total,
+            "tamanho_maximo": self.tamanho_maximo,
+            "acertos": dict(self.acertos),
+            "faltas": dict(self.faltas),
+            "despejos": self.despejos,
+            "taxa_acerto_chunks": self.taxa_acerto("chunk"),
+            "taxa_acerto_ementas": self.taxa_acerto("ementa"),
+        }
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
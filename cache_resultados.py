@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DO CACHE DE RESULTADOS
+# =====================================================
+
+# Tempo de vida de um conjunto de resultados, em segundos
+TTL_RESULTADOS = 300
+
+# Buscas diferentes guardadas ao mesmo tempo
+MAX_BUSCAS = 256
+
+# Intervalo mínimo entre consultas à geração do índice, em segundos
+INTERVALO_GERACAO = 10
+
+
+class CacheResultados:
+    """Cache de resultados de busca com TTL, limite de tamanho e invalidação por geração.
+
+    Cada valor guardado pode ter um método ``fechar()``, chamado quando a
+    entrada expira ou é descartada (por exemplo, para liberar um PIT).
+    """
+
+    def __init__(self, ler_geracao: Callable[[], object], ttl: float = TTL_RESULTADOS,
+                 max_buscas: int = MAX_BUSCAS, intervalo_geracao: float = INTERVALO_GERACAO):
+        self._ler_geracao = ler_geracao
+        self.ttl = ttl
+        self.max_buscas = max_buscas
+        self.intervalo_geracao = intervalo_geracao
+
+        self._entradas: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._geracao = None
+        self._geracao_verificada_em = 0.0
+
+        self.acertos = 0
+        self.faltas = 0
+
+    def _verificar_geracao(self):
+        agora = time.monotonic()
+        if agora - self._geracao_verificada_em < self.intervalo_geracao:
+            return
+        self._geracao_verificada_em = agora
+
+        geracao = self._ler_geracao()
+        if geracao != self._geracao:
+            self._geracao = geracao
+            self._limpar()
+
+    def _limpar(self):
+        for _, valor in self._entradas.values():
+            _fechar(valor)
+        self._entradas.clear()
+
+    def obter_ou_criar(self, chave: Hashable, criar: Callable[[], object]):
+        """Retorna o valor guardado para a chave, criando-o se não existir ou tiver expirado"""
+        with self._lock:
+            self._verificar_geracao()
+
+            entrada = self._entradas.get(chave)
+            if entrada and time.monotonic() - entrada[0] < self.ttl:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return entrada[1]
+
+            if entrada:
+                _fechar(self._entradas.pop(chave)[1])
+            self.faltas += 1
+
+        # Cria fora do lock: pode envolver requisições ao Elasticsearch
+        valor = criar()
+
+        with self._lock:
+            antigo = self._entradas.pop(chave, None)
+            if antigo:
+                _fechar(antigo[1])
+            self._entradas[chave] = (time.monotonic(), valor)
+            while len(self._entradas) > self.max_buscas:
+                _fechar(self._entradas.popitem(last=False)[1][1])
+
+        return valor
+
+    def invalidar(self):
+        """Descarta tudo (usado quando o próprio app altera o índice)"""
+        with self._lock:
+            self._limpar()
+            self._geracao_verificada_em = 0.0
+
+
+def _fechar(valor):
+    fechar = getattr(valor, "fechar", None)
+    if fechar:
+        try:
+            fechar()
+        except Exception:
+            pass
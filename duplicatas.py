@@ -0,0 +1,521 @@
+import os
+import re
+import zlib
+import difflib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from busca_local import PASTA_INDICE_LOCAL, IndiceLocal
+from instrumentacao import contar, medir
+from trechos import PALAVRAS_POR_TRECHO, SOBREPOSICAO
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DA DETECÇÃO DE QUASE DUPLICATAS
+# =====================================================
+# Retificações e republicações repetem quase todo o texto do original. Cada
+# documento ganha uma assinatura MinHash dos seus shingles (sequências de
+# palavras); o LSH separa a assinatura em faixas e só compara documentos que
+# coincidem em alguma faixa inteira, sem percorrer o acervo.
+
+# Assinaturas e ligações de cada índice (o do Elasticsearch e o local)
+ARQUIVO_DUPLICATAS = "cache/duplicatas.npz"
+ARQUIVO_DUPLICATAS_LOCAL = os.path.join(PASTA_INDICE_LOCAL, "duplicatas.npz")
+
+PALAVRAS_POR_SHINGLE = 5
+PERMUTACOES = 128
+
+# 16 faixas de 8 valores: um par com 80% dos shingles em comum cai no mesmo
+# balde em ~95% dos casos; um par com 50%, em ~6%
+FAIXAS = 16
+
+# Fração estimada de shingles em comum para ligar um documento a um canônico
+LIMIAR_SIMILARIDADE = 0.8
+
+# Fração máxima de palavras alteradas para reaproveitar vetores e ementa
+LIMITE_ALTERACOES = 0.2
+
+# Um trecho reaproveita o vetor do canônico se a janela de palavras se
+# desloca no máximo isso (o texto dos dois trechos é praticamente o mesmo)
+DESLOCAMENTO_MAXIMO = 10
+
+# Campos da ementa que a resposta sobre as seções alteradas pode substituir.
+# Tipo, objetivo e público-alvo vêm do documento inteiro: o modelo, vendo só
+# algumas frases, tende a inventá-los
+CAMPOS_ALTERAVEIS = ("disposicoes", "prazos", "valor_beneficio")
+
+# Canônicos codificados na execução atual, guardados para as cópias seguintes
+DOCUMENTOS_RECENTES = 64
+
+# Shingles processados por vez no cálculo da assinatura
+SHINGLES_POR_BLOCO = 2048
+
+# Primo acima de 2^32: h(x) = (a·x + b) mod p, com x o CRC32 do shingle
+PRIMO = 4294967311
+
+PADRAO_PALAVRA = re.compile(r"\w+")
+PADRAO_FIM_FRASE = re.compile(r"(?<=[.!?;:])\s+")
+
+_sorteio = np.random.default_rng(20251008)
+_COEFICIENTES_A = _sorteio.integers(1, 1 << 31, PERMUTACOES, dtype=np.uint64)
+_COEFICIENTES_B = _sorteio.integers(0, 1 << 32, PERMUTACOES, dtype=np.uint64)
+
+# =====================================================
+# 🔏 ASSINATURAS MINHASH
+# =====================================================
+
+def assinatura(texto: str) -> Optional[np.ndarray]:
+    """Assinatura MinHash (PERMUTACOES inteiros de 32 bits) dos shingles do texto"""
+    palavras = PADRAO_PALAVRA.findall(texto.lower())
+    if not palavras:
+        return None
+
+    quantidade = max(1, len(palavras) - PALAVRAS_POR_SHINGLE + 1)
+    shingles = np.unique(np.fromiter(
+        (zlib.crc32(" ".join(palavras[i:i + PALAVRAS_POR_SHINGLE]).encode("utf-8")) for i in range(quantidade)),
+        dtype=np.uint64, count=quantidade,
+    ))
+
+    # a < 2^31 e x < 2^32: a·x + b não passa de 2^64
+    minimos = np.full(PERMUTACOES, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for inicio in range(0, len(shingles), SHINGLES_POR_BLOCO):
+        bloco = shingles[inicio:inicio + SHINGLES_POR_BLOCO]
+        valores = (_COEFICIENTES_A[:, None] * bloco[None, :] + _COEFICIENTES_B[:, None]) % PRIMO
+        np.minimum(minimos, valores.min(axis=1), out=minimos)
+    return np.minimum(minimos, 0xFFFFFFFF).astype(np.uint32)
+
+
+def similaridade(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimativa da fração de shingles em comum (Jaccard) entre dois documentos"""
+    return float(np.mean(a == b))
+
+
+class IndiceDuplicatas:
+    """Assinaturas dos documentos indexados e o canônico de cada quase duplicata.
+
+    Só os canônicos entram nos baldes do LSH: uma cópia é sempre ligada ao
+    primeiro documento indexado do seu grupo, nunca a outra cópia.
+    """
+
+    def __init__(self, caminho: str = ARQUIVO_DUPLICATAS):
+        self.caminho = caminho
+        self.assinaturas: Dict[str, np.ndarray] = {}
+        # doc_id -> canônico (None quando o próprio documento é o canônico)
+        self.canonicos: Dict[str, Optional[str]] = {}
+        self.arquivos: Dict[str, str] = {}
+        self._baldes: Dict[Tuple[int, bytes], set] = {}
+
+    @classmethod
+    def carregar(cls, caminho: str = ARQUIVO_DUPLICATAS) -> "IndiceDuplicatas":
+        indice = cls(caminho)
+        if os.path.exists(caminho):
+            with np.load(caminho) as dados:
+                ids, canonicos, arquivos = dados["ids"].tolist(), dados["canonicos"].tolist(), dados["arquivos"].tolist()
+                assinaturas = dados["assinaturas"]
+            for doc_id, canonico, arquivo, valores in zip(ids, canonicos, arquivos, assinaturas):
+                indice.assinaturas[doc_id] = valores
+                indice.canonicos[doc_id] = canonico or None
+                indice.arquivos[doc_id] = arquivo
+                if not canonico:
+                    indice._entrar_nos_baldes(doc_id)
+        return indice
+
+    def salvar(self):
+        """Grava as assinaturas de forma atômica"""
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        ids = list(self.assinaturas)
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "wb") as f:
+            np.savez(
+                f,
+                ids=np.array(ids, dtype=str),
+                canonicos=np.array([self.canonicos[doc_id] or "" for doc_id in ids], dtype=str),
+                arquivos=np.array([self.arquivos.get(doc_id, "") for doc_id in ids], dtype=str),
+                assinaturas=(np.stack([self.assinaturas[doc_id] for doc_id in ids]) if ids
+                             else np.zeros((0, PERMUTACOES), dtype=np.uint32)),
+            )
+        os.replace(temporario, self.caminho)
+
+    def limpar(self):
+        self.assinaturas, self.canonicos, self.arquivos, self._baldes = {}, {}, {}, {}
+
+    def _faixas(self, valores: np.ndarray) -> Iterator[Tuple[int, bytes]]:
+        linhas = PERMUTACOES // FAIXAS
+        for faixa in range(FAIXAS):
+            yield faixa, valores[faixa * linhas:(faixa + 1) * linhas].tobytes()
+
+    def _entrar_nos_baldes(self, doc_id: str):
+        for chave in self._faixas(self.assinaturas[doc_id]):
+            self._baldes.setdefault(chave, set()).add(doc_id)
+
+    def _sair_dos_baldes(self, doc_id: str, valores: np.ndarray):
+        for chave in self._faixas(valores):
+            balde = self._baldes.get(chave)
+            if balde is not None:
+                balde.discard(doc_id)
+                if not balde:
+                    del self._baldes[chave]
+
+    def procurar(self, valores: np.ndarray, ignorar: str = None) -> Tuple[Optional[str], float]:
+        """Canônico mais parecido com a assinatura e a similaridade (None abaixo do limiar)"""
+        candidatos = set()
+        for chave in self._faixas(valores):
+            candidatos.update(self._baldes.get(chave, ()))
+        candidatos.discard(ignorar)
+
+        melhor, nota = None, 0.0
+        for doc_id in candidatos:
+            nota_candidato = similaridade(valores, self.assinaturas[doc_id])
+            if nota_candidato > nota:
+                melhor, nota = doc_id, nota_candidato
+        contar("duplicatas_candidatos", len(candidatos))
+        return (melhor, nota) if nota >= LIMIAR_SIMILARIDADE else (None, nota)
+
+    def registrar(self, doc_id: str, arquivo: str, valores: np.ndarray) -> Tuple[Optional[str], float]:
+        """Guarda a assinatura do documento e o liga ao canônico, se houver um"""
+        self.remover(doc_id)
+        canonico, nota = self.procurar(valores)
+        self.assinaturas[doc_id] = valores
+        self.canonicos[doc_id] = canonico
+        self.arquivos[doc_id] = arquivo
+        if canonico is None:
+            self._entrar_nos_baldes(doc_id)
+        return canonico, nota
+
+    def remover(self, doc_id: str):
+        """Tira o documento; se era canônico, as cópias dele procuram outro"""
+        if doc_id not in self.assinaturas:
+            return
+        valores = self.assinaturas.pop(doc_id)
+        self.arquivos.pop(doc_id, None)
+        if self.canonicos.pop(doc_id) is not None:
+            return
+
+        self._sair_dos_baldes(doc_id, valores)
+        # A primeira cópia vira canônico e as seguintes se ligam a ela
+        for orfao in [outro for outro, canonico in self.canonicos.items() if canonico == doc_id]:
+            novo, _ = self.procurar(self.assinaturas[orfao])
+            self.canonicos[orfao] = novo
+            if novo is None:
+                self._entrar_nos_baldes(orfao)
+
+    def canonico(self, doc_id: str) -> Optional[str]:
+        return self.canonicos.get(doc_id)
+
+    @property
+    def total_duplicatas(self) -> int:
+        return sum(1 for canonico in self.canonicos.values() if canonico is not None)
+
+def preencher_assinaturas(indice: IndiceDuplicatas, documentos: Iterator[Tuple[str, str, str]]) -> int:
+    """Assina os documentos ``(doc_id, arquivo, conteudo)`` de um índice criado antes da detecção"""
+    total = 0
+    with medir("duplicatas_preenchimento") as span:
+        for doc_id, arquivo, conteudo in documentos:
+            valores = assinatura(conteudo)
+            if valores is not None:
+                indice.registrar(doc_id, arquivo, valores)
+                total += 1
+        span.anotar(documentos=total)
+    return total
+
+# =====================================================
+# 🔍 DIFERENÇAS ENTRE O CANÔNICO E A CÓPIA
+# =====================================================
+
+def _frases(texto: str) -> Tuple[List[str], List[int]]:
+    """Frases do texto e a posição (em palavras) do início de cada uma, mais o total no fim"""
+    frases = [frase for frase in PADRAO_FIM_FRASE.split(texto.strip()) if frase]
+    inicios = [0]
+    for frase in frases:
+        inicios.append(inicios[-1] + len(frase.split()))
+    return frases, inicios
+
+
+def comparar_textos(original: str, novo: str) -> Dict:
+    """Diferença, frase a frase, entre o texto do canônico e o da cópia.
+
+    Retorna ``blocos`` (partes iguais, em palavras: início no original,
+    início no novo e tamanho), ``secoes`` (as frases novas ou alteradas da
+    cópia, cada uma com a frase anterior como contexto) e ``proporcao`` (a
+    fração das palavras dos dois textos que mudou).
+    """
+    frases_original, inicios_original = _frases(original)
+    frases_novo, inicios_novo = _frases(novo)
+    comparador = difflib.SequenceMatcher(None, frases_original, frases_novo, autojunk=False)
+
+    blocos, secoes, alteradas = [], [], 0
+    for operacao, i1, i2, j1, j2 in comparador.get_opcodes():
+        if operacao == "equal":
+            blocos.append((inicios_original[i1], inicios_novo[j1], inicios_novo[j2] - inicios_novo[j1]))
+            continue
+        alteradas += (inicios_original[i2] - inicios_original[i1]) + (inicios_novo[j2] - inicios_novo[j1])
+        if j2 > j1:
+            secoes.append(" ".join(frases_novo[max(0, j1 - 1):j2]))
+
+    total = inicios_original[-1] + inicios_novo[-1]
+    return {"blocos": blocos, "secoes": secoes, "proporcao": alteradas / total if total else 0.0}
+
+
+def _janelas_trechos(palavras: int) -> List[Tuple[int, int]]:
+    """Início e fim (em palavras) de cada trecho, como em ``dividir_em_trechos``"""
+    passo = PALAVRAS_POR_TRECHO - SOBREPOSICAO
+    janelas = []
+    for inicio in range(0, palavras, passo):
+        janelas.append((inicio, min(inicio + PALAVRAS_POR_TRECHO, palavras)))
+        if inicio + PALAVRAS_POR_TRECHO >= palavras:
+            break
+    return janelas
+
+
+def reaproveitar_vetores(comparacao: Dict, palavras_novo: int, palavras_canonico: int,
+                         vetores_canonico: np.ndarray) -> Dict[int, np.ndarray]:
+    """Vetores do canônico que servem para os trechos da cópia, por posição do trecho.
+
+    Um trecho reaproveita o vetor do trecho correspondente do canônico quando
+    os dois caem inteiros no mesmo bloco igual e têm o mesmo tamanho.
+    """
+    janelas_canonico = _janelas_trechos(palavras_canonico)
+    # Trechos divididos com outros parâmetros não se correspondem
+    if len(janelas_canonico) != len(vetores_canonico):
+        return {}
+
+    passo = PALAVRAS_POR_TRECHO - SOBREPOSICAO
+    reaproveitados = {}
+    for numero, (inicio, fim) in enumerate(_janelas_trechos(palavras_novo)):
+        for inicio_original, inicio_novo, tamanho in comparacao["blocos"]:
+            if not (inicio_novo <= inicio and fim <= inicio_novo + tamanho):
+                continue
+            correspondente = inicio - inicio_novo + inicio_original
+            j = min(round(correspondente / passo), len(janelas_canonico) - 1)
+            inicio_canonico, fim_canonico = janelas_canonico[j]
+            if (abs(inicio_canonico - correspondente) <= DESLOCAMENTO_MAXIMO
+                    and fim_canonico - inicio_canonico == fim - inicio
+                    and inicio_original <= inicio_canonico and fim_canonico <= inicio_original + tamanho):
+                reaproveitados[numero] = vetores_canonico[j]
+            break
+    return reaproveitados
+
+# =====================================================
+# 🧩 ETAPA DO INDEXADOR
+# =====================================================
+
+class DetectorDuplicatas:
+    """Liga cada documento extraído ao seu canônico e reaproveita os vetores dele.
+
+    ``ler_canonico(doc_id)`` devolve ``(conteudo, vetores dos trechos)`` de
+    um documento já indexado, ou None. Os canônicos codificados na própria
+    execução ficam em memória, para as cópias que vierem depois no mesmo lote.
+
+    O ``indice`` só muda em ``confirmar``, quando o Elasticsearch confirma a
+    ação: uma cópia nunca fica ligada a um documento que não foi indexado.
+    """
+
+    def __init__(self, indice: IndiceDuplicatas,
+                 ler_canonico: Callable[[str], Optional[Tuple[str, np.ndarray]]] = None):
+        self.indice = indice
+        self.ler_canonico = ler_canonico
+        self._ligacoes: Dict[str, str] = {}
+        # Assinaturas à espera de confirmação; os canônicos entre elas ficam
+        # num índice só em memória, para as cópias do mesmo lote
+        self._pendentes: Dict[str, Tuple[str, np.ndarray]] = {}
+        self._nao_confirmados = IndiceDuplicatas()
+        self._recentes: "OrderedDict[str, Tuple[str, np.ndarray]]" = OrderedDict()
+        # Os grupos de embeddings podem ser codificados em threads simultâneas,
+        # e as confirmações chegam em outra thread
+        self._lock = threading.Lock()
+        self.duplicatas = 0
+        self.trechos_reaproveitados = 0
+
+    def marcar(self, acoes):
+        """Etapa entre a extração e os embeddings: calcula a assinatura e procura o canônico"""
+        for acao in acoes:
+            if acao["_op_type"] == "index":
+                fonte = acao["_source"]
+                with medir("duplicatas_assinatura"):
+                    valores = assinatura(fonte["conteudo"])
+                self._ligacoes.pop(acao["_id"], None)
+                if valores is not None:
+                    with self._lock:
+                        self._pendentes[acao["_id"]] = (fonte["arquivo"], valores)
+                        # A assinatura anterior do próprio documento ainda está no índice
+                        canonico, nota = self.indice.procurar(valores, ignorar=acao["_id"])
+                        arquivo_canonico = self.indice.arquivos.get(canonico, canonico)
+                        if canonico is None:
+                            canonico, nota = self._nao_confirmados.registrar(acao["_id"], fonte["arquivo"], valores)
+                            arquivo_canonico = self._nao_confirmados.arquivos.get(canonico, canonico)
+                    if canonico is not None:
+                        self._ligacoes[acao["_id"]] = canonico
+                        self.duplicatas += 1
+                        contar("duplicatas_encontradas")
+                        print(f"   🔁 Quase idêntico a {arquivo_canonico} "
+                              f"({nota:.0%} dos shingles em comum)")
+            yield acao
+
+    def confirmar(self, ok: bool, operacao: str, doc_id: str):
+        """Resposta do Elasticsearch a uma ação: só então a assinatura entra no índice (ou sai dele)"""
+        with self._lock:
+            pendente = self._pendentes.pop(doc_id, None)
+            # As cópias não confirmadas ligadas a este documento procuram outro
+            self._nao_confirmados.remover(doc_id)
+            if not ok:
+                return
+            if operacao == "delete":
+                self.indice.remover(doc_id)
+            elif pendente is not None:
+                self.indice.registrar(doc_id, *pendente)
+
+    def canonico_pendente(self, doc_id: str) -> Optional[str]:
+        """Canônico ligado ao documento nesta execução"""
+        return self._ligacoes.get(doc_id)
+
+    def vetores_reaproveitaveis(self, acao: Dict) -> Dict[int, np.ndarray]:
+        """Vetores do canônico para os trechos da cópia que não mudaram"""
+        canonico = self._ligacoes.get(acao["_id"])
+        if canonico is None:
+            return {}
+        with self._lock:
+            dados = self._recentes.get(canonico)
+        if dados is None and self.ler_canonico is not None:
+            dados = self.ler_canonico(canonico)
+        if dados is None:
+            return {}
+
+        conteudo_canonico, vetores = dados
+        conteudo = acao["_source"]["conteudo"]
+        # Os trechos precisam seguir as janelas de palavras de ``dividir_em_trechos``
+        if len(acao["_source"]["trechos"]) != len(_janelas_trechos(len(conteudo.split()))):
+            return {}
+        comparacao = comparar_textos(conteudo_canonico, conteudo)
+        if comparacao["proporcao"] > LIMITE_ALTERACOES:
+            return {}
+        reaproveitados = reaproveitar_vetores(comparacao, len(conteudo.split()), len(conteudo_canonico.split()),
+                                              vetores)
+
+        with self._lock:
+            self.trechos_reaproveitados += len(reaproveitados)
+        contar("trechos_reaproveitados", len(reaproveitados))
+        return reaproveitados
+
+    def lembrar(self, doc_id: str, conteudo: str, vetores: np.ndarray):
+        """Guarda os vetores de um canônico recém-codificado"""
+        if doc_id in self._ligacoes:
+            return
+        with self._lock:
+            self._recentes[doc_id] = (conteudo, vetores)
+            self._recentes.move_to_end(doc_id)
+            while len(self._recentes) > DOCUMENTOS_RECENTES:
+                self._recentes.popitem(last=False)
+
+
+def _ler_fonte(origem, index: str, doc_id: str, campos: List[str]) -> Optional[Dict]:
+    """``_source`` de um documento do Elasticsearch ou do índice local, ou None"""
+    if isinstance(origem, IndiceLocal):
+        try:
+            return origem.documento(doc_id, campos)["_source"]
+        except KeyError:
+            return None
+
+    from elasticsearch import NotFoundError
+    try:
+        return origem.get(index=index, id=doc_id, source_includes=campos)["_source"]
+    except NotFoundError:
+        return None
+
+
+def criar_leitor_canonicos(origem, index: str, armazem=None) -> Callable[[str], Optional[Tuple[str, np.ndarray]]]:
+    """``ler_canonico`` sobre o Elasticsearch (cliente) ou o índice local (``IndiceLocal``).
+
+    Nos modos quantizados os vetores completos vêm do ``armazem``.
+    """
+    def ler(doc_id: str) -> Optional[Tuple[str, np.ndarray]]:
+        if isinstance(origem, IndiceLocal):
+            fonte = _ler_fonte(origem, index, doc_id, ["conteudo"])
+            vetores = origem.vetores_documento(doc_id) if fonte is not None else None
+        else:
+            campos = ["conteudo"] if armazem is not None else ["conteudo", "trechos.embedding"]
+            fonte = _ler_fonte(origem, index, doc_id, campos)
+            if fonte is None:
+                return None
+            if armazem is not None:
+                vetores = armazem.vetores(doc_id)
+            else:
+                vetores = [trecho["embedding"] for trecho in fonte.get("trechos", [])]
+        if fonte is None or vetores is None or not len(vetores):
+            return None
+        return fonte["conteudo"], np.asarray(vetores, dtype=np.float32)
+
+    return ler
+
+# =====================================================
+# 📝 EMENTAS DAS QUASE DUPLICATAS
+# =====================================================
+
+_processador_campos = None
+
+
+def mesclar_ementas(ementa_canonico: str, ementa_alteracoes: str) -> str:
+    """Ementa do canônico com os CAMPOS_ALTERAVEIS que a ementa das seções alteradas preencheu"""
+    global _processador_campos
+    if _processador_campos is None:
+        from processador_ementas import ProcessadorEmentasAvancado
+        # Só lê e monta ementas; não usa o modelo
+        _processador_campos = ProcessadorEmentasAvancado(None, saida_estruturada=False)
+
+    campos = _processador_campos.interpretar_resposta(ementa_canonico)
+    alteracoes = _processador_campos.interpretar_resposta(ementa_alteracoes)
+    for campo in CAMPOS_ALTERAVEIS:
+        if alteracoes.get(campo):
+            campos[campo] = alteracoes[campo]
+    return _processador_campos.gerar_ementa_final(campos)
+
+
+class ReaproveitamentoEmentas:
+    """Ementas das quase duplicatas a partir da ementa do canônico.
+
+    ``preparar`` decide o que vai ao modelo: nada, quando o texto é o mesmo
+    do canônico; só as seções alteradas, quando a mudança fica abaixo de
+    LIMITE_ALTERACOES (``concluir`` junta a resposta à ementa do canônico);
+    ou o documento inteiro, quando não há canônico com ementa em dia.
+    """
+
+    CAMPOS = ["conteudo", "ementa", "tem_ementa", "hash_conteudo", "hash_conteudo_ementa"]
+
+    def __init__(self, indice: IndiceDuplicatas, origem, index: str = None):
+        self.indice = indice
+        self.origem = origem
+        self.index = index
+        self._bases: Dict[str, str] = {}
+        self.identicas = 0
+        self.parciais = 0
+
+    def preparar(self, doc_id: str, conteudo: str) -> Tuple[Optional[str], Optional[str]]:
+        """Retorna ``(texto para o modelo, None)`` ou ``(None, ementa pronta)``"""
+        canonico = self.indice.canonico(doc_id)
+        if canonico is None:
+            return conteudo, None
+        fonte = _ler_fonte(self.origem, self.index, canonico, self.CAMPOS)
+        if not fonte or not fonte.get("tem_ementa") or fonte.get("hash_conteudo_ementa") != fonte.get("hash_conteudo"):
+            return conteudo, None
+
+        comparacao = comparar_textos(fonte["conteudo"], conteudo)
+        if comparacao["proporcao"] == 0:
+            self.identicas += 1
+            contar("ementas_reaproveitadas", modo="identica")
+            return None, fonte["ementa"]
+        # Só remoções não têm o que mandar ao modelo, e a ementa do canônico pode citá-las
+        if comparacao["proporcao"] > LIMITE_ALTERACOES or not comparacao["secoes"]:
+            return conteudo, None
+
+        self._bases[doc_id] = fonte["ementa"]
+        self.parciais += 1
+        contar("ementas_reaproveitadas", modo="parcial")
+        return "\n\n".join(comparacao["secoes"]), None
+
+    def concluir(self, doc_id: str, ementa: Optional[str]) -> Optional[str]:
+        """Ementa final do documento a partir da resposta do modelo"""
+        base = self._bases.pop(doc_id, None)
+        if base is None or ementa is None:
+            return ementa
+        return mesclar_ementas(base, ementa)
@@ -0,0 +1,190 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+from instrumentacao import contar, medir
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DO CACHE DE EMBEDDINGS
+# =====================================================
+
+# Nome do modelo de embeddings usado em todo o projeto
+MODELO_EMBEDDINGS = "all-MiniLM-L6-v2"
+DIMENSAO_EMBEDDINGS = 384
+
+# Pasta do cache em disco (vetores.npy + indice.json)
+DIRETORIO_CACHE_EMBEDDINGS = "cache/embeddings"
+
+# Máximo de vetores guardados (200 mil vetores de 384 floats ≈ 300 MB)
+CAPACIDADE_CACHE = 200_000
+
+# Textos por chamada ao modelo
+TAMANHO_LOTE_EMBEDDINGS = 64
+
+
+def _impressao_digital(chave: str) -> int:
+    """Primeiros 8 bytes da chave, gravados junto do vetor para conferência"""
+    return int(chave[:16], 16)
+
+
+class CacheEmbeddings:
+    """Cache em disco de embeddings, endereçado pelo hash do texto.
+
+    Os vetores ficam em um ``.npy`` mapeado em memória com capacidade fixa;
+    ``indice.json`` associa cada hash a uma posição, em ordem de uso, e as
+    entradas menos usadas recentemente são descartadas quando o cache enche.
+    """
+
+    def __init__(self, diretorio: str = DIRETORIO_CACHE_EMBEDDINGS, capacidade: int = CAPACIDADE_CACHE,
+                 dimensao: int = DIMENSAO_EMBEDDINGS, modelo: str = MODELO_EMBEDDINGS):
+        self.diretorio = diretorio
+        self.capacidade = capacidade
+        self.dimensao = dimensao
+        self.modelo = modelo
+
+        self.acertos = 0
+        self.faltas = 0
+        self.despejos = 0
+
+        os.makedirs(diretorio, exist_ok=True)
+        self._caminho_vetores = os.path.join(diretorio, "vetores.npy")
+        self._caminho_chaves = os.path.join(diretorio, "chaves.npy")
+        self._caminho_indice = os.path.join(diretorio, "indice.json")
+
+        # hash -> posição, do menos para o mais recentemente usado
+        self._posicoes: "OrderedDict[str, int]" = OrderedDict()
+        self._carregar()
+
+    def _carregar(self):
+        indice = None
+        if os.path.exists(self._caminho_indice):
+            with open(self._caminho_indice, "r", encoding="utf-8") as f:
+                indice = json.load(f)
+
+        compativel = (
+            indice is not None
+            and indice["modelo"] == self.modelo
+            and indice["dimensao"] == self.dimensao
+            and indice["capacidade"] == self.capacidade
+            and os.path.exists(self._caminho_vetores)
+            and os.path.exists(self._caminho_chaves)
+        )
+
+        if compativel:
+            self.vetores = np.load(self._caminho_vetores, mmap_mode="r+")
+            self.chaves = np.load(self._caminho_chaves, mmap_mode="r+")
+            self._posicoes = OrderedDict((chave, posicao) for chave, posicao in indice["entradas"])
+        else:
+            # Cache inexistente ou criado com outra configuração: começa do zero
+            self.vetores = np.lib.format.open_memmap(
+                self._caminho_vetores, mode="w+", dtype=np.float32, shape=(self.capacidade, self.dimensao)
+            )
+            self.chaves = np.lib.format.open_memmap(
+                self._caminho_chaves, mode="w+", dtype=np.uint64, shape=(self.capacidade,)
+            )
+
+        ocupadas = set(self._posicoes.values())
+        self._livres = [posicao for posicao in range(self.capacidade - 1, -1, -1) if posicao not in ocupadas]
+
+    def chave(self, texto: str) -> str:
+        return hashlib.sha256(f"{self.modelo}\0{texto}".encode("utf-8")).hexdigest()
+
+    def obter(self, chave: str):
+        """Retorna o vetor guardado para a chave, ou None"""
+        posicao = self._posicoes.get(chave)
+        if posicao is None or self.chaves[posicao] != _impressao_digital(chave):
+            self.faltas += 1
+            return None
+
+        self._posicoes.move_to_end(chave)
+        self.acertos += 1
+        return np.array(self.vetores[posicao])
+
+    def guardar(self, chave: str, vetor: np.ndarray):
+        if chave in self._posicoes:
+            posicao = self._posicoes[chave]
+            self._posicoes.move_to_end(chave)
+        else:
+            if not self._livres:
+                # Descarta a entrada usada há mais tempo
+                _, posicao = self._posicoes.popitem(last=False)
+                self.despejos += 1
+            else:
+                posicao = self._livres.pop()
+            self._posicoes[chave] = posicao
+
+        self.vetores[posicao] = vetor
+        self.chaves[posicao] = _impressao_digital(chave)
+
+    def salvar(self):
+        """Grava os vetores e depois o índice (de forma atômica)"""
+        self.vetores.flush()
+        self.chaves.flush()
+
+        temporario = self._caminho_indice + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({
+                "modelo": self.modelo,
+                "dimensao": self.dimensao,
+                "capacidade": self.capacidade,
+                "entradas": list(self._posicoes.items()),
+            }, f)
+        os.replace(temporario, self._caminho_indice)
+
+    def taxa_acerto(self) -> float:
+        consultas = self.acertos + self.faltas
+        return self.acertos / consultas if consultas else 0.0
+
+    def estatisticas(self) -> Dict:
+        return {
+            "entradas": len(self._posicoes),
+            "capacidade": self.capacidade,
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "despejos": self.despejos,
+            "taxa_acerto": self.taxa_acerto(),
+        }
+
+
+def codificar_em_lotes(model, textos: List[str], cache: CacheEmbeddings = None,
+                       tamanho_lote: int = TAMANHO_LOTE_EMBEDDINGS) -> np.ndarray:
+    """Gera embeddings normalizados para uma lista de textos.
+
+    Textos já presentes no cache não são codificados de novo. Os demais são
+    ordenados por tamanho e enviados ao modelo em lotes, de modo que cada
+    lote junte textos de comprimento parecido e gaste pouco com padding.
+    """
+    resultado = np.zeros((len(textos), model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    # Textos repetidos são codificados uma vez só
+    pendentes: Dict[str, List[int]] = {}
+    for i, texto in enumerate(textos):
+        vetor = None
+        if cache is not None and texto not in pendentes:
+            vetor = cache.obter(cache.chave(texto))
+        if vetor is None:
+            pendentes.setdefault(texto, []).append(i)
+        else:
+            resultado[i] = vetor
+
+    contar("embeddings_cache", len(textos) - sum(map(len, pendentes.values())), resultado="acerto")
+    contar("embeddings_cache", sum(map(len, pendentes.values())), resultado="falta")
+
+    ordenados = sorted(pendentes, key=len)
+    for inicio in range(0, len(ordenados), tamanho_lote):
+        lote = ordenados[inicio:inicio + tamanho_lote]
+        with medir("embeddings_lote") as span:
+            vetores = model.encode(lote, batch_size=tamanho_lote, normalize_embeddings=True)
+            span.anotar(textos=len(lote))
+        contar("embeddings_codificados", len(lote))
+
+        for texto, vetor in zip(lote, vetores):
+            resultado[pendentes[texto]] = vetor
+            if cache is not None:
+                cache.guardar(cache.chave(texto), vetor)
+
+    return resultado
@@ -0,0 +1,183 @@
+import queue
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional
+
+from processador_ementas import processar_documento_para_ementa
+from geracao_indice import MarcadorGeracao
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DA GERAÇÃO SOB DEMANDA
+# =====================================================
+
+# Documentos aguardando na fila; pedidos além disso são recusados
+TAMANHO_FILA_SOB_DEMANDA = 4
+
+# Tarefas concluídas mantidas em memória para quem ainda as acompanha
+MAX_TAREFAS_CONCLUIDAS = 64
+
+# Intervalo máximo entre verificações enquanto se acompanha uma tarefa, em segundos
+INTERVALO_ACOMPANHAMENTO = 1.0
+
+# Texto livre, e não JSON, para que o que aparece durante a geração seja legível
+SAIDA_ESTRUTURADA_SOB_DEMANDA = False
+
+
+class TarefaEmenta:
+    """Geração da ementa de um documento, acompanhada por uma ou mais sessões"""
+
+    def __init__(self, doc_id: str):
+        self.doc_id = doc_id
+        self.estado = "na_fila"
+        self.partes = []
+        self.ementa = None
+        self.erro = None
+        self._condicao = threading.Condition()
+
+    @property
+    def concluida(self) -> bool:
+        return self.estado in ("concluida", "erro")
+
+    def _publicar(self, texto: str):
+        with self._condicao:
+            self.estado = "gerando"
+            self.partes.append(texto)
+            self._condicao.notify_all()
+
+    def _encerrar(self, ementa: str = None, erro: Exception = None):
+        with self._condicao:
+            self.ementa = ementa
+            self.erro = erro
+            self.estado = "erro" if erro is not None else "concluida"
+            self._condicao.notify_all()
+
+    def acompanhar(self) -> Iterator[str]:
+        """Texto gerado até agora e, depois, cada novo pedaço até o fim"""
+        enviados = 0
+        while True:
+            with self._condicao:
+                if enviados == len(self.partes) and not self.concluida:
+                    self._condicao.wait(INTERVALO_ACOMPANHAMENTO)
+                novas = self.partes[enviados:]
+                terminou = self.concluida
+            enviados += len(novas)
+            if novas:
+                yield "".join(novas)
+            if terminou and enviados == len(self.partes):
+                return
+
+
+class GeradorSobDemanda:
+    """Gera ementas a pedido do app, uma de cada vez, em uma thread de fundo.
+
+    Há um único modelo, carregado na primeira tarefa. Pedidos para um
+    documento que já está na fila ou em geração recebem a mesma tarefa, e a
+    fila é limitada para que uma rajada de cliques não acumule trabalho. A
+    ementa pronta é gravada no Elasticsearch, então quem abrir o documento
+    depois já a encontra.
+    """
+
+    def __init__(self, es, index: str, criar_llm: Callable[[], object], cache=None,
+                 ao_gravar: Callable[[], None] = None, tamanho_fila: int = TAMANHO_FILA_SOB_DEMANDA):
+        self.es = es
+        self.index = index
+        self.cache = cache
+        self.ao_gravar = ao_gravar
+        # Invalida os resultados em cache dos outros processos do app, sem uma
+        # escrita no mapeamento por ementa
+        self._geracao = MarcadorGeracao(es, index) if es is not None else None
+        self._criar_llm = criar_llm
+        self._llm = None
+
+        self._fila = queue.Queue(maxsize=tamanho_fila)
+        self._lock = threading.Lock()
+        # doc_id -> tarefa, das mais antigas para as mais recentes
+        self._tarefas: "OrderedDict[str, TarefaEmenta]" = OrderedDict()
+
+        self._thread = threading.Thread(target=self._trabalhar, daemon=True)
+        self._thread.start()
+
+    def tarefa(self, doc_id: str) -> Optional[TarefaEmenta]:
+        with self._lock:
+            return self._tarefas.get(doc_id)
+
+    def solicitar(self, doc_id: str) -> Optional[TarefaEmenta]:
+        """Pede a ementa do documento. Retorna None se a fila estiver cheia."""
+        with self._lock:
+            tarefa = self._tarefas.get(doc_id)
+            if tarefa is not None and tarefa.estado != "erro":
+                return tarefa
+
+            tarefa = TarefaEmenta(doc_id)
+            try:
+                self._fila.put_nowait(tarefa)
+            except queue.Full:
+                return None
+
+            self._tarefas.pop(doc_id, None)
+            self._tarefas[doc_id] = tarefa
+            self._descartar_concluidas()
+            return tarefa
+
+    def _descartar_concluidas(self):
+        concluidas = [doc_id for doc_id, tarefa in self._tarefas.items() if tarefa.concluida]
+        for doc_id in concluidas[:max(0, len(concluidas) - MAX_TAREFAS_CONCLUIDAS)]:
+            del self._tarefas[doc_id]
+
+    def _trabalhar(self):
+        while True:
+            tarefa = self._fila.get()
+            try:
+                tarefa._encerrar(ementa=self._gerar(tarefa))
+            except Exception as e:
+                print(f"❌ Erro ao gerar ementa de {tarefa.doc_id}: {e}")
+                tarefa._encerrar(erro=e)
+
+    def _ler(self, doc_id: str) -> Dict:
+        return self.es.get(index=self.index, id=doc_id, source_includes=["conteudo", "hash_conteudo"])["_source"]
+
+    def _gravar(self, doc_id: str, campos: Dict):
+        self.es.update(index=self.index, id=doc_id, doc=campos)
+        self._geracao.marcar()
+
+    def _gerar(self, tarefa: TarefaEmenta) -> str:
+        fonte = self._ler(tarefa.doc_id)
+        tarefa.estado = "gerando"
+
+        if self._llm is None:
+            self._llm = self._criar_llm()
+
+        ementa = processar_documento_para_ementa(
+            fonte["conteudo"], self._llm, self.cache,
+            saida_estruturada=SAIDA_ESTRUTURADA_SOB_DEMANDA, ao_gerar=tarefa._publicar
+        )
+
+        self._gravar(tarefa.doc_id, {
+            "ementa": ementa,
+            "tem_ementa": True,
+            "hash_conteudo_ementa": fonte.get("hash_conteudo"),
+        })
+        if self.ao_gravar:
+            self.ao_gravar()
+
+        return ementa
+
+    def estatisticas(self) -> Dict:
+        with self._lock:
+            estados = [tarefa.estado for tarefa in self._tarefas.values()]
+        return {estado: estados.count(estado) for estado in ("na_fila", "gerando", "concluida", "erro")}
+
+
+class GeradorSobDemandaLocal(GeradorSobDemanda):
+    """O mesmo gerador, lendo e gravando no índice local (``busca_local.IndiceLocal``)"""
+
+    def __init__(self, indice, criar_llm: Callable[[], object], **opcoes):
+        self.indice = indice
+        super().__init__(None, None, criar_llm, **opcoes)
+
+    def _ler(self, doc_id: str) -> Dict:
+        return self.indice.documento(doc_id, ["conteudo", "hash_conteudo"])["_source"]
+
+    def _gravar(self, doc_id: str, campos: Dict):
+        # A gravação já muda a geração lida pelo cache de resultados
+        self.indice.gravar_ementas({doc_id: campos})
@@ -0,0 +1,305 @@
+import os
+import gzip
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+
+import pdfplumber
+
+from instrumentacao import contar, medir
+from manifesto import hash_arquivo
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DA EXTRAÇÃO
+# =====================================================
+
+# PDFs com mais páginas que isso são divididos em faixas processadas em paralelo
+PAGINAS_POR_TAREFA = 20
+
+# Backend usado quando nenhum é escolhido: o mais fiel ao layout do texto
+BACKEND_EXTRACAO_PADRAO = "pdfplumber"
+
+# Pasta com o texto já extraído de cada PDF, por hash do arquivo e backend
+PASTA_CACHE_TEXTOS = "cache/textos"
+
+# =====================================================
+# 🧰 BACKENDS DE EXTRAÇÃO
+# =====================================================
+
+class BackendPdfplumber:
+    """Texto com o layout reconstruído caractere a caractere: fiel, porém lento"""
+
+    nome = "pdfplumber"
+
+    @staticmethod
+    def versao() -> str:
+        return pdfplumber.__version__
+
+    @staticmethod
+    def contar_paginas(caminho: str) -> int:
+        with pdfplumber.open(caminho) as pdf:
+            return len(pdf.pages)
+
+    @staticmethod
+    def extrair_faixa(caminho: str, inicio: int, fim: int) -> Iterator[str]:
+        # pdfplumber numera as páginas a partir de 1
+        with pdfplumber.open(caminho, pages=list(range(inicio + 1, fim + 1))) as pdf:
+            for pagina in pdf.pages:
+                yield pagina.extract_text() or ""
+
+
+class BackendPdfium:
+    """Texto direto do PDFium, sem análise de layout: bem mais rápido.
+
+    A ordem das linhas segue a do arquivo, o que em tabelas e colunas pode
+    diferir do pdfplumber. Requer o pacote opcional ``pypdfium2``.
+    """
+
+    nome = "pypdfium2"
+
+    @staticmethod
+    def versao() -> str:
+        import pypdfium2
+        return f"{pypdfium2.version.PYPDFIUM_INFO}/{pypdfium2.version.PDFIUM_INFO}"
+
+    @staticmethod
+    def contar_paginas(caminho: str) -> int:
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(caminho)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    @staticmethod
+    def extrair_faixa(caminho: str, inicio: int, fim: int) -> Iterator[str]:
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(caminho)
+        try:
+            for numero in range(inicio, fim):
+                pagina = pdf[numero]
+                texto_pagina = pagina.get_textpage()
+                try:
+                    yield texto_pagina.get_text_range().replace("\r\n", "\n")
+                finally:
+                    texto_pagina.close()
+                    pagina.close()
+        finally:
+            pdf.close()
+
+
+BACKENDS_EXTRACAO = {backend.nome: backend for backend in (BackendPdfplumber, BackendPdfium)}
+
+# =====================================================
+# 🗄️ CACHE DO TEXTO EXTRAÍDO
+# =====================================================
+
+class CacheTextos:
+    """Texto das páginas de cada PDF já extraído, um arquivo por hash e backend.
+
+    O hash é o do conteúdo do PDF (o mesmo do manifesto), então um arquivo
+    renomeado ou copiado reaproveita a extração, e um arquivo alterado
+    nunca recebe o texto da versão anterior. A versão da biblioteca fica
+    registrada: ao atualizá-la, o texto é extraído de novo.
+    """
+
+    def __init__(self, pasta: str = PASTA_CACHE_TEXTOS):
+        self.pasta = pasta
+        self.acertos = 0
+        self.faltas = 0
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho(self, hash_pdf: str, backend: str) -> str:
+        return os.path.join(self.pasta, f"{hash_pdf}_{backend}.json.gz")
+
+    def obter(self, hash_pdf: str, backend: str) -> Optional[List[str]]:
+        """Páginas extraídas antes, ou None"""
+        try:
+            with gzip.open(self._caminho(hash_pdf, backend), "rt", encoding="utf-8") as f:
+                registro = json.load(f)
+        except (OSError, ValueError):
+            registro = None
+
+        if registro is None or registro.get("versao") != BACKENDS_EXTRACAO[backend].versao():
+            self.faltas += 1
+            contar("cache_textos", resultado="falta")
+            return None
+        self.acertos += 1
+        contar("cache_textos", resultado="acerto")
+        return registro["paginas"]
+
+    def guardar(self, hash_pdf: str, backend: str, paginas: List[str]):
+        """Grava as páginas de forma atômica"""
+        caminho = self._caminho(hash_pdf, backend)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with gzip.open(temporario, "wt", encoding="utf-8", compresslevel=1) as f:
+            json.dump({"versao": BACKENDS_EXTRACAO[backend].versao(), "paginas": paginas}, f, ensure_ascii=False)
+        os.replace(temporario, caminho)
+
+# =====================================================
+# 🔧 TAREFAS EXECUTADAS NOS PROCESSOS DO POOL
+# =====================================================
+
+def contar_paginas(caminho: str, backend: str = BACKEND_EXTRACAO_PADRAO) -> int:
+    """Retorna o número de páginas de um PDF"""
+    return BACKENDS_EXTRACAO[backend].contar_paginas(caminho)
+
+
+def extrair_faixa_paginas(caminho: str, inicio: int, fim: int, backend: str = BACKEND_EXTRACAO_PADRAO) -> List[str]:
+    """Extrai o texto das páginas [inicio, fim) de um PDF (numeração a partir de 0)"""
+    with medir("extracao_faixa", backend=backend) as span:
+        textos = list(BACKENDS_EXTRACAO[backend].extrair_faixa(caminho, inicio, fim))
+        span.anotar(paginas=len(textos))
+    contar("paginas_extraidas", len(textos), backend=backend)
+    return textos
+
+
+def ler_paginas(caminho: str, hash_pdf: str = None, backend: str = BACKEND_EXTRACAO_PADRAO,
+                cache: CacheTextos = None) -> List[str]:
+    """Texto das páginas de um PDF, do cache quando possível, fora do pool"""
+    hash_pdf = hash_pdf or (hash_arquivo(caminho) if cache is not None else None)
+    if cache is not None:
+        paginas = cache.obter(hash_pdf, backend)
+        if paginas is not None:
+            return paginas
+
+    paginas = extrair_faixa_paginas(caminho, 0, contar_paginas(caminho, backend), backend)
+    if cache is not None:
+        cache.guardar(hash_pdf, backend, paginas)
+    return paginas
+
+
+def dividir_em_faixas(total_paginas: int, paginas_por_tarefa: int) -> List[tuple]:
+    """Divide as páginas de um documento em faixas contíguas [inicio, fim)"""
+    return [
+        (inicio, min(inicio + paginas_por_tarefa, total_paginas))
+        for inicio in range(0, total_paginas, paginas_por_tarefa)
+    ]
+
+# =====================================================
+# 🚀 EXTRATOR PARALELO
+# =====================================================
+
+class ExtratorParalelo:
+    """Extrai o texto de vários PDFs usando um pool de processos.
+
+    O trabalho é dividido por documento e, nos PDFs grandes, por faixa de
+    páginas. Cada documento é entregue com as páginas na ordem original e
+    um erro em um arquivo não interrompe os demais. Com um ``CacheTextos``,
+    PDFs já extraídos pelo mesmo backend não são abertos de novo.
+    """
+
+    def __init__(self, workers: int = None, paginas_por_tarefa: int = PAGINAS_POR_TAREFA,
+                 backend: str = BACKEND_EXTRACAO_PADRAO, cache: CacheTextos = None):
+        if backend not in BACKENDS_EXTRACAO:
+            raise ValueError(f"Backend de extração desconhecido: {backend}")
+        # Falha já aqui, e não em cada processo do pool, se a biblioteca não estiver instalada
+        BACKENDS_EXTRACAO[backend].versao()
+        self.workers = workers or os.cpu_count() or 1
+        self.paginas_por_tarefa = paginas_por_tarefa
+        self.backend = backend
+        self.cache = cache
+        self.paginas_extraidas = 0
+        self.documentos_do_cache = 0
+        self.documentos_extraidos = 0
+        self.documentos_com_erro = 0
+        self.tempo_total = 0.0
+
+    def paginas_por_segundo(self) -> float:
+        """Vazão da última extração"""
+        if self.tempo_total <= 0:
+            return 0.0
+        return self.paginas_extraidas / self.tempo_total
+
+    def extrair(self, caminhos: List[str], hashes: Dict[str, str] = None) -> Iterator[Dict]:
+        """Extrai os PDFs e produz um resultado por documento, na ordem em que terminam.
+
+        Cada resultado é um dicionário com as chaves ``caminho``, ``arquivo``,
+        ``paginas`` (lista de textos, uma entrada por página) e ``erro``.
+        ``hashes`` (caminho -> hash do PDF) habilita o cache de textos; os
+        documentos encontrados nele são entregues primeiro.
+        """
+        hashes = hashes if self.cache is not None else None
+        inicio = time.perf_counter()
+        try:
+            pendentes = []
+            for caminho in caminhos:
+                paginas = self.cache.obter(hashes[caminho], self.backend) if hashes and caminho in hashes else None
+                if paginas is None:
+                    pendentes.append(caminho)
+                    continue
+                self.documentos_do_cache += 1
+                yield {"caminho": caminho, "arquivo": os.path.basename(caminho), "paginas": paginas, "erro": None}
+
+            extraidos = self._extrair_sequencial(pendentes) if self.workers == 1 else self._extrair_em_pool(pendentes)
+            for resultado in extraidos:
+                if hashes and resultado["caminho"] in hashes and not resultado["erro"]:
+                    self.cache.guardar(hashes[resultado["caminho"]], self.backend, resultado["paginas"])
+                yield resultado
+        finally:
+            self.tempo_total = time.perf_counter() - inicio
+
+    def _registrar(self, resultado: Dict) -> Dict:
+        if resultado["erro"]:
+            self.documentos_com_erro += 1
+        else:
+            self.documentos_extraidos += 1
+            self.paginas_extraidas += len(resultado["paginas"])
+        return resultado
+
+    def _extrair_sequencial(self, caminhos: List[str]) -> Iterator[Dict]:
+        for caminho in caminhos:
+            resultado = {"caminho": caminho, "arquivo": os.path.basename(caminho), "paginas": [], "erro": None}
+            try:
+                resultado["paginas"] = extrair_faixa_paginas(caminho, 0, contar_paginas(caminho, self.backend),
+                                                             self.backend)
+            except Exception as e:
+                resultado["erro"] = e
+            yield self._registrar(resultado)
+
+    def _extrair_em_pool(self, caminhos: List[str]) -> Iterator[Dict]:
+        # Estado de cada documento: faixas pendentes e textos já extraídos
+        documentos = {
+            caminho: {"caminho": caminho, "arquivo": os.path.basename(caminho),
+                      "faixas": {}, "pendentes": 0, "erro": None}
+            for caminho in caminhos
+        }
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            # Primeira etapa: contar páginas (barato) para planejar as faixas
+            tarefas = {pool.submit(contar_paginas, caminho, self.backend): ("contagem", caminho, None) for caminho in caminhos}
+
+            while tarefas:
+                concluida = next(as_completed(tarefas))
+                tipo, caminho, faixa = tarefas.pop(concluida)
+                doc = documentos[caminho]
+
+                try:
+                    valor = concluida.result()
+                except Exception as e:
+                    doc["erro"] = doc["erro"] or e
+                    valor = None
+
+                if tipo == "contagem":
+                    if doc["erro"] is None:
+                        faixas = dividir_em_faixas(valor, self.paginas_por_tarefa)
+                        doc["pendentes"] = len(faixas)
+                        for inicio, fim in faixas:
+                            futuro = pool.submit(extrair_faixa_paginas, caminho, inicio, fim, self.backend)
+                            tarefas[futuro] = ("faixa", caminho, (inicio, fim))
+                else:
+                    doc["pendentes"] -= 1
+                    if valor is not None:
+                        doc["faixas"][faixa] = valor
+
+                if doc["pendentes"] == 0:
+                    yield self._registrar(self._montar_resultado(documentos.pop(caminho)))
+
+    @staticmethod
+    def _montar_resultado(doc: Dict) -> Dict:
+        paginas = []
+        if doc["erro"] is None:
+            for faixa in sorted(doc["faixas"]):
+                paginas.extend(doc["faixas"][faixa])
+        return {"caminho": doc["caminho"], "arquivo": doc["arquivo"], "paginas": paginas, "erro": doc["erro"]}
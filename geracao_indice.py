@@ -0,0 +1,79 @@
+import time
+import threading
+
+# =====================================================
+# 🔢 GERAÇÃO DO ÍNDICE
+# =====================================================
+# Toda escrita relevante no índice (indexação, remoção, ementas) marca uma
+# nova "geração" no _meta do mapeamento. Quem guarda resultados de busca em
+# cache compara a geração para saber quando descartá-los.
+#
+# Cada marcação é uma escrita no cluster state (put_mapping) e descarta os
+# resultados em cache de todos os usuários. Quem grava em lote marca uma vez
+# por lote; quem grava documento a documento usa um MarcadorGeracao.
+
+# Intervalo mínimo entre duas marcações de um MarcadorGeracao, em segundos
+INTERVALO_MARCACAO = 30.0
+
+
+def ler_geracao(es, index: str):
+    """Retorna a geração atual do índice (None se nunca foi marcada)"""
+    mapeamento = es.indices.get_mapping(index=index)[index]["mappings"]
+    return mapeamento.get("_meta", {}).get("geracao")
+
+
+def marcar_nova_geracao(es, index: str):
+    """Registra que o conteúdo do índice mudou"""
+    mapeamento = es.indices.get_mapping(index=index)[index]["mappings"]
+    # put_mapping substitui o _meta inteiro, então preserva as outras chaves
+    meta = dict(mapeamento.get("_meta", {}))
+    meta["geracao"] = time.time_ns()
+    es.indices.put_mapping(index=index, meta=meta)
+    return meta["geracao"]
+
+
+class MarcadorGeracao:
+    """Junta as marcações de quem grava um documento de cada vez.
+
+    A primeira mudança marca na hora. As seguintes, dentro do intervalo,
+    viram uma única marcação no fim dele.
+    """
+
+    def __init__(self, es, index: str, intervalo: float = INTERVALO_MARCACAO):
+        self.es = es
+        self.index = index
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._ultima = None
+        self._agendada = None
+
+    def marcar(self):
+        """Registra que o conteúdo do índice mudou, no máximo uma vez por intervalo"""
+        with self._lock:
+            if self._agendada is not None:
+                return
+            agora = time.monotonic()
+            if self._ultima is not None and agora - self._ultima < self.intervalo:
+                self._agendada = threading.Timer(self._ultima + self.intervalo - agora, self._marcar_agendada)
+                self._agendada.daemon = True
+                self._agendada.start()
+                return
+            self._ultima = agora
+        marcar_nova_geracao(self.es, self.index)
+
+    def _marcar_agendada(self):
+        with self._lock:
+            self._agendada = None
+            self._ultima = time.monotonic()
+        try:
+            marcar_nova_geracao(self.es, self.index)
+        except Exception as e:
+            print(f"⚠️ Não foi possível marcar a nova geração de '{self.index}': {e}")
+
+    def descarregar(self):
+        """Faz agora a marcação que estava agendada (ao encerrar)"""
+        with self._lock:
+            agendada, self._agendada = self._agendada, None
+        if agendada is not None:
+            agendada.cancel()
+            self._marcar_agendada()
@@ -1,70 +1,443 @@
+import os
 import json
-from elasticsearch import Elasticsearch
-from processador_ementas import processar_documento_para_ementa
+import argparse
+import queue
+import threading
+from elasticsearch import Elasticsearch, helpers
+from collections import OrderedDict
 from llama_cpp import Llama
+from pool_llm import GeradorEmentasLocal, PoolLLM, escolher_divisao
+from processador_ementas import SAIDA_ESTRUTURADA
+from cache_ementas import CacheEmentas, TAMANHO_MAXIMO_CACHE_EMENTAS
+from geracao_indice import marcar_nova_geracao
+from busca_local import IndiceLocal, usar_indice_local
+from duplicatas import ARQUIVO_DUPLICATAS, ARQUIVO_DUPLICATAS_LOCAL, IndiceDuplicatas, ReaproveitamentoEmentas
+from instrumentacao import contar, iniciar_servidor, medir, opcoes_elasticsearch
 import time
 
 # Configurações
 ES_URL = "http://localhost:9200"
 INDEX = "documentos_ifal_llm"
 MODEL_PATH = "models/gemma-3-gaia-pt-br-4b-it-q4_k_m.gguf"
+N_CTX = 8192
 
-def gerar_ementas_para_todos_documentos():
-    """Gera ementas para todos os documentos e salva no Elasticsearch"""
-    
-    # Conectar ao Elasticsearch
-    es = Elasticsearch(ES_URL)
-    
-    # Carregar modelo LLM
-    print("🔄 Carregando modelo LLM...")
-    llm = Llama(
-        model_path=MODEL_PATH,
-        n_ctx=8192,
-        n_threads=6,
-        verbose=False
-    )
-    
-    # Buscar TODOS os documentos
-    print("📥 Buscando documentos...")
-    resultado = es.search(
+# Progresso salvo a cada documento, para retomar depois de uma interrupção
+ARQUIVO_CHECKPOINT = "cache/checkpoint_ementas.json"
+
+# Documentos lidos do Elasticsearch por requisição
+TAMANHO_LOTE_LEITURA = 20
+
+# Documentos cuja ementa foi gerada a partir de um conteúdo diferente do atual
+SCRIPT_EMENTA_DESATUALIZADA = (
+    "doc['hash_conteudo'].size() > 0 && "
+    "(doc['hash_conteudo_ementa'].size() == 0 || "
+    "doc['hash_conteudo_ementa'].value != doc['hash_conteudo'].value)"
+)
+
+# =============================================
+# CHECKPOINT
+# =============================================
+
+def carregar_checkpoint():
+    """Retorna o último arquivo processado na execução anterior (ou None)"""
+    if not os.path.exists(ARQUIVO_CHECKPOINT):
+        return None
+    with open(ARQUIVO_CHECKPOINT, "r", encoding="utf-8") as f:
+        return json.load(f).get("ultimo_arquivo")
+
+def salvar_checkpoint(ultimo_arquivo):
+    os.makedirs(os.path.dirname(ARQUIVO_CHECKPOINT), exist_ok=True)
+    temporario = ARQUIVO_CHECKPOINT + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump({"ultimo_arquivo": ultimo_arquivo}, f, ensure_ascii=False)
+    os.replace(temporario, ARQUIVO_CHECKPOINT)
+
+def apagar_checkpoint():
+    if os.path.exists(ARQUIVO_CHECKPOINT):
+        os.remove(ARQUIVO_CHECKPOINT)
+
+# =============================================
+# LEITURA DOS DOCUMENTOS PENDENTES
+# =============================================
+
+def garantir_campos_ementa(es):
+    """Garante o mapeamento dos campos usados para controlar as ementas"""
+    es.indices.put_mapping(
         index=INDEX,
-        body={"size": 1000, "query": {"match_all": {}}}
+        properties={
+            "tem_ementa": {"type": "boolean"},
+            "hash_conteudo_ementa": {"type": "keyword"}
+        }
     )
-    
-    documentos = resultado['hits']['hits']
-    print(f"📄 Encontrados {len(documentos)} documentos")
-    
-    # Processar cada documento
-    for i, doc in enumerate(documentos):
-        doc_id = doc['_id']
-        conteudo = doc['_source']['conteudo']
-        arquivo = doc['_source']['arquivo']
-        
-        print(f"🔧 Processando {i+1}/{len(documentos)}: {arquivo}")
-        
+
+def montar_query_pendentes(a_partir_de=None):
+    """Documentos sem ementa ou com ementa de uma versão anterior do conteúdo"""
+    query = {
+        "bool": {
+            "should": [
+                {"bool": {"must_not": {"term": {"tem_ementa": True}}}},
+                {"script": {"script": {"source": SCRIPT_EMENTA_DESATUALIZADA}}}
+            ],
+            "minimum_should_match": 1
+        }
+    }
+    if a_partir_de is not None:
+        query["bool"]["filter"] = [{"range": {"arquivo": {"gt": a_partir_de}}}]
+    return query
+
+def iterar_documentos_pendentes(es, a_partir_de=None, tamanho_lote=TAMANHO_LOTE_LEITURA):
+    """Percorre todos os documentos pendentes, em ordem de arquivo, com point-in-time"""
+    if isinstance(es, IndiceLocal):
+        yield from es.documentos_pendentes(a_partir_de)
+        return
+
+    pit_id = es.open_point_in_time(index=INDEX, keep_alive="30m")["id"]
+    cursor = None
+
+    try:
+        while True:
+            corpo = {
+                "size": tamanho_lote,
+                "query": montar_query_pendentes(a_partir_de),
+                "pit": {"id": pit_id, "keep_alive": "30m"},
+                "sort": [{"arquivo": "asc"}],
+                "_source": ["arquivo", "conteudo", "hash_conteudo"]
+            }
+            if cursor is not None:
+                corpo["search_after"] = cursor
+
+            resultado = es.search(body=corpo)
+            pit_id = resultado.get("pit_id", pit_id)
+            hits = resultado['hits']['hits']
+            if not hits:
+                return
+
+            yield from hits
+            cursor = hits[-1]["sort"]
+    finally:
+        es.close_point_in_time(id=pit_id)
+
+# =============================================
+# ETAPAS DO PIPELINE
+# =============================================
+# leitor (thread) -> fila -> LLM (thread principal) -> fila -> escritor (thread)
+# As filas são limitadas: se o LLM atrasa, o leitor espera; se o Elasticsearch
+# atrasa, o LLM espera. O LLM nunca fica parado aguardando I/O.
+
+# Documentos lidos antecipadamente, à espera do LLM
+TAMANHO_FILA_LEITURA = 8
+
+# Ementas prontas à espera de gravação
+TAMANHO_FILA_ESCRITA = 64
+
+# Atualizações enviadas por requisição _bulk, e espera máxima antes de enviar um lote incompleto
+TAMANHO_LOTE_ESCRITA = 20
+ESPERA_MAXIMA_ESCRITA = 5.0
+
+_FIM = object()
+
+
+class _ErroLeitura:
+    def __init__(self, erro):
+        self.erro = erro
+
+
+def _colocar(fila, item, parar):
+    """Coloca um item na fila, desistindo se o pipeline for interrompido"""
+    while not parar.is_set():
+        try:
+            fila.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _leitor(es, a_partir_de, fila_leitura, parar):
+    """Lê os documentos pendentes antecipadamente"""
+    iterador = iterar_documentos_pendentes(es, a_partir_de)
+    try:
+        for doc in iterador:
+            if not _colocar(fila_leitura, doc, parar):
+                break
+    except Exception as e:
+        _colocar(fila_leitura, _ErroLeitura(e), parar)
+    finally:
+        # Fecha o point-in-time mesmo quando a leitura é interrompida
+        iterador.close()
+        _colocar(fila_leitura, _FIM, parar)
+
+
+def _escritor(es, fila_escrita, estatisticas):
+    """Grava as ementas em lote e avança o checkpoint depois de cada gravação.
+
+    O checkpoint só passa de documentos gravados. A partir da primeira falha
+    (no LLM ou na gravação) ele fica parado, e a próxima execução encontra
+    esse documento de novo entre os pendentes.
+    """
+    lote = []
+    primeiro_em = None
+    checkpoint = {"parado": False}
+
+    def gravar():
+        acoes = [acao for _, acao in lote if acao is not None]
+        # IDs que não foram gravados; None quando o lote inteiro falhou
+        falhas = set()
+        if acoes:
+            try:
+                with medir("gravacao_ementas") as span:
+                    if isinstance(es, IndiceLocal):
+                        es.gravar_ementas({acao["_id"]: acao["doc"] for acao in acoes})
+                        sucessos, erros = len(acoes), []
+                    else:
+                        sucessos, erros = helpers.bulk(es, acoes, raise_on_error=False, raise_on_exception=False)
+                    span.anotar(ementas=len(acoes))
+                estatisticas["gravadas"] += sucessos
+                contar("ementas_gravadas", sucessos)
+                for erro in erros:
+                    print(f"❌ Erro ao gravar ementa: {erro}")
+                    falhas.add(next(iter(erro.values())).get("_id"))
+            except Exception as e:
+                print(f"❌ Erro ao gravar lote de ementas: {e}")
+                falhas = None
+
+        ultimo = None
+        for arquivo, acao in lote:
+            if acao is None or falhas is None or acao["_id"] in falhas:
+                checkpoint["parado"] = True
+            if checkpoint["parado"]:
+                break
+            ultimo = arquivo
+        if ultimo is not None:
+            salvar_checkpoint(ultimo)
+        lote.clear()
+
+    while True:
+        espera = None
+        if lote:
+            espera = max(0.0, ESPERA_MAXIMA_ESCRITA - (time.monotonic() - primeiro_em))
         try:
-            # Gerar ementa
-            ementa = processar_documento_para_ementa(conteudo, llm)
-            
-            # Atualizar documento no Elasticsearch com a ementa
-            es.update(
-                index=INDEX,
-                id=doc_id,
-                body={
-                    "doc": {
-                        "ementa": ementa,
-                        "tem_ementa": True
+            item = fila_escrita.get(timeout=espera)
+        except queue.Empty:
+            gravar()
+            continue
+
+        if item is _FIM:
+            if lote:
+                gravar()
+            return
+
+        if not lote:
+            primeiro_em = time.monotonic()
+        lote.append(item)
+        if len(lote) >= TAMANHO_LOTE_ESCRITA:
+            gravar()
+
+# =============================================
+# GERAÇÃO
+# =============================================
+
+def criar_gerador(workers, threads_por_worker, cache=None, saida_estruturada=SAIDA_ESTRUTURADA):
+    """Um único modelo no próprio processo, ou um pool de processos com um modelo cada"""
+    if workers == 1:
+        llm = Llama(
+            model_path=MODEL_PATH,
+            n_ctx=N_CTX,
+            n_threads=threads_por_worker,
+            verbose=False
+        )
+        return GeradorEmentasLocal(llm, cache, saida_estruturada)
+    return PoolLLM(MODEL_PATH, workers, threads_por_worker, N_CTX, cache, saida_estruturada)
+
+def gerar_ementas_para_todos_documentos(recomecar=False, workers=None, threads_por_worker=None,
+                                        usar_cache=True, tamanho_cache=TAMANHO_MAXIMO_CACHE_EMENTAS,
+                                        saida_estruturada=SAIDA_ESTRUTURADA, reaproveitar_duplicatas=True):
+    """Gera ementas para os documentos pendentes e salva no Elasticsearch (ou no índice local).
+
+    Quase duplicatas ligadas pelo indexador partem da ementa do canônico: só
+    as seções alteradas vão ao modelo.
+    """
+
+    if usar_indice_local():
+        # IFAL_BACKEND=local: as ementas vão para o índice local, que já registra a mudança
+        es = IndiceLocal()
+    else:
+        # Conectar ao Elasticsearch
+        es = Elasticsearch(ES_URL, **opcoes_elasticsearch())
+        garantir_campos_ementa(es)
+
+    # Retoma de onde a execução anterior parou
+    a_partir_de = None if recomecar else carregar_checkpoint()
+    if a_partir_de:
+        print(f"↩️ Retomando depois de: {a_partir_de}")
+
+    if isinstance(es, IndiceLocal):
+        total = es.contar_pendentes(a_partir_de)
+    else:
+        total = es.count(index=INDEX, query=montar_query_pendentes(a_partir_de))["count"]
+    print(f"📄 Encontrados {total} documentos sem ementa atualizada")
+    if total == 0:
+        apagar_checkpoint()
+        return
+
+    # Carregar modelo LLM
+    workers_padrao, threads_padrao = escolher_divisao(threads_por_worker=threads_por_worker)
+    workers = workers or workers_padrao
+    threads_por_worker = threads_por_worker or threads_padrao
+    print(f"🔄 Carregando modelo LLM ({workers} processos x {threads_por_worker} threads)...")
+    # Respostas já geradas para o mesmo texto, prompt e modelo voltam do cache
+    cache = CacheEmentas(tamanho_maximo=tamanho_cache) if usar_cache else None
+    gerador = criar_gerador(workers, threads_por_worker, cache, saida_estruturada)
+
+    reaproveitamento = None
+    if reaproveitar_duplicatas:
+        duplicatas = IndiceDuplicatas.carregar(
+            ARQUIVO_DUPLICATAS_LOCAL if isinstance(es, IndiceLocal) else ARQUIVO_DUPLICATAS
+        )
+        reaproveitamento = ReaproveitamentoEmentas(duplicatas, es, INDEX)
+
+    # Documentos em processamento ao mesmo tempo (mantém todos os workers ocupados)
+    limite_em_andamento = 2 * gerador.workers
+
+    parar = threading.Event()
+    fila_leitura = queue.Queue(maxsize=TAMANHO_FILA_LEITURA)
+    fila_escrita = queue.Queue(maxsize=TAMANHO_FILA_ESCRITA)
+    estatisticas = {"gravadas": 0}
+
+    leitor = threading.Thread(target=_leitor, args=(es, a_partir_de, fila_leitura, parar), daemon=True)
+    escritor = threading.Thread(target=_escritor, args=(es, fila_escrita, estatisticas), daemon=True)
+    leitor.start()
+    escritor.start()
+
+    try:
+        # Documentos submetidos, na ordem de leitura (a ordem do checkpoint),
+        # e resultados que já chegaram mas esperam os anteriores
+        pendentes = OrderedDict()
+        prontos = {}
+        submetido_em = {}
+        leitura_terminou = False
+        i = 0
+
+        while True:
+            # Mantém o gerador abastecido
+            while (not leitura_terminou
+                   and gerador.em_andamento() < limite_em_andamento
+                   and len(pendentes) < 4 * limite_em_andamento):
+                try:
+                    doc = fila_leitura.get(timeout=0.1 if pendentes else None)
+                except queue.Empty:
+                    break
+                if doc is _FIM:
+                    leitura_terminou = True
+                    break
+                if isinstance(doc, _ErroLeitura):
+                    raise doc.erro
+
+                i += 1
+                print(f"🔧 Processando {i}/{total}: {doc['_source']['arquivo']}")
+                pendentes[doc['_id']] = doc
+                submetido_em[doc['_id']] = time.monotonic()
+
+                texto, ementa_pronta = doc['_source']['conteudo'], None
+                if reaproveitamento is not None:
+                    texto, ementa_pronta = reaproveitamento.preparar(doc['_id'], texto)
+                if ementa_pronta is not None:
+                    # Mesmo texto do canônico: a ementa dele vale como está
+                    prontos[doc['_id']] = (ementa_pronta, None)
+                else:
+                    gerador.submeter(doc['_id'], texto)
+
+            for doc_id, ementa, erro in gerador.avancar(timeout=0.5):
+                if reaproveitamento is not None:
+                    ementa = reaproveitamento.concluir(doc_id, ementa)
+                prontos[doc_id] = (ementa, erro)
+
+            # Envia ao escritor, em ordem, tudo o que já está pronto
+            while pendentes and next(iter(pendentes)) in prontos:
+                doc_id, doc = pendentes.popitem(last=False)
+                ementa, erro = prontos.pop(doc_id)
+                arquivo = doc['_source']['arquivo']
+                contar("ementas_documentos", resultado="ok" if erro is None else "erro")
+                contar("ementas_documentos_segundos", time.monotonic() - submetido_em.pop(doc_id))
+
+                acao = None
+                if erro is None:
+                    # Atualização parcial do documento, gravada em lote pelo escritor
+                    acao = {
+                        "_op_type": "update",
+                        "_index": INDEX,
+                        "_id": doc_id,
+                        "doc": {
+                            "ementa": ementa,
+                            "tem_ementa": True,
+                            "hash_conteudo_ementa": doc['_source'].get('hash_conteudo')
+                        }
                     }
-                }
-            )
-            
-            print(f"✅ Ementa gerada para {arquivo}")
-            time.sleep(1)  # Evitar sobrecarga
-            
-        except Exception as e:
-            print(f"❌ Erro ao processar {arquivo}: {e}")
-    
-    print("🎉 Todas as ementas foram geradas e salvas!")
+                    print(f"✅ Ementa gerada para {arquivo}")
+                else:
+                    print(f"❌ Erro ao processar {arquivo}: {erro}")
+
+                fila_escrita.put((arquivo, acao))
+
+            if leitura_terminou and not pendentes:
+                break
+
+        concluido = True
+
+    except KeyboardInterrupt:
+        concluido = False
+        print("\n⏸️ Interrompido. Gravando as ementas já geradas...")
+
+    finally:
+        # Para o leitor e espera o escritor gravar tudo o que já foi gerado
+        parar.set()
+        fila_escrita.put(_FIM)
+        escritor.join()
+        gerador.fechar()
+
+        if cache is not None:
+            e = cache.estatisticas()
+            print(f"🗄️ Cache de ementas: {e['acertos']['ementa']} ementas e {e['acertos']['chunk']} chunks reaproveitados "
+                  f"({e['taxa_acerto_ementas']:.0%} / {e['taxa_acerto_chunks']:.0%}), "
+                  f"{e['entradas']} entradas, {e['bytes'] / 1024 / 1024:.1f} MB, {e['despejos']} descartes")
+            cache.fechar()
+
+        if reaproveitamento is not None and (reaproveitamento.identicas or reaproveitamento.parciais):
+            print(f"🔁 Quase duplicatas: {reaproveitamento.identicas} ementas copiadas do canônico, "
+                  f"{reaproveitamento.parciais} geradas só com as seções alteradas")
+
+        # Avisa o app de que os resultados em cache estão desatualizados
+        if estatisticas["gravadas"] and not isinstance(es, IndiceLocal):
+            marcar_nova_geracao(es, INDEX)
+
+    if concluido:
+        # Passagem completa: a próxima execução começa do início
+        apagar_checkpoint()
+        print(f"🎉 Todas as ementas foram geradas e salvas! ({estatisticas['gravadas']} gravadas)")
+    else:
+        print("Execute novamente para continuar de onde parou.")
 
 if __name__ == "__main__":
-    gerar_ementas_para_todos_documentos()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Gera as ementas dos documentos indexados")
+    parser.add_argument("--recomecar", action="store_true",
+                        help="Ignora o checkpoint e percorre o índice desde o início")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos com o modelo carregado (padrão: núcleos / threads por processo)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Threads do llama.cpp por processo (padrão: 6)")
+    parser.add_argument("--sem-cache", action="store_true",
+                        help="Não consulta nem grava o cache de respostas do modelo")
+    parser.add_argument("--tamanho-cache-mb", type=int, default=TAMANHO_MAXIMO_CACHE_EMENTAS // (1024 * 1024),
+                        help="Tamanho máximo do cache de respostas do modelo, em MB")
+    parser.add_argument("--saida-estruturada", action="store_true", default=SAIDA_ESTRUTURADA,
+                        help="Gera a ementa como JSON restrito por gramática em vez de texto livre")
+    parser.add_argument("--sem-duplicatas", action="store_true",
+                        help="Gera a ementa inteira também das quase duplicatas de documentos já resumidos")
+    args = parser.parse_args()
+    iniciar_servidor()
+
+    gerar_ementas_para_todos_documentos(
+        args.recomecar, args.workers, args.threads,
+        usar_cache=not args.sem_cache, tamanho_cache=args.tamanho_cache_mb * 1024 * 1024,
+        saida_estruturada=args.saida_estruturada, reaproveitar_duplicatas=not args.sem_duplicatas
+    )
@@ -0,0 +1,256 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from extracao_pdfs import ExtratorParalelo, PAGINAS_POR_TAREFA, BACKEND_EXTRACAO_PADRAO
+from embeddings import TAMANHO_LOTE_EMBEDDINGS
+from instrumentacao import medir, opcoes_elasticsearch
+from quantizacao import MODO_VETORES_PADRAO
+from indexacao_bulk import TAMANHO_LOTE, MAX_BYTES_LOTE, WORKERS_BULK, MAX_TENTATIVAS, ESPERA_INICIAL, ESPERA_MAXIMA
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DA INDEXAÇÃO ASSÍNCRONA
+# =====================================================
+# Na indexação comum as etapas formam uma cadeia de geradores: enquanto o
+# modelo codifica um grupo, nada é enviado, e enquanto um lote espera a
+# resposta do Elasticsearch, o modelo fica parado. Aqui cada etapa roda por
+# conta própria, ligada às outras por filas limitadas:
+#   extração (pool de processos) -> embeddings (threads) -> _bulk (asyncio)
+# e o tempo total tende ao da etapa mais lenta.
+
+# Grupos de documentos codificados ao mesmo tempo. O modelo já usa todos os
+# núcleos em cada chamada; mais de um só ajuda com GPU ou modelos pequenos.
+LIMITE_EMBEDDINGS = 1
+
+# Documentos à espera entre uma etapa e a seguinte
+TAMANHO_FILA_ETAPA = 32
+
+_FIM = object()
+
+
+class _Sincronizado:
+    """Serializa as chamadas a um objeto que não é thread-safe (cache de embeddings, armazém)"""
+
+    def __init__(self, alvo):
+        self._alvo = alvo
+        self._lock = threading.Lock()
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._alvo, nome)
+        if not callable(atributo):
+            return atributo
+
+        def chamar(*args, **kwargs):
+            with self._lock:
+                return atributo(*args, **kwargs)
+        return chamar
+
+
+class _Tempos:
+    """Tempo em que as etapas de CPU estiveram ocupadas, para comparar com o tempo total"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.segundos: Dict[str, float] = {}
+
+    def somar(self, etapa: str, segundos: float):
+        with self._lock:
+            self.segundos[etapa] = self.segundos.get(etapa, 0.0) + segundos
+
+
+def conectar_elasticsearch_async(url: str):
+    """Cliente assíncrono (requer ``pip install elasticsearch[async]``, que traz o aiohttp)"""
+    from elasticsearch import AsyncElasticsearch
+
+    return AsyncElasticsearch(url, request_timeout=120, max_retries=3, retry_on_timeout=True,
+                              **opcoes_elasticsearch(assincrono=True))
+
+
+async def _etapa_extracao(acoes, fila_saida: asyncio.Queue, executor, tempos: _Tempos):
+    """Avança o gerador de ações (que lê do pool de extração) fora do loop de eventos"""
+    loop = asyncio.get_running_loop()
+    iterador = iter(acoes)
+    while True:
+        inicio = time.perf_counter()
+        acao = await loop.run_in_executor(executor, next, iterador, _FIM)
+        tempos.somar("extracao", time.perf_counter() - inicio)
+        if acao is _FIM:
+            return
+        # Fila cheia: a extração espera os embeddings
+        await fila_saida.put(acao)
+
+
+async def _etapa_embeddings(codificar: Callable[[List[Dict]], List[Dict]], fila_entrada: asyncio.Queue,
+                            fila_saida: asyncio.Queue, executor, tamanho_grupo: int, tempos: _Tempos):
+    """Junta os documentos disponíveis em grupos e os codifica em uma thread"""
+    loop = asyncio.get_running_loop()
+    while True:
+        grupo = [await fila_entrada.get()]
+        # Não espera o grupo encher: codifica o que já chegou
+        while len(grupo) < tamanho_grupo and not fila_entrada.empty():
+            grupo.append(fila_entrada.get_nowait())
+        terminou = _FIM in grupo
+        if terminou:
+            grupo = [acao for acao in grupo if acao is not _FIM]
+            # Os outros codificadores também precisam do aviso
+            await fila_entrada.put(_FIM)
+        if not grupo:
+            return
+
+        with medir("async_embeddings") as span:
+            inicio = time.perf_counter()
+            codificadas = await loop.run_in_executor(executor, codificar, grupo)
+            tempos.somar("embeddings", time.perf_counter() - inicio)
+            span.anotar(documentos=len(grupo))
+        for acao in codificadas:
+            await fila_saida.put(acao)
+        if terminou:
+            return
+
+
+async def _etapa_envio(es, fila_entrada: asyncio.Queue, tamanho_lote: int, max_bytes: int,
+                       ao_confirmar: Callable, totais: Dict, tempos: _Tempos):
+    """Um dos envios _bulk simultâneos; cada um consome a mesma fila"""
+    from elasticsearch.helpers import async_streaming_bulk
+
+    async def acoes():
+        while True:
+            acao = await fila_entrada.get()
+            if acao is _FIM:
+                await fila_entrada.put(_FIM)
+                return
+            yield acao
+
+    async for ok, item in async_streaming_bulk(
+        es,
+        acoes(),
+        chunk_size=tamanho_lote,
+        max_chunk_bytes=max_bytes,
+        max_retries=MAX_TENTATIVAS,
+        initial_backoff=ESPERA_INICIAL,
+        max_backoff=ESPERA_MAXIMA,
+        raise_on_error=False,
+        raise_on_exception=False,
+    ):
+        # Apagar um documento que já não existe não é uma falha
+        operacao, resposta = next(iter(item.items()))
+        if not ok and operacao == "delete" and resposta.get("status") == 404:
+            ok = True
+        totais["sucessos" if ok else "falhas"] += 1
+        if ao_confirmar:
+            ao_confirmar(ok, item)
+
+
+async def indexar_async(es, acoes, codificar: Callable[[List[Dict]], List[Dict]],
+                        tamanho_lote: int = TAMANHO_LOTE, max_bytes: int = MAX_BYTES_LOTE,
+                        limite_embeddings: int = LIMITE_EMBEDDINGS, limite_envio: int = WORKERS_BULK,
+                        tamanho_grupo: int = 16, tamanho_fila: int = TAMANHO_FILA_ETAPA,
+                        ao_confirmar: Callable[[bool, Dict], None] = None) -> Dict:
+    """Executa as três etapas ao mesmo tempo sobre um fluxo de ações _bulk.
+
+    ``acoes`` é um gerador síncrono (em geral ``gerar_acoes``) e
+    ``codificar`` recebe um grupo de ações e as devolve com os embeddings.
+    Retorna os totais de sucessos e falhas e o tempo ocupado de cada etapa.
+    """
+    extraidos = asyncio.Queue(maxsize=tamanho_fila)
+    codificados = asyncio.Queue(maxsize=tamanho_fila)
+    tempos = _Tempos()
+    totais = {"sucessos": 0, "falhas": 0}
+
+    # Uma thread só para avançar o gerador de extração; as demais para o modelo
+    executor_extracao = ThreadPoolExecutor(max_workers=1, thread_name_prefix="extracao")
+    executor_embeddings = ThreadPoolExecutor(max_workers=limite_embeddings, thread_name_prefix="embeddings")
+
+    async def extrair():
+        await _etapa_extracao(acoes, extraidos, executor_extracao, tempos)
+        await extraidos.put(_FIM)
+
+    async def codificar_todos():
+        await asyncio.gather(*(
+            _etapa_embeddings(codificar, extraidos, codificados, executor_embeddings, tamanho_grupo, tempos)
+            for _ in range(max(1, limite_embeddings))
+        ))
+        await codificados.put(_FIM)
+
+    inicio = time.perf_counter()
+    tarefas = [
+        asyncio.ensure_future(extrair()),
+        asyncio.ensure_future(codificar_todos()),
+        *(asyncio.ensure_future(_etapa_envio(es, codificados, tamanho_lote, max_bytes, ao_confirmar, totais, tempos))
+          for _ in range(max(1, limite_envio))),
+    ]
+    try:
+        await asyncio.gather(*tarefas)
+    finally:
+        # Um erro em uma etapa interrompe as outras
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        executor_extracao.shutdown(wait=True)
+        executor_embeddings.shutdown(wait=True)
+        # Encerra o pool de extração se a carga parou no meio
+        if hasattr(acoes, "close"):
+            acoes.close()
+
+    return {**totais, "segundos": time.perf_counter() - inicio, "etapas": tempos.segundos}
+
+
+def indexar_pdfs_async(es_url: str, model, entradas, manifesto, workers=None, paginas_por_tarefa=PAGINAS_POR_TAREFA,
+                       tamanho_lote=TAMANHO_LOTE, max_bytes_lote=MAX_BYTES_LOTE, workers_bulk=WORKERS_BULK,
+                       cache=None, tamanho_lote_embeddings=TAMANHO_LOTE_EMBEDDINGS,
+                       backend_extracao=BACKEND_EXTRACAO_PADRAO, cache_textos=None,
+                       modo_vetores=MODO_VETORES_PADRAO, armazem=None, limite_embeddings=LIMITE_EMBEDDINGS,
+                       cliente=None, duplicatas=None):
+    """Versão assíncrona de ``indexar_pdfs.indexar_pdfs``, com os mesmos parâmetros.
+
+    ``workers`` limita a extração, ``limite_embeddings`` os grupos
+    codificados ao mesmo tempo e ``workers_bulk`` as requisições _bulk em
+    trânsito. ``cliente`` substitui o ``AsyncElasticsearch`` criado a
+    partir de ``es_url``.
+    """
+    from indexar_pdfs import (
+        DOCUMENTOS_POR_GRUPO, gerar_acoes, _codificar_grupo, criar_confirmacao, imprimir_resumo_duplicatas,
+        imprimir_resumo_extracao
+    )
+
+    extrator = ExtratorParalelo(workers=workers, paginas_por_tarefa=paginas_por_tarefa,
+                                backend=backend_extracao, cache=cache_textos)
+    print(f"⚙️ Extraindo {len(entradas)} PDFs com {extrator.workers} processos ({extrator.backend}), "
+          f"{limite_embeddings} grupo(s) de embeddings e {workers_bulk} envio(s) _bulk simultâneos\n")
+
+    # Com mais de um grupo codificado ao mesmo tempo, cache e armazém são compartilhados entre threads
+    if limite_embeddings > 1:
+        cache = _Sincronizado(cache) if cache is not None else None
+        armazem = _Sincronizado(armazem) if armazem is not None else None
+
+    def codificar(grupo):
+        return list(_codificar_grupo(model, grupo, cache, tamanho_lote_embeddings, modo_vetores, armazem, duplicatas))
+
+    ao_confirmar, totais = criar_confirmacao(entradas, manifesto, duplicatas)
+    acoes = gerar_acoes(extrator, entradas)
+    if duplicatas is not None:
+        # A assinatura é calculada na mesma thread que avança a extração
+        acoes = duplicatas.marcar(acoes)
+
+    async def executar():
+        es = cliente if cliente is not None else conectar_elasticsearch_async(es_url)
+        try:
+            return await indexar_async(
+                es, acoes, codificar, tamanho_lote, max_bytes_lote,
+                limite_embeddings, workers_bulk, DOCUMENTOS_POR_GRUPO, ao_confirmar=ao_confirmar
+            )
+        finally:
+            if cliente is None:
+                await es.close()
+
+    with medir("indexacao", modo="async") as span:
+        resultado = asyncio.run(executar())
+        span.anotar(documentos=len(entradas), paginas=extrator.paginas_extraidas)
+
+    imprimir_resumo_extracao(extrator)
+    imprimir_resumo_duplicatas(duplicatas)
+    etapas = ", ".join(f"{etapa} {segundos:.1f}s" for etapa, segundos in sorted(resultado["etapas"].items()))
+    print(f"⏱️ Etapas ocupadas: {etapas}; tempo total {resultado['segundos']:.1f}s")
+    return totais["processados"]
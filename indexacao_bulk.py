@@ -0,0 +1,131 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Tuple
+
+from elasticsearch import helpers
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DA INDEXAÇÃO EM LOTE
+# =====================================================
+
+# Documentos por requisição _bulk
+TAMANHO_LOTE = 100
+
+# Limite de bytes por requisição _bulk (os documentos carregam o texto inteiro)
+MAX_BYTES_LOTE = 20 * 1024 * 1024
+
+# Requisições _bulk em paralelo
+WORKERS_BULK = 2
+
+# Novas tentativas quando o Elasticsearch responde 429 (fila cheia)
+MAX_TENTATIVAS = 5
+ESPERA_INICIAL = 2
+ESPERA_MAXIMA = 60
+
+
+def _registrar_em_ordem(acoes: Iterable[Dict], enviadas: deque) -> Iterator[Dict]:
+    """Guarda cada ação enviada; as respostas voltam na mesma ordem"""
+    for acao in acoes:
+        enviadas.append(acao)
+        yield acao
+
+
+def indexar_em_lote(
+    es,
+    acoes: Iterable[Dict],
+    tamanho_lote: int = TAMANHO_LOTE,
+    max_bytes: int = MAX_BYTES_LOTE,
+    workers: int = WORKERS_BULK,
+    max_tentativas: int = MAX_TENTATIVAS,
+    ao_confirmar: Callable[[bool, Dict], None] = None,
+) -> Tuple[int, int]:
+    """Envia um fluxo de ações pela API _bulk do Elasticsearch.
+
+    As ações são consumidas sob demanda (o gerador pode extrair e codificar
+    os documentos enquanto os lotes anteriores estão em trânsito) e enviadas
+    por ``helpers.parallel_bulk`` com ``workers`` threads. O
+    ``parallel_bulk`` não repete as ações recusadas com 429 (fila cheia);
+    elas são reenviadas ao final, com espera exponencial, até
+    ``max_tentativas`` vezes. ``ao_confirmar(ok, item)`` é chamado para
+    cada ação respondida pelo Elasticsearch. Retorna ``(sucessos, falhas)``.
+    """
+    sucessos = falhas = 0
+    espera = ESPERA_INICIAL
+
+    for tentativa in range(max_tentativas + 1):
+        enviadas = deque()
+        recusadas = []
+        for ok, item in helpers.parallel_bulk(
+            es,
+            _registrar_em_ordem(acoes, enviadas),
+            thread_count=max(1, workers),
+            chunk_size=tamanho_lote,
+            max_chunk_bytes=max_bytes,
+            raise_on_error=False,
+            raise_on_exception=False,
+        ):
+            acao = enviadas.popleft()
+            operacao, resposta = next(iter(item.items()))
+            if not ok and resposta.get("status") == 429 and tentativa < max_tentativas:
+                recusadas.append(acao)
+                continue
+            # Apagar um documento que já não existe não é uma falha
+            if not ok and operacao == "delete" and resposta.get("status") == 404:
+                ok = True
+
+            if ok:
+                sucessos += 1
+            else:
+                falhas += 1
+            if ao_confirmar:
+                ao_confirmar(ok, item)
+
+        if not recusadas:
+            break
+        print(f"⏳ {len(recusadas)} ações recusadas pelo Elasticsearch (429); nova tentativa em {espera}s")
+        time.sleep(espera)
+        espera = min(espera * 2, ESPERA_MAXIMA)
+        acoes = recusadas
+
+    return sucessos, falhas
+
+
+@contextmanager
+def perfil_carga_em_lote(es, index: str, force_merge: bool = False):
+    """Deixa o índice otimizado para carga durante o bloco ``with``.
+
+    Desliga o refresh periódico e as réplicas, e ao final restaura as
+    configurações anteriores, faz um refresh e, opcionalmente, um
+    force-merge para um único segmento.
+    """
+    atuais = es.indices.get_settings(
+        index=index,
+        name=["index.refresh_interval", "index.number_of_replicas"],
+        flat_settings=True,
+    )[index]["settings"]
+
+    es.indices.put_settings(
+        index=index,
+        settings={"index": {"refresh_interval": "-1", "number_of_replicas": 0}},
+    )
+    print(f"🚚 Perfil de carga em lote ativado em '{index}'")
+
+    try:
+        yield
+    finally:
+        # None restaura o valor padrão quando a configuração não estava definida
+        es.indices.put_settings(
+            index=index,
+            settings={"index": {
+                "refresh_interval": atuais.get("index.refresh_interval"),
+                "number_of_replicas": atuais.get("index.number_of_replicas", 1),
+            }},
+        )
+        es.indices.refresh(index=index)
+
+        if force_merge:
+            print(f"🗜️ Executando force-merge em '{index}'...")
+            es.options(request_timeout=3600).indices.forcemerge(index=index, max_num_segments=1)
+
+        print(f"🚚 Configurações de '{index}' restauradas")
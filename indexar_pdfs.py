@@ -1,7 +1,30 @@
 import os
-import pdfplumber
-from elasticsearch import Elasticsearch
-from sentence_transformers import SentenceTransformer
+import argparse
+import numpy as np
+from contextlib import nullcontext
+from elasticsearch import Elasticsearch, helpers
+from extracao_pdfs import (
+    ExtratorParalelo, CacheTextos, PAGINAS_POR_TAREFA, BACKENDS_EXTRACAO, BACKEND_EXTRACAO_PADRAO
+)
+from manifesto import Manifesto
+from busca_local import BACKEND, PASTA_INDICE_LOCAL, EscritorIndiceLocal, IndiceLocal
+from duplicatas import (
+    ARQUIVO_DUPLICATAS, ARQUIVO_DUPLICATAS_LOCAL, DetectorDuplicatas, IndiceDuplicatas, criar_leitor_canonicos,
+    preencher_assinaturas
+)
+from geracao_indice import marcar_nova_geracao
+from instrumentacao import contar, iniciar_servidor, medir, opcoes_elasticsearch
+from trechos import dividir_em_trechos, juntar_paragrafos
+from quantizacao import (
+    ArmazemVetores, MODOS_VETORES, MODO_VETORES_PADRAO, mapeamento_vetor, modo_do_indice, resolver_modo,
+    vetor_para_indice
+)
+from embeddings import (
+    CacheEmbeddings, codificar_em_lotes, MODELO_EMBEDDINGS, CAPACIDADE_CACHE, TAMANHO_LOTE_EMBEDDINGS
+)
+from indexacao_bulk import (
+    indexar_em_lote, perfil_carga_em_lote, TAMANHO_LOTE, MAX_BYTES_LOTE, WORKERS_BULK
+)
 
 # =====================================================
 # ⚙️ CONFIGURAÇÕES INICIAIS
@@ -10,99 +33,550 @@ from sentence_transformers import SentenceTransformer
 # Nome do índice no Elasticsearch
 INDEX = "documentos_ifal_llm"
 
-# Conexão com o Elasticsearch local (sem autenticação e sem HTTPS)
-es = Elasticsearch("http://localhost:9200")
+# Endereço do Elasticsearch local (sem autenticação e sem HTTPS)
+ES_URL = "http://localhost:9200"
 
-# Teste rápido de conexão
-try:
-    info = es.info()
-    print(f"🔗 Conectado ao Elasticsearch versão {info['version']['number']}")
-except Exception as e:
-    print("❌ Erro ao conectar ao Elasticsearch:", e)
-    exit(1)
+# Pasta onde estão os PDFs a serem indexados
+PASTA_PDFS = "documentos/pdfs"
 
-# Modelo para gerar embeddings semânticos dos textos
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# Versão do mapeamento; índices criados com outra versão precisam ser recriados
+VERSAO_MAPEAMENTO = 2
 
-# Pasta onde estão os PDFs a serem indexados
-PASTA_PDFS = "documentos/pdfs"  
+
+def conectar_elasticsearch():
+    """Conecta ao Elasticsearch e encerra o script se não houver conexão"""
+    # O cliente refaz requisições que falham por timeout ou queda de conexão
+    es = Elasticsearch(ES_URL, request_timeout=120, max_retries=3, retry_on_timeout=True, **opcoes_elasticsearch())
+
+    # Teste rápido de conexão
+    try:
+        info = es.info()
+        print(f"🔗 Conectado ao Elasticsearch versão {info['version']['number']}")
+    except Exception as e:
+        print("❌ Erro ao conectar ao Elasticsearch:", e)
+        exit(1)
+
+    return es
 
 # =====================================================
-# 🧹 REINICIALIZAÇÃO DO ÍNDICE (APAGA E RECRIA)
+# 🧹 CRIAÇÃO / REINICIALIZAÇÃO DO ÍNDICE
 # =====================================================
 
-if es.indices.exists(index=INDEX):
-    print(f"🧹 Apagando índice existente: {INDEX}")
-    es.indices.delete(index=INDEX)
-
-# Cria o índice com mapeamento para texto e embeddings
-es.indices.create(
-    index=INDEX,
-    body={
-        "mappings": {
-            "properties": {
-                "arquivo": {"type": "keyword"},
-                "conteudo": {"type": "text"},
-                "embedding": {
-                    "type": "dense_vector",
-                    "dims": 384,  # tamanho do embedding gerado pelo modelo
-                    "index": True,
-                    "similarity": "cosine"
+def recriar_indice(es, modo_vetores=MODO_VETORES_PADRAO):
+    """Apaga o índice (se existir) e o recria com o mapeamento de texto e embeddings"""
+    if es.indices.exists(index=INDEX):
+        print(f"🧹 Apagando índice existente: {INDEX}")
+        es.indices.delete(index=INDEX)
+
+    criar_indice(es, modo_vetores)
+
+
+def criar_indice(es, modo_vetores=MODO_VETORES_PADRAO):
+    """Cria o índice com mapeamento para texto e embeddings"""
+    es.indices.create(
+        index=INDEX,
+        body={
+            "mappings": {
+                "_meta": {"versao_mapeamento": VERSAO_MAPEAMENTO, "modo_vetores": modo_vetores},
+                "properties": {
+                    "arquivo": {"type": "keyword"},
+                    "conteudo": {"type": "text"},
+                    "hash_conteudo": {"type": "keyword"},
+                    # Preenchidos por gerar_ementas.py
+                    "ementa": {"type": "text"},
+                    "tem_ementa": {"type": "boolean"},
+                    "hash_conteudo_ementa": {"type": "keyword"},
+                    # 384 dimensões, o tamanho do embedding gerado pelo modelo. A
+                    # busca usa os trechos; o vetor do documento só é guardado
+                    "embedding": mapeamento_vetor(modo_vetores, indexado=False),
+                    # Trechos sobrepostos do documento, cada um com seu embedding
+                    "trechos": {
+                        "type": "nested",
+                        "properties": {
+                            "texto": {"type": "text"},
+                            "pagina_inicio": {"type": "integer"},
+                            "pagina_fim": {"type": "integer"},
+                            "embedding": mapeamento_vetor(modo_vetores)
+                        }
+                    }
                 }
             }
         }
-    }
-)
+    )
 
-print(f"✅ Índice '{INDEX}' criado com sucesso.\n")
+    print(f"✅ Índice '{INDEX}' criado com sucesso (vetores: {modo_vetores}).\n")
+
+
+def mapeamento_atualizado(es):
+    """Verifica se o índice existente foi criado com o mapeamento atual"""
+    mapeamento = es.indices.get_mapping(index=INDEX)[INDEX]["mappings"]
+    return mapeamento.get("_meta", {}).get("versao_mapeamento") == VERSAO_MAPEAMENTO
 
 # =====================================================
-# 📄 LEITURA E INDEXAÇÃO DOS PDFs (AGORA INTEIROS)
+# 📄 AÇÕES DE INDEXAÇÃO: PDFs EXTRAÍDOS, TRECHOS E EMBEDDINGS
 # =====================================================
 
-pdfs_processados = 0
+def listar_pdfs(pasta=PASTA_PDFS):
+    """Lista os caminhos dos PDFs da pasta"""
+    return [
+        os.path.join(pasta, arquivo)
+        for arquivo in sorted(os.listdir(pasta))
+        if arquivo.endswith(".pdf")
+    ]
+
+
+def remover_documentos(es, manifesto, removidos, armazem=None, duplicatas=None):
+    """Remove do índice os documentos cujos PDFs foram apagados da pasta.
+
+    Só os documentos cuja remoção o Elasticsearch confirmou saem do
+    manifesto; os demais são tentados de novo na próxima execução.
+    """
+    acoes = (
+        {"_op_type": "delete", "_index": INDEX, "_id": entrada["doc_id"]}
+        for entrada in removidos
+    )
+    arquivos_por_id = {entrada["doc_id"]: entrada["arquivo"] for entrada in removidos}
+    confirmados = set()
+
+    def ao_confirmar(ok, item):
+        resposta = next(iter(item.values()))
+        if ok:
+            confirmados.add(resposta["_id"])
+        else:
+            print(f"❌ Erro ao remover {arquivos_por_id[resposta['_id']]}: {resposta.get('error')}")
+
+    indexar_em_lote(es, acoes, ao_confirmar=ao_confirmar)
+
+    for entrada in removidos:
+        if entrada["doc_id"] not in confirmados:
+            continue
+        manifesto.remover(entrada["arquivo"])
+        if armazem is not None:
+            armazem.remover(entrada["doc_id"])
+        if duplicatas is not None:
+            duplicatas.remover(entrada["doc_id"])
+        print(f"🗑️ {entrada['arquivo']} removido do índice.")
+
+
+def gerar_acoes(extrator, entradas):
+    """Extrai os PDFs e produz as ações _bulk (um documento completo por PDF)"""
+    entradas_por_caminho = {entrada["caminho"]: entrada for entrada in entradas}
+    hashes = {caminho: entrada["hash"] for caminho, entrada in entradas_por_caminho.items()}
 
-for arquivo in os.listdir(PASTA_PDFS):
-    if arquivo.endswith(".pdf"):
-        caminho = os.path.join(PASTA_PDFS, arquivo)
+    for resultado in extrator.extrair(list(entradas_por_caminho), hashes):
+        arquivo = resultado["arquivo"]
+        entrada = entradas_por_caminho[resultado["caminho"]]
         print(f"📘 Lendo arquivo: {arquivo}")
 
-        texto_total = ""
-
-        # Extrai texto de cada página do PDF
-        try:
-            with pdfplumber.open(caminho) as pdf:
-                for pagina_num, pagina in enumerate(pdf.pages, 1):
-                    texto_pagina = pagina.extract_text() or ""
-                    texto_total += texto_pagina + "\n"
-                    print(f"   📄 Página {pagina_num}: {len(texto_pagina)} caracteres")
-        except Exception as e:
-            print(f"❌ Erro ao ler {arquivo}: {e}")
+        if resultado["erro"]:
+            print(f"❌ Erro ao ler {arquivo}: {resultado['erro']}")
             continue
 
+        for pagina_num, texto_pagina in enumerate(resultado["paginas"], 1):
+            print(f"   📄 Página {pagina_num}: {len(texto_pagina)} caracteres")
+
+        texto_total = "\n".join(resultado["paginas"])
+
         if not texto_total.strip():
             print(f"⚠️ Nenhum texto encontrado em {arquivo}. Pulando arquivo.\n")
+            # Descarta uma eventual versão anterior que tinha texto; ao ser
+            # confirmado, o arquivo entra no manifesto e não é relido
+            yield {"_op_type": "delete", "_index": INDEX, "_id": entrada["doc_id"]}
             continue
 
-        # Remove espaços extras e quebras de linha múltiplas
-        texto_total = " ".join(texto_total.split())
-        
+        # Normaliza os espaços, mas mantém uma quebra de linha entre parágrafos
+        # (o gerador de ementas divide o documento por eles)
+        texto_total = juntar_paragrafos(resultado["paginas"])
+
         print(f"   📊 Texto extraído: {len(texto_total)} caracteres")
 
-        # Gera embedding do documento INTEIRO
-        embedding = model.encode(texto_total).tolist()
+        trechos = dividir_em_trechos(resultado["paginas"])
+        print(f"   🧩 {len(trechos)} trechos")
 
-        # Indexa o documento COMPLETO no Elasticsearch
-        es.index(
-            index=INDEX,
-            document={
+        # O ID é fixo por arquivo, então um PDF alterado substitui a versão anterior
+        yield {
+            "_op_type": "index",
+            "_index": INDEX,
+            "_id": entrada["doc_id"],
+            "_source": {
                 "arquivo": arquivo,
                 "conteudo": texto_total,
-                "embedding": embedding
-            }
+                "hash_conteudo": entrada["hash"],
+                "trechos": trechos,
+            },
+        }
+
+
+# Documentos cujos trechos são codificados juntos, para formar lotes cheios
+DOCUMENTOS_POR_GRUPO = 16
+
+
+def adicionar_embeddings(model, acoes, cache=None, tamanho_lote=TAMANHO_LOTE_EMBEDDINGS,
+                         modo_vetores=MODO_VETORES_PADRAO, armazem=None, duplicatas=None):
+    """Gera o embedding de cada trecho e o embedding do documento.
+
+    No modo ``byte`` os vetores vão quantizados para o índice; com um
+    ``armazem``, os vetores completos dos trechos são guardados nele. Com um
+    ``DetectorDuplicatas``, as quase duplicatas reaproveitam os vetores dos
+    trechos que não mudaram em relação ao canônico.
+    """
+    grupo = []
+    for acao in acoes:
+        grupo.append(acao)
+        if len(grupo) >= DOCUMENTOS_POR_GRUPO:
+            yield from _codificar_grupo(model, grupo, cache, tamanho_lote, modo_vetores, armazem, duplicatas)
+            grupo = []
+    yield from _codificar_grupo(model, grupo, cache, tamanho_lote, modo_vetores, armazem, duplicatas)
+
+
+def _codificar_grupo(model, acoes, cache, tamanho_lote, modo_vetores=MODO_VETORES_PADRAO, armazem=None,
+                     duplicatas=None):
+    """Codifica de uma vez os trechos de vários documentos"""
+    if duplicatas is None:
+        yield from _codificar(model, acoes, cache, tamanho_lote, modo_vetores, armazem)
+        return
+
+    # Cópias cujo canônico está no mesmo grupo esperam os vetores dele
+    ids = {acao["_id"] for acao in acoes}
+    depois = [acao for acao in acoes if duplicatas.canonico_pendente(acao["_id"]) in ids]
+    antes = [acao for acao in acoes if duplicatas.canonico_pendente(acao["_id"]) not in ids]
+    for parte in (antes, depois):
+        if parte:
+            yield from _codificar(model, parte, cache, tamanho_lote, modo_vetores, armazem, duplicatas)
+
+
+def _codificar(model, acoes, cache, tamanho_lote, modo_vetores=MODO_VETORES_PADRAO, armazem=None, duplicatas=None):
+    # Trechos iguais aos do canônico já têm vetor; só os demais vão ao modelo
+    reaproveitados = {}
+    if duplicatas is not None:
+        reaproveitados = {acao["_id"]: duplicatas.vetores_reaproveitaveis(acao)
+                          for acao in acoes if acao["_op_type"] == "index"}
+
+    textos = [
+        trecho["texto"]
+        for acao in acoes if acao["_op_type"] == "index"
+        for numero, trecho in enumerate(acao["_source"]["trechos"])
+        if numero not in reaproveitados.get(acao["_id"], {})
+    ]
+    vetores = codificar_em_lotes(model, textos, cache, tamanho_lote)
+
+    inicio = 0
+    for acao in acoes:
+        if acao["_op_type"] == "index":
+            trechos = acao["_source"]["trechos"]
+            prontos = reaproveitados.get(acao["_id"], {})
+            quantidade = len(trechos) - len(prontos)
+            codificados = iter(vetores[inicio:inicio + quantidade])
+            inicio += quantidade
+            vetores_documento = np.array(
+                [prontos[numero] if numero in prontos else next(codificados) for numero in range(len(trechos))],
+                dtype=np.float32,
+            ).reshape(len(trechos), -1)
+
+            for trecho, vetor in zip(acao["_source"]["trechos"], vetores_documento):
+                trecho["embedding"] = vetor_para_indice(vetor, modo_vetores)
+            if armazem is not None:
+                armazem.guardar(acao["_id"], vetores_documento)
+
+            # O embedding do documento é a média dos trechos: o modelo trunca
+            # textos longos, então codificar o documento inteiro só veria o início
+            centroide = vetores_documento.mean(axis=0)
+            norma = np.linalg.norm(centroide)
+            # Trechos opostos podem se anular; sem direção, o documento fica sem o vetor
+            if norma > 0:
+                acao["_source"]["embedding"] = vetor_para_indice(centroide / norma, modo_vetores)
+            if duplicatas is not None:
+                duplicatas.lembrar(acao["_id"], acao["_source"]["conteudo"], vetores_documento)
+        yield acao
+
+
+def indexar_pdfs(es, model, entradas, manifesto, workers=None, paginas_por_tarefa=PAGINAS_POR_TAREFA,
+                 tamanho_lote=TAMANHO_LOTE, max_bytes_lote=MAX_BYTES_LOTE, workers_bulk=WORKERS_BULK,
+                 cache=None, tamanho_lote_embeddings=TAMANHO_LOTE_EMBEDDINGS,
+                 backend_extracao=BACKEND_EXTRACAO_PADRAO, cache_textos=None,
+                 modo_vetores=MODO_VETORES_PADRAO, armazem=None, indice_local=None, duplicatas=None):
+    """Extrai os PDFs em paralelo e envia os documentos completos em lote ao Elasticsearch.
+
+    Com um ``indice_local`` (``EscritorIndiceLocal``), os documentos vão para
+    o índice local em vez do Elasticsearch. Com um ``DetectorDuplicatas``,
+    cada documento extraído é comparado aos já indexados antes dos embeddings.
+    """
+    extrator = ExtratorParalelo(workers=workers, paginas_por_tarefa=paginas_por_tarefa,
+                                backend=backend_extracao, cache=cache_textos)
+
+    print(f"⚙️ Extraindo {len(entradas)} PDFs com {extrator.workers} processos ({extrator.backend})\n")
+
+    ao_confirmar, totais = criar_confirmacao(entradas, manifesto, duplicatas)
+    acoes = gerar_acoes(extrator, entradas)
+    if duplicatas is not None:
+        acoes = duplicatas.marcar(acoes)
+    acoes = adicionar_embeddings(model, acoes, cache, tamanho_lote_embeddings, modo_vetores, armazem, duplicatas)
+    with medir("indexacao") as span:
+        if indice_local is not None:
+            indice_local.gravar(acoes, ao_confirmar=ao_confirmar)
+        else:
+            indexar_em_lote(es, acoes, tamanho_lote, max_bytes_lote, workers_bulk, ao_confirmar=ao_confirmar)
+        span.anotar(documentos=len(entradas), paginas=extrator.paginas_extraidas)
+
+    imprimir_resumo_extracao(extrator)
+    imprimir_resumo_duplicatas(duplicatas)
+    return totais["processados"]
+
+
+def criar_confirmacao(entradas, manifesto, duplicatas=None):
+    """Callback ``ao_confirmar`` que registra no manifesto cada documento confirmado.
+
+    Com um ``DetectorDuplicatas``, a assinatura do documento também só é
+    registrada na confirmação. Retorna ``(ao_confirmar, totais)``;
+    ``totais["processados"]`` conta os documentos indexados.
+    """
+    entradas_por_id = {entrada["doc_id"]: entrada for entrada in entradas}
+    totais = {"processados": 0}
+
+    def ao_confirmar(ok, item):
+        operacao, resposta = next(iter(item.items()))
+        entrada = entradas_por_id[resposta["_id"]]
+
+        contar("documentos_confirmados", operacao=operacao, resultado="ok" if ok else "falha")
+        if duplicatas is not None:
+            duplicatas.confirmar(ok, operacao, resposta["_id"])
+        if not ok:
+            print(f"❌ Erro ao indexar {entrada['arquivo']}: {resposta.get('error')}")
+            return
+
+        manifesto.registrar(entrada)
+        if operacao == "index":
+            totais["processados"] += 1
+            print(f"✅ {entrada['arquivo']} indexado como documento completo.")
+
+    return ao_confirmar, totais
+
+
+def imprimir_resumo_extracao(extrator):
+    print(
+        f"⏱️ Extração: {extrator.paginas_extraidas} páginas em {extrator.tempo_total:.1f}s "
+        f"({extrator.paginas_por_segundo():.1f} páginas/s, {extrator.documentos_com_erro} arquivos com erro, "
+        f"{extrator.documentos_do_cache} lidos do cache de textos)"
+    )
+
+
+def imprimir_resumo_duplicatas(duplicatas):
+    if duplicatas is not None and duplicatas.duplicatas:
+        print(f"🔁 Quase duplicatas: {duplicatas.duplicatas} documentos ligados a um canônico, "
+              f"{duplicatas.trechos_reaproveitados} trechos com o vetor reaproveitado")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexa os PDFs de documentos/pdfs no Elasticsearch")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos de extração (padrão: número de núcleos; 1 desativa o pool)")
+    parser.add_argument("--paginas-por-tarefa", type=int, default=PAGINAS_POR_TAREFA,
+                        help="Tamanho das faixas de páginas em que PDFs grandes são divididos")
+    parser.add_argument("--recriar", action="store_true",
+                        help="Apaga o índice e reindexa tudo (apaga também as ementas já geradas)")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE,
+                        help="Documentos por requisição _bulk")
+    parser.add_argument("--max-mb-lote", type=int, default=MAX_BYTES_LOTE // (1024 * 1024),
+                        help="Tamanho máximo de cada requisição _bulk, em MB")
+    parser.add_argument("--workers-bulk", type=int, default=WORKERS_BULK,
+                        help="Requisições _bulk enviadas em paralelo")
+    parser.add_argument("--tamanho-lote-embeddings", type=int, default=TAMANHO_LOTE_EMBEDDINGS,
+                        help="Trechos por chamada ao modelo de embeddings")
+    parser.add_argument("--capacidade-cache", type=int, default=CAPACIDADE_CACHE,
+                        help="Máximo de embeddings guardados no cache em disco (0 desativa o cache)")
+    parser.add_argument("--backend-extracao", choices=sorted(BACKENDS_EXTRACAO), default=BACKEND_EXTRACAO_PADRAO,
+                        help="Biblioteca que extrai o texto dos PDFs (pypdfium2 é mais rápida, pdfplumber mais fiel)")
+    parser.add_argument("--sem-cache-textos", action="store_true",
+                        help="Extrai o texto de novo mesmo de PDFs já lidos")
+    parser.add_argument("--modo-vetores", choices=MODOS_VETORES, default=None,
+                        help="Como os embeddings ficam no índice ao criá-lo (padrão: float); "
+                             "int8 e byte ocupam 1/4 da memória e a busca reordena com os vetores completos")
+    parser.add_argument("--force-merge", action="store_true",
+                        help="Ao final de uma carga completa, compacta o índice em um único segmento")
+    parser.add_argument("--async", dest="assincrono", action="store_true",
+                        help="Extração, embeddings e envio ao mesmo tempo (AsyncElasticsearch; requer o aiohttp)")
+    parser.add_argument("--limite-embeddings", type=int, default=1,
+                        help="Com --async, grupos de documentos codificados ao mesmo tempo")
+    parser.add_argument("--sem-duplicatas", action="store_true",
+                        help="Não procura quase duplicatas (retificações, republicações) entre os documentos")
+    parser.add_argument("--backend", choices=("elasticsearch", "local"), default=BACKEND,
+                        help="Onde gravar o índice (padrão: variável IFAL_BACKEND ou elasticsearch); "
+                             f"local grava em {PASTA_INDICE_LOCAL}, sem servidor")
+    args = parser.parse_args()
+    iniciar_servidor()
+
+    if args.backend == "local":
+        indexar_localmente(args)
+        return
+
+    es = conectar_elasticsearch()
+    manifesto = Manifesto.carregar()
+
+    # Sem o índice o manifesto não vale mais nada: tudo precisa ser indexado
+    carga_completa = args.recriar or not es.indices.exists(index=INDEX)
+    if carga_completa:
+        modo_vetores = resolver_modo(es, args.modo_vetores or MODO_VETORES_PADRAO)
+    if args.recriar:
+        recriar_indice(es, modo_vetores)
+    elif carga_completa:
+        criar_indice(es, modo_vetores)
+    elif not mapeamento_atualizado(es):
+        print(f"❌ O índice '{INDEX}' foi criado com um mapeamento antigo. Execute com --recriar.")
+        exit(1)
+    else:
+        modo_vetores = modo_do_indice(es, INDEX)
+        if args.modo_vetores and resolver_modo(es, args.modo_vetores) != modo_vetores:
+            print(f"❌ O índice '{INDEX}' usa vetores '{modo_vetores}'. Execute com --recriar para mudar o modo.")
+            exit(1)
+
+    # Nos modos quantizados a busca reordena os candidatos com os vetores completos
+    armazem = ArmazemVetores() if modo_vetores != "float" else None
+    duplicatas = None if args.sem_duplicatas else IndiceDuplicatas.carregar(ARQUIVO_DUPLICATAS)
+    if carga_completa:
+        manifesto.limpar()
+        if armazem is not None:
+            armazem.limpar()
+        if duplicatas is not None:
+            duplicatas.limpar()
+    elif duplicatas is not None and not duplicatas.assinaturas and manifesto.entradas:
+        # Índice criado antes da detecção: os documentos já indexados também podem ser canônicos
+        print("🔏 Calculando as assinaturas dos documentos já indexados...")
+        documentos = (
+            (hit["_id"], hit["_source"]["arquivo"], hit["_source"]["conteudo"])
+            for hit in helpers.scan(es, index=INDEX, _source=["arquivo", "conteudo"])
+            if hit["_source"].get("conteudo")
         )
+        print(f"   {preencher_assinaturas(duplicatas, documentos)} documentos assinados, "
+              f"{duplicatas.total_duplicatas} quase duplicatas encontradas\n")
+
+    alterados, removidos = manifesto.comparar(listar_pdfs())
+    print(f"🔎 {len(alterados)} PDFs novos ou alterados, {len(removidos)} removidos.\n")
+
+    remover_documentos(es, manifesto, removidos, armazem, duplicatas)
+    detector = None
+    if duplicatas is not None:
+        detector = DetectorDuplicatas(duplicatas, criar_leitor_canonicos(es, INDEX, armazem))
+
+    pdfs_processados = 0
+    cache = None
+    try:
+        if alterados:
+            # Modelo para gerar embeddings semânticos dos textos (importado só
+            # aqui: carregar o torch é lento e nem toda execução precisa dele)
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(MODELO_EMBEDDINGS)
+            if args.capacidade_cache > 0:
+                cache = CacheEmbeddings(capacidade=args.capacidade_cache)
+
+            # Na carga completa o índice fica sem refresh e sem réplicas até o fim
+            perfil = perfil_carga_em_lote(es, INDEX, args.force_merge) if carga_completa else nullcontext()
+            with perfil:
+                parametros = (
+                    model, alterados, manifesto, args.workers, args.paginas_por_tarefa,
+                    args.tamanho_lote, args.max_mb_lote * 1024 * 1024, args.workers_bulk,
+                    cache, args.tamanho_lote_embeddings, args.backend_extracao,
+                    None if args.sem_cache_textos else CacheTextos(), modo_vetores, armazem
+                )
+                if args.assincrono:
+                    from indexacao_async import indexar_pdfs_async
+                    pdfs_processados = indexar_pdfs_async(ES_URL, *parametros, limite_embeddings=args.limite_embeddings,
+                                                          duplicatas=detector)
+                else:
+                    pdfs_processados = indexar_pdfs(es, *parametros, duplicatas=detector)
+
+    finally:
+        # Salva o que já foi indexado mesmo se a execução for interrompida
+        manifesto.salvar()
+        if duplicatas is not None:
+            duplicatas.salvar()
+        if cache is not None:
+            cache.salvar()
+        if armazem is not None:
+            armazem.salvar()
+
+        # Avisa o app de que os resultados em cache estão desatualizados
+        if removidos or alterados:
+            marcar_nova_geracao(es, INDEX)
+
+    if cache is not None:
+        estatisticas = cache.estatisticas()
+        print(
+            f"🧠 Cache de embeddings: {estatisticas['acertos']} acertos, {estatisticas['faltas']} faltas "
+            f"({estatisticas['taxa_acerto']:.0%}), {estatisticas['despejos']} descartados, "
+            f"{estatisticas['entradas']}/{estatisticas['capacidade']} entradas"
+        )
+
+    print(f"🏁 Processamento concluído! {pdfs_processados} PDFs indexados como documentos completos.")
+
+
+def indexar_localmente(args):
+    """A mesma indexação incremental, gravando no índice local (busca_local.py)"""
+    indice_local = EscritorIndiceLocal()
+    # Manifesto próprio: o índice local e o do Elasticsearch podem estar em pontos diferentes
+    manifesto = Manifesto.carregar(os.path.join(PASTA_INDICE_LOCAL, "manifesto.json"))
+
+    duplicatas = None if args.sem_duplicatas else IndiceDuplicatas.carregar(ARQUIVO_DUPLICATAS_LOCAL)
+
+    if args.recriar or indice_local.vazio:
+        manifesto.limpar()
+        indice_local.limpar()
+        if duplicatas is not None:
+            duplicatas.limpar()
+    elif duplicatas is not None and not duplicatas.assinaturas and manifesto.entradas:
+        print("🔏 Calculando as assinaturas dos documentos já indexados...")
+        versao = IndiceLocal().atual().versao
+        documentos = ((doc_id, versao.arquivos[posicao], versao.conteudo(posicao))
+                      for posicao, doc_id in enumerate(versao.ids))
+        print(f"   {preencher_assinaturas(duplicatas, documentos)} documentos assinados, "
+              f"{duplicatas.total_duplicatas} quase duplicatas encontradas\n")
+
+    alterados, removidos = manifesto.comparar(listar_pdfs())
+    print(f"🔎 {len(alterados)} PDFs novos ou alterados, {len(removidos)} removidos.\n")
+
+    # As remoções entram na mesma gravação que os documentos alterados
+    for entrada in removidos:
+        indice_local.remover(entrada["doc_id"])
+        if duplicatas is not None:
+            duplicatas.remover(entrada["doc_id"])
+
+    detector = None
+    if duplicatas is not None:
+        # Os canônicos são lidos da versão anterior do índice (a que está gravada)
+        leitor = IndiceLocal() if not indice_local.vazio else None
+        detector = DetectorDuplicatas(duplicatas, criar_leitor_canonicos(leitor, None) if leitor else None)
+
+    pdfs_processados = 0
+    cache = None
+    try:
+        if alterados:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(MODELO_EMBEDDINGS)
+            if args.capacidade_cache > 0:
+                cache = CacheEmbeddings(capacidade=args.capacidade_cache)
+
+            pdfs_processados = indexar_pdfs(
+                None, model, alterados, manifesto, args.workers, args.paginas_por_tarefa,
+                cache=cache, tamanho_lote_embeddings=args.tamanho_lote_embeddings,
+                backend_extracao=args.backend_extracao,
+                cache_textos=None if args.sem_cache_textos else CacheTextos(),
+                indice_local=indice_local, duplicatas=detector,
+            )
+        elif removidos or indice_local.vazio:
+            indice_local.salvar()
+
+        # Só sai do manifesto o que já saiu do índice gravado
+        for entrada in removidos:
+            manifesto.remover(entrada["arquivo"])
+            print(f"🗑️ {entrada['arquivo']} removido do índice.")
+    finally:
+        manifesto.salvar()
+        if duplicatas is not None:
+            duplicatas.salvar()
+        if cache is not None:
+            cache.salvar()
+
+    print(f"🏁 Processamento concluído! {pdfs_processados} PDFs gravados no índice local.")
 
-        pdfs_processados += 1
-        print(f"✅ {arquivo} indexado como documento completo.\n")
 
-print(f"🏁 Processamento concluído! {pdfs_processados} PDFs indexados como documentos completos.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
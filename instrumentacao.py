@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import threading
+import multiprocessing
+import multiprocessing.util
+from typing import Dict, Tuple
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DA INSTRUMENTAÇÃO
+# =====================================================
+# Desligada por padrão. Com IFAL_INSTRUMENTACAO=1, cada etapa registra
+# spans (duração) e contadores em dois formatos:
+#   - eventos.jsonl: um evento por linha, para análise detalhada
+#   - metricas*.prom: totais no formato texto do Prometheus (um arquivo por
+#     processo, como espera o textfile collector do node_exporter)
+# Com IFAL_INSTRUMENTACAO_PORTA, o processo principal também serve as
+# métricas em http://localhost:<porta>/metrics. Só a própria máquina
+# alcança o endpoint, a menos que IFAL_INSTRUMENTACAO_ENDERECO diga outro.
+
+ATIVA = os.environ.get("IFAL_INSTRUMENTACAO", "").lower() in ("1", "true", "sim")
+DIRETORIO_METRICAS = os.environ.get("IFAL_INSTRUMENTACAO_DIR", "cache/metricas")
+PORTA_METRICAS = int(os.environ.get("IFAL_INSTRUMENTACAO_PORTA", "0") or 0)
+ENDERECO_METRICAS = os.environ.get("IFAL_INSTRUMENTACAO_ENDERECO", "127.0.0.1")
+
+# Intervalo mínimo entre gravações do arquivo .prom, em segundos
+INTERVALO_EXPORTACAO = 5.0
+
+PREFIXO_METRICAS = "ifal"
+
+
+class _SpanNulo:
+    """Span usado quando a instrumentação está desligada: não faz nada"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def anotar(self, **_):
+        pass
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+class _Span:
+    def __init__(self, nome: str, rotulos: Dict):
+        self.nome = nome
+        self.rotulos = rotulos
+        self.campos = {}
+
+    def __enter__(self):
+        self._inicio = time.time()
+        self._relogio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_erro, *_):
+        duracao = time.perf_counter() - self._relogio
+        if tipo_erro is not None:
+            self.campos["erro"] = tipo_erro.__name__
+        _registro.registrar_span(self, duracao)
+        return False
+
+    def anotar(self, **campos):
+        """Acrescenta campos ao evento do span (ex.: tokens, bytes)"""
+        self.campos.update(campos)
+
+
+class _Registro:
+    """Totais do processo e saída dos eventos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Separado: texto_prometheus usa o outro lock
+        self._lock_exportacao = threading.Lock()
+        self._pid = None
+        self._eventos = None
+        self._exportado_em = 0.0
+        # (nome, rótulos ordenados) -> [quantidade, soma]
+        self._spans: Dict[Tuple, list] = {}
+        self._contadores: Dict[Tuple, float] = {}
+
+    def _preparar_processo(self):
+        """Abre os arquivos deste processo (também depois de um fork)"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._spans, self._contadores = {}, {}
+        os.makedirs(DIRETORIO_METRICAS, exist_ok=True)
+        self._eventos = open(os.path.join(DIRETORIO_METRICAS, "eventos.jsonl"), "a", encoding="utf-8", buffering=1)
+        # Roda na saída do processo principal e também dos processos dos pools,
+        # que terminam sem passar pelo atexit
+        multiprocessing.util.Finalize(None, self.exportar, exitpriority=10)
+
+    def _gravar_evento(self, evento: Dict):
+        evento["pid"] = self._pid
+        self._eventos.write(json.dumps(evento, ensure_ascii=False, default=str) + "\n")
+
+    def registrar_span(self, span: _Span, duracao: float):
+        chave = (span.nome, tuple(sorted(span.rotulos.items())))
+        with self._lock:
+            self._preparar_processo()
+            total = self._spans.setdefault(chave, [0, 0.0])
+            total[0] += 1
+            total[1] += duracao
+            self._gravar_evento({
+                "tipo": "span", "nome": span.nome, "inicio": span._inicio,
+                "duracao_s": duracao, **span.rotulos, **span.campos,
+            })
+        self._talvez_exportar()
+
+    def contar(self, nome: str, valor: float, rotulos: Dict):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._preparar_processo()
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+        self._talvez_exportar()
+
+    def _talvez_exportar(self):
+        if time.monotonic() - self._exportado_em >= INTERVALO_EXPORTACAO:
+            self.exportar()
+
+    def texto_prometheus(self) -> str:
+        linhas = []
+        with self._lock:
+            spans = sorted(self._spans.items())
+            contadores = sorted(self._contadores.items())
+
+        declarados = set()
+        for (nome, rotulos), (quantidade, soma) in spans:
+            metrica = f"{PREFIXO_METRICAS}_{nome}_segundos"
+            if metrica not in declarados:
+                linhas.append(f"# TYPE {metrica} summary")
+                declarados.add(metrica)
+            linhas.append(f"{metrica}_count{_formatar_rotulos(rotulos)} {quantidade}")
+            linhas.append(f"{metrica}_sum{_formatar_rotulos(rotulos)} {soma:.6f}")
+
+        for (nome, rotulos), valor in contadores:
+            metrica = f"{PREFIXO_METRICAS}_{nome}_total"
+            if metrica not in declarados:
+                linhas.append(f"# TYPE {metrica} counter")
+                declarados.add(metrica)
+            linhas.append(f"{metrica}{_formatar_rotulos(rotulos)} {valor:g}")
+
+        return "\n".join(linhas) + "\n"
+
+    def exportar(self):
+        """Grava o arquivo .prom deste processo (de forma atômica)"""
+        if self._pid != os.getpid():
+            return
+        self._exportado_em = time.monotonic()
+
+        nome = "metricas.prom" if multiprocessing.parent_process() is None else f"metricas_{self._pid}.prom"
+        caminho = os.path.join(DIRETORIO_METRICAS, nome)
+        temporario = f"{caminho}.{self._pid}.tmp"
+        # Threads do mesmo processo exportam uma de cada vez (mesmo temporário)
+        with self._lock_exportacao:
+            with open(temporario, "w", encoding="utf-8") as f:
+                f.write(self.texto_prometheus())
+            os.replace(temporario, caminho)
+
+
+def _formatar_rotulos(rotulos: Tuple) -> str:
+    if not rotulos:
+        return ""
+    pares = ",".join(f'{chave}="{str(valor).replace(chr(34), chr(39))}"' for chave, valor in rotulos)
+    return "{" + pares + "}"
+
+
+_registro = _Registro()
+
+# =====================================================
+# 📏 API
+# =====================================================
+
+def medir(nome: str, **rotulos):
+    """Context manager que mede a duração de um trecho.
+
+    Os rótulos viram labels do Prometheus (use poucos valores distintos);
+    detalhes de cada ocorrência vão para o evento com ``span.anotar()``.
+    """
+    if not ATIVA:
+        return _SPAN_NULO
+    return _Span(nome, rotulos)
+
+
+def contar(nome: str, valor: float = 1, **rotulos):
+    """Soma ``valor`` a um contador"""
+    if not ATIVA:
+        return
+    _registro.contar(nome, valor, rotulos)
+
+
+def texto_prometheus() -> str:
+    return _registro.texto_prometheus()
+
+# =====================================================
+# 🔌 ELASTICSEARCH
+# =====================================================
+
+def _endpoint(caminho: str) -> str:
+    """Nome curto da API chamada (``_bulk``, ``_search``...), para usar como rótulo"""
+    for parte in caminho.split("?", 1)[0].split("/"):
+        if parte.startswith("_"):
+            return parte
+    return "indice"
+
+
+def _anotar_requisicao(span, endpoint: str, body, resposta):
+    span.anotar(status=resposta.meta.status, bytes_enviados=len(body or b""),
+                bytes_recebidos=len(resposta.body or b""))
+    contar("es_bytes_enviados", len(body or b""), endpoint=endpoint)
+    contar("es_bytes_recebidos", len(resposta.body or b""), endpoint=endpoint)
+
+
+def opcoes_elasticsearch(assincrono: bool = False) -> Dict:
+    """Argumentos extras para ``Elasticsearch(...)`` que medem cada requisição.
+
+    Com ``assincrono=True``, para ``AsyncElasticsearch(...)``. Com a
+    instrumentação desligada retorna um dicionário vazio e o cliente usa a
+    classe de conexão padrão.
+    """
+    if not ATIVA:
+        return {}
+
+    if assincrono:
+        from elastic_transport import AiohttpHttpNode
+
+        class NoInstrumentadoAsync(AiohttpHttpNode):
+            async def perform_request(self, method, target, body=None, headers=None, **kwargs):
+                endpoint = _endpoint(target)
+                with medir("es_requisicao", metodo=method, endpoint=endpoint) as span:
+                    resposta = await super().perform_request(method, target, body=body, headers=headers, **kwargs)
+                    _anotar_requisicao(span, endpoint, body, resposta)
+                return resposta
+
+        return {"node_class": NoInstrumentadoAsync}
+
+    from elastic_transport import Urllib3HttpNode
+
+    class NoInstrumentado(Urllib3HttpNode):
+        def perform_request(self, method, target, body=None, headers=None, **kwargs):
+            endpoint = _endpoint(target)
+            with medir("es_requisicao", metodo=method, endpoint=endpoint) as span:
+                resposta = super().perform_request(method, target, body=body, headers=headers, **kwargs)
+                _anotar_requisicao(span, endpoint, body, resposta)
+            return resposta
+
+    return {"node_class": NoInstrumentado}
+
+# =====================================================
+# 🌐 ENDPOINT HTTP
+# =====================================================
+
+_servidor = None
+
+
+def iniciar_servidor(porta: int = PORTA_METRICAS, endereco: str = ENDERECO_METRICAS):
+    """Serve /metrics no formato texto do Prometheus, em uma thread de fundo.
+
+    Chamado pelos scripts e pelo app ao iniciar; não faz nada com a
+    instrumentação desligada, sem porta ou se o servidor já está no ar.
+    """
+    global _servidor
+    if not ATIVA or not porta or _servidor is not None or multiprocessing.parent_process() is not None:
+        return
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Metricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            corpo = texto_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *_):
+            pass
+
+    try:
+        _servidor = ThreadingHTTPServer((endereco, porta), Metricas)
+    except OSError as e:
+        print(f"⚠️ Não foi possível servir as métricas na porta {porta}: {e}")
+        return
+    threading.Thread(target=_servidor.serve_forever, daemon=True).start()
+    print(f"📈 Métricas em http://{endereco}:{porta}/metrics")
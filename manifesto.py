@@ -0,0 +1,112 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Tuple
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DO MANIFESTO
+# =====================================================
+
+# Arquivo onde fica registrado o que já foi indexado
+ARQUIVO_MANIFESTO = "cache/manifesto_indexacao.json"
+
+
+def hash_arquivo(caminho: str, tamanho_bloco: int = 1024 * 1024) -> str:
+    """Calcula o SHA-256 do conteúdo de um arquivo"""
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def gerar_id_documento(arquivo: str) -> str:
+    """ID determinístico do documento no Elasticsearch, derivado do nome do arquivo"""
+    return hashlib.sha1(arquivo.encode("utf-8")).hexdigest()
+
+
+class Manifesto:
+    """Registro dos PDFs indexados: caminho, tamanho, mtime, hash e ID do documento.
+
+    Permite reindexar só o que mudou: arquivos com tamanho e mtime iguais
+    ao registrado nem chegam a ser lidos; os demais têm o hash comparado.
+    """
+
+    def __init__(self, caminho: str = ARQUIVO_MANIFESTO):
+        self.caminho = caminho
+        self.entradas: Dict[str, Dict] = {}
+
+    @classmethod
+    def carregar(cls, caminho: str = ARQUIVO_MANIFESTO) -> "Manifesto":
+        manifesto = cls(caminho)
+        if os.path.exists(caminho):
+            with open(caminho, "r", encoding="utf-8") as f:
+                manifesto.entradas = json.load(f)
+        return manifesto
+
+    def salvar(self):
+        """Grava o manifesto de forma atômica"""
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self.entradas, f, ensure_ascii=False, indent=2)
+        os.replace(temporario, self.caminho)
+
+    def limpar(self):
+        self.entradas = {}
+
+    def comparar(self, caminhos: List[str]) -> Tuple[List[Dict], List[Dict]]:
+        """Compara a pasta com o manifesto.
+
+        Retorna ``(alterados, removidos)``: os arquivos novos ou modificados,
+        já com tamanho, mtime e hash calculados, e as entradas cujos arquivos
+        não existem mais.
+        """
+        alterados = []
+        vistos = set()
+
+        for caminho in caminhos:
+            arquivo = os.path.basename(caminho)
+            vistos.add(arquivo)
+            stat = os.stat(caminho)
+            entrada = self.entradas.get(arquivo)
+
+            if entrada and entrada["tamanho"] == stat.st_size and entrada["mtime"] == stat.st_mtime:
+                continue
+
+            novo = {
+                "arquivo": arquivo,
+                "caminho": caminho,
+                "tamanho": stat.st_size,
+                "mtime": stat.st_mtime,
+                "hash": hash_arquivo(caminho),
+                "doc_id": gerar_id_documento(arquivo),
+            }
+
+            # Arquivo apenas "tocado": conteúdo igual, só atualiza o mtime
+            if entrada and entrada["hash"] == novo["hash"]:
+                self.registrar(novo)
+                continue
+
+            alterados.append(novo)
+
+        removidos = [
+            dict(entrada, arquivo=arquivo)
+            for arquivo, entrada in self.entradas.items()
+            if arquivo not in vistos
+        ]
+
+        return alterados, removidos
+
+    def registrar(self, entrada: Dict):
+        """Registra um arquivo como indexado"""
+        self.entradas[entrada["arquivo"]] = {
+            "caminho": entrada["caminho"],
+            "tamanho": entrada["tamanho"],
+            "mtime": entrada["mtime"],
+            "hash": entrada["hash"],
+            "doc_id": entrada["doc_id"],
+        }
+
+    def remover(self, arquivo: str):
+        self.entradas.pop(arquivo, None)
@@ -0,0 +1,205 @@
+import os
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Dict, Hashable, List, Tuple
+
+from cache_ementas import CacheEmentas, identidade_modelo
+from processador_ementas import SAIDA_ESTRUTURADA, ProcessadorEmentasAvancado, processar_documento_para_ementa
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DO POOL DE LLMs
+# =====================================================
+
+# Threads do llama.cpp por processo. A geração é limitada pela banda de
+# memória e rende pouco além de algumas threads; com mais núcleos vale mais
+# ter mais processos do que mais threads por processo
+THREADS_POR_WORKER = 6
+
+
+def escolher_divisao(nucleos: int = None, threads_por_worker: int = None) -> Tuple[int, int]:
+    """Escolhe quantos processos (workers) e quantas threads por processo usar"""
+    nucleos = nucleos or os.cpu_count() or 1
+    threads_por_worker = min(threads_por_worker or THREADS_POR_WORKER, nucleos)
+    return max(1, nucleos // threads_por_worker), threads_por_worker
+
+# =====================================================
+# 🔧 FUNÇÕES EXECUTADAS NOS PROCESSOS DO POOL
+# =====================================================
+
+_processador = None
+
+
+def _inicializar_worker(model_path: str, n_ctx: int, n_threads: int, saida_estruturada: bool):
+    """Carrega o modelo uma vez por processo. Com mmap, os pesos do GGUF
+    ficam no page cache e são compartilhados por todos os processos."""
+    global _processador
+    from llama_cpp import Llama
+
+    llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, use_mmap=True, verbose=False)
+    _processador = ProcessadorEmentasAvancado(llm, saida_estruturada=saida_estruturada)
+
+
+def _dividir_documento(texto: str) -> List[str]:
+    return _processador.dividir_documento_em_chunks(texto)
+
+
+def _processar_chunk(chunk: str, numero_chunk: int, total_chunks: int):
+    # Resposta bruta: o processo principal guarda no cache e extrai os campos
+    return _processador.obter_resposta_chunk(chunk, numero_chunk, total_chunks)
+
+# =====================================================
+# 🚀 GERADORES DE EMENTAS
+# =====================================================
+
+class GeradorEmentasLocal:
+    """Gera as ementas no próprio processo, uma de cada vez"""
+
+    def __init__(self, llm, cache: CacheEmentas = None, saida_estruturada: bool = SAIDA_ESTRUTURADA):
+        self.llm = llm
+        self.cache = cache
+        self.saida_estruturada = saida_estruturada
+        self.workers = 1
+        self._prontos = []
+
+    def em_andamento(self) -> int:
+        return 0
+
+    def submeter(self, chave: Hashable, texto: str):
+        try:
+            self._prontos.append((chave, processar_documento_para_ementa(texto, self.llm, self.cache, self.saida_estruturada), None))
+        except Exception as e:
+            self._prontos.append((chave, None, e))
+
+    def avancar(self, timeout: float = None) -> List[Tuple]:
+        prontos, self._prontos = self._prontos, []
+        return prontos
+
+    def fechar(self):
+        pass
+
+
+class PoolLLM:
+    """Pool de processos, cada um com seu próprio modelo llama.cpp.
+
+    Cada documento passa por três etapas: a divisão em chunks (num worker,
+    que tem o tokenizer), o processamento dos chunks (mapeados em paralelo
+    pelos workers) e a consolidação dos campos (no processo principal). Os
+    chunks de vários documentos disputam os mesmos workers, então o pool
+    fica ocupado mesmo quando um documento tem um único chunk.
+
+    O cache de ementas, se houver, é consultado no processo principal antes
+    de cada etapa; só o que falta vai para os workers.
+    """
+
+    def __init__(self, model_path: str, workers: int, threads_por_worker: int, n_ctx: int,
+                 cache: CacheEmentas = None, saida_estruturada: bool = SAIDA_ESTRUTURADA):
+        self.workers = workers
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_inicializar_worker,
+            initargs=(model_path, n_ctx, threads_por_worker, saida_estruturada),
+        )
+        # A consolidação e as chaves do cache não usam o modelo
+        self.cache = cache
+        self._consolidador = ProcessadorEmentasAvancado(
+            None, cache=cache, modelo=identidade_modelo(model_path), n_ctx=n_ctx,
+            saida_estruturada=saida_estruturada
+        )
+
+        # futuro -> (chave do documento, número do chunk ou None para a divisão)
+        self._tarefas: Dict[Future, Tuple] = {}
+        # chave -> {"restantes": n, "informacoes": [...], "chunks": [...], ...}
+        self._documentos: Dict[Hashable, Dict] = {}
+        # Documentos resolvidos pelo cache, entregues no próximo avancar()
+        self._prontos: List[Tuple] = []
+
+    def em_andamento(self) -> int:
+        """Documentos submetidos e ainda não concluídos"""
+        return len(self._documentos)
+
+    def submeter(self, chave: Hashable, texto: str):
+        chave_cache = None
+        if self.cache is not None:
+            chave_cache = self._consolidador.chave_documento(texto)
+            ementa = self.cache.obter(chave_cache, "ementa")
+            if ementa is not None:
+                self._prontos.append((chave, ementa, None))
+                return
+
+        self._documentos[chave] = {
+            "restantes": None, "informacoes": None, "chunks": None,
+            "chave_cache": chave_cache, "completo": True,
+        }
+        self._tarefas[self._pool.submit(_dividir_documento, texto)] = (chave, None)
+
+    def _registrar_resposta(self, documento: Dict, numero_chunk: int, texto_resposta):
+        if texto_resposta is None:
+            documento["completo"] = False
+            documento["informacoes"][numero_chunk] = {}
+        else:
+            documento["informacoes"][numero_chunk] = self._consolidador.interpretar_resposta(texto_resposta)
+        documento["restantes"] -= 1
+
+    def avancar(self, timeout: float = None) -> List[Tuple]:
+        """Espera alguma tarefa terminar e retorna os documentos concluídos
+        como tuplas ``(chave, ementa, erro)``"""
+        prontos, self._prontos = self._prontos, []
+        if not self._tarefas:
+            return prontos
+
+        concluidas, _ = wait(list(self._tarefas), timeout=0 if prontos else timeout,
+                             return_when=FIRST_COMPLETED)
+
+        for futuro in concluidas:
+            chave, numero_chunk = self._tarefas.pop(futuro)
+            documento = self._documentos.get(chave)
+            if documento is None:
+                # Documento já descartado por erro em outro chunk
+                continue
+
+            try:
+                valor = futuro.result()
+            except Exception as e:
+                del self._documentos[chave]
+                prontos.append((chave, None, e))
+                continue
+
+            if numero_chunk is None:
+                # Divisão concluída: distribui entre os workers os chunks que não estão no cache
+                documento["chunks"] = valor
+                documento["restantes"] = len(valor)
+                documento["informacoes"] = [None] * len(valor)
+                for i, chunk in enumerate(valor):
+                    texto_resposta = None
+                    if self.cache is not None:
+                        texto_resposta = self.cache.obter(
+                            self._consolidador.chave_chunk(chunk, i + 1, len(valor)), "chunk"
+                        )
+                    if texto_resposta is not None:
+                        self._registrar_resposta(documento, i, texto_resposta)
+                    else:
+                        tarefa = self._pool.submit(_processar_chunk, chunk, i + 1, len(valor))
+                        self._tarefas[tarefa] = (chave, i)
+            else:
+                if self.cache is not None and valor is not None:
+                    chunks = documento["chunks"]
+                    self.cache.guardar(
+                        self._consolidador.chave_chunk(chunks[numero_chunk], numero_chunk + 1, len(chunks)),
+                        "chunk", valor
+                    )
+                self._registrar_resposta(documento, numero_chunk, valor)
+
+            if documento["restantes"] == 0:
+                del self._documentos[chave]
+                consolidado = self._consolidador.consolidar_informacoes_chunks(documento["informacoes"])
+                ementa = self._consolidador.gerar_ementa_final(consolidado)
+                # Ementas com chunks que falharam não são guardadas
+                if documento["chave_cache"] is not None and documento["completo"]:
+                    self.cache.guardar(documento["chave_cache"], "ementa", ementa)
+                prontos.append((chave, ementa, None))
+
+        return prontos
+
+    def fechar(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
@@ -1,13 +1,165 @@
 import re
 import os
-from typing import List, Dict
+from typing import Callable, List, Dict
 import json
+import weakref
+
+from cache_ementas import CacheEmentas, chave_cache, identidade_modelo
+from instrumentacao import contar, medir
+
+class CachePrefixoPrompt:
+    """Avalia uma vez o prefixo comum dos prompts e reaproveita o estado do modelo.
+
+    O prompt é montado como lista de tokens (prefixo já tokenizado + sufixo),
+    garantindo que o início coincide exatamente com o que está no KV cache.
+    O llama.cpp reaproveita o maior prefixo em comum com a avaliação anterior;
+    quando o contexto foi ocupado por outro prompt, o estado salvo logo após o
+    prefixo é restaurado em vez de reavaliar centenas de tokens.
+    """
+    
+    def __init__(self, llm, prefixo: str):
+        self.llm = llm
+        self.tokens = llm.tokenize(prefixo.encode("utf-8"), add_bos=True, special=True)
+        self._estado = None
+    
+    def montar_prompt(self, antes: str, documento: str = "", depois: str = "") -> List[int]:
+        """Prefixo + texto fixo + documento + texto fixo, em tokens.
+        
+        Só o texto fixo do prompt pode conter tokens de controle. O documento,
+        extraído do PDF, é tokenizado como texto comum: um ``<end_of_turn>``
+        escrito no PDF não encerra o turno.
+        """
+        tokens = list(self.tokens)
+        for texto, especial in ((antes, True), (documento, False), (depois, True)):
+            if texto:
+                tokens += self.llm.tokenize(texto.encode("utf-8"), add_bos=False, special=especial)
+        return tokens
+    
+    def _prefixo_no_contexto(self) -> bool:
+        n = len(self.tokens)
+        return self.llm.n_tokens >= n and list(self.llm.input_ids[:n]) == self.tokens
+    
+    def preparar(self):
+        """Garante que o contexto do modelo começa pelo prefixo"""
+        if self._prefixo_no_contexto():
+            return
+        
+        if self._estado is not None:
+            self.llm.load_state(self._estado)
+        else:
+            with medir("llm_prefixo") as span:
+                self.llm.reset()
+                self.llm.eval(self.tokens)
+                self._estado = self.llm.save_state()
+                span.anotar(tokens=len(self.tokens))
+
+
+# Um cache por modelo carregado e por prefixo
+_caches_prefixo = weakref.WeakKeyDictionary()
+
+# =====================================================
+# 🧩 SAÍDA ESTRUTURADA (GRAMÁTICA GBNF)
+# =====================================================
+
+# Gera a ementa como JSON restrito por gramática em vez de texto livre.
+# Desligada por padrão: depende de um llama-cpp com suporte a GBNF.
+# Ligue com IFAL_SAIDA_ESTRUTURADA=1 ou com --saida-estruturada
+SAIDA_ESTRUTURADA = os.environ.get("IFAL_SAIDA_ESTRUTURADA", "").lower() in ("1", "true", "sim")
+
+# Campos da ementa e tamanho máximo de cada um, em caracteres
+LIMITES_CAMPOS = {
+    "tipo": 150,
+    "objetivo": 400,
+    "publico_alvo": 300,
+    "disposicoes": 600,
+    "prazos": 300,
+    "valor_beneficio": 150,
+    "observacoes": 400,
+}
+
+# Estimativa conservadora de caracteres por token em português. O tokenizer
+# costuma render de 3 a 4; sob a gramática o modelo às vezes escolhe tokens
+# menores, e a resposta não pode ser cortada antes de o objeto fechar
+CARACTERES_POR_TOKEN = 2.5
+
+# Espaços que a regra ``ws`` admite em cada posição
+MAX_ESPACOS_JSON = 8
+
+def max_tokens_json(limites: Dict[str, int] = LIMITES_CAMPOS) -> int:
+    """Tokens suficientes para o maior objeto que a gramática admite.
+    
+    Soma os limites dos campos, as chaves, aspas, vírgulas e os espaços
+    opcionais, e converte pela estimativa de caracteres por token.
+    """
+    valores = sum(limites.values())
+    # "{" "}" + por campo: "chave": "" e a vírgula
+    estrutura = 2 + sum(len(campo) + 6 for campo in limites)
+    # ws depois de "{", antes de "}", depois de cada ":" e de cada ","
+    espacos = MAX_ESPACOS_JSON * (2 + 2 * len(limites))
+    return int((valores + estrutura + espacos) / CARACTERES_POR_TOKEN) + 1
+
+def montar_gramatica_ementa(limites: Dict[str, int] = LIMITES_CAMPOS) -> str:
+    """Gramática GBNF de um objeto JSON com os campos da ementa, nesta ordem.
+    
+    Cada valor é uma string de tamanho limitado. Quando o objeto fecha, a
+    gramática só admite o fim da geração, então o modelo para ali.
+    """
+    pares = ' "," ws '.join(f'"\\"{campo}\\":" ws {campo.replace("_", "-")}' for campo in limites)
+    regras = [f'root ::= "{{" ws {pares} ws "}}"']
+    for campo, limite in limites.items():
+        regras.append(f'{campo.replace("_", "-")} ::= "\\"" caractere{{0,{limite}}} "\\""')
+    regras.append('caractere ::= [^"\\\\\\x00-\\x1F] | "\\\\" ["\\\\/nt]')
+    regras.append('ws ::= [ \\t\\n]{0,8}')
+    return "\n".join(regras)
+
+# Gramáticas já compiladas, por texto
+_gramaticas = {}
+
+def obter_gramatica(gbnf: str):
+    if gbnf not in _gramaticas:
+        from llama_cpp import LlamaGrammar
+        _gramaticas[gbnf] = LlamaGrammar.from_string(gbnf, verbose=False)
+    return _gramaticas[gbnf]
+
+def obter_cache_prefixo(llm, prefixo: str) -> CachePrefixoPrompt:
+    """Retorna o cache do prefixo para este modelo, criando-o na primeira vez"""
+    caches = _caches_prefixo.setdefault(llm, {})
+    if prefixo not in caches:
+        caches[prefixo] = CachePrefixoPrompt(llm, prefixo)
+    return caches[prefixo]
+
 
 class ProcessadorEmentasAvancado:
-    def __init__(self, llm):
+    def __init__(self, llm, sobreposicao_tokens: int = 0, cache: CacheEmentas = None,
+                 modelo: str = None, n_ctx: int = None, saida_estruturada: bool = SAIDA_ESTRUTURADA,
+                 ao_gerar: Callable[[str], None] = None):
         self.llm = llm
-        self.max_tokens_por_chunk = 3000
+        # Tokens reservados para a resposta e folga para diferenças de
+        # tokenização na junção das frases. Em JSON, a resposta precisa
+        # caber inteira: o objeto cortado perde os campos que ficaram abertos
+        self.max_tokens_resposta = max(800, max_tokens_json()) if saida_estruturada else 800
+        self.margem_tokens = 32
+        self.temperatura = 0.1
+        self.parar_em = ["###", "---"]
+        # Tokens do fim de um chunk repetidos no início do seguinte (opcional)
+        self.sobreposicao_tokens = sobreposicao_tokens
         self.exemplos_ementas = self._carregar_exemplos_few_shot()
+        
+        # JSON restrito por gramática, com um limite de tamanho por campo
+        self.saida_estruturada = saida_estruturada
+        self.gramatica = montar_gramatica_ementa() if saida_estruturada else None
+        
+        # Recebe o texto à medida que o modelo gera (exibição em tempo real)
+        self.ao_gerar = ao_gerar
+        
+        # Cache opcional das respostas. Sem o modelo carregado (consolidação
+        # no processo principal), o arquivo do modelo e o n_ctx são informados
+        self.cache = cache
+        self.modelo = modelo
+        self.n_ctx = n_ctx
+        if llm is not None:
+            self.modelo = self.modelo or identidade_modelo(llm.model_path)
+            self.n_ctx = self.n_ctx or llm.n_ctx()
     
     def _carregar_exemplos_few_shot(self):
         """Exemplos para Few-Shot Learning - baseados em documentos reais do IFAL"""
@@ -26,50 +178,128 @@ class ProcessadorEmentasAvancado:
             }
         ]
     
+    def _contar_tokens(self, texto: str) -> int:
+        """Número de tokens do texto segundo o tokenizer do próprio modelo"""
+        return len(self.llm.tokenize(texto.encode("utf-8"), add_bos=False, special=False))
+    
+    def orcamento_tokens_chunk(self) -> int:
+        """Tokens de documento que cabem em uma chamada.
+        
+        É o contexto do modelo (n_ctx) menos o prefixo do prompt, o texto fixo
+        em volta do chunk, a resposta e uma margem.
+        """
+        prefixo = obter_cache_prefixo(self.llm, self._montar_prefixo_prompt())
+        moldura = self._contar_tokens(self._montar_sufixo_prompt("", 999, 999))
+        orcamento = (
+            self.llm.n_ctx() - len(prefixo.tokens) - moldura
+            - self.max_tokens_resposta - self.margem_tokens
+        )
+        if orcamento <= 0:
+            raise ValueError(f"n_ctx={self.llm.n_ctx()} não comporta o prompt e a resposta")
+        return orcamento
+    
+    def _dividir_em_unidades(self, texto: str, limite: int) -> List[tuple]:
+        """Quebra o texto em (trecho, tokens, separador) que caibam no limite.
+        
+        Usa parágrafos quando possível, depois frases e, em último caso,
+        grupos de palavras.
+        """
+        unidades = []
+        for paragrafo in re.split(r"\n\s*\n|\n", texto):
+            paragrafo = paragrafo.strip()
+            if not paragrafo:
+                continue
+            
+            n = self._contar_tokens(paragrafo)
+            if n <= limite:
+                unidades.append((paragrafo, n, "\n"))
+                continue
+            
+            for frase in re.split(r"(?<=[.!?;])\s+", paragrafo):
+                n = self._contar_tokens(frase)
+                if n <= limite:
+                    unidades.append((frase, n, " "))
+                    continue
+                
+                # Frase maior que o limite: corta em grupos de palavras
+                palavras = frase.split()
+                por_grupo = max(1, int(len(palavras) * limite / n * 0.9))
+                inicio = 0
+                while inicio < len(palavras):
+                    grupo = " ".join(palavras[inicio:inicio + por_grupo])
+                    n_grupo = self._contar_tokens(grupo)
+                    if n_grupo > limite and por_grupo > 1:
+                        por_grupo = max(1, por_grupo // 2)
+                        continue
+                    unidades.append((grupo, n_grupo, " "))
+                    inicio += por_grupo
+        
+        return unidades
+    
     def dividir_documento_em_chunks(self, texto_completo: str) -> List[str]:
-        """Divide o documento em chunks baseados em tokens"""
-        chars_por_chunk = self.max_tokens_por_chunk * 4
+        """Divide o documento em chunks que ocupam ao máximo o contexto do modelo"""
+        limite = self.orcamento_tokens_chunk()
         
-        if len(texto_completo) <= chars_por_chunk:
+        if self._contar_tokens(texto_completo) <= limite:
             return [texto_completo]
         
         chunks = []
-        linhas = texto_completo.split('\n')
         chunk_atual = []
-        chars_chunk_atual = 0
+        tokens_chunk_atual = 0
         
-        for linha in linhas:
-            chars_linha = len(linha)
+        for unidade in self._dividir_em_unidades(texto_completo, limite):
+            _, tokens, _ = unidade
             
-            if chars_chunk_atual + chars_linha > chars_por_chunk and chunk_atual:
-                chunks.append('\n'.join(chunk_atual))
-                chunk_atual = [linha]
-                chars_chunk_atual = chars_linha
-            else:
-                chunk_atual.append(linha)
-                chars_chunk_atual += chars_linha
+            if tokens_chunk_atual + tokens > limite and chunk_atual:
+                chunks.append(self._juntar_unidades(chunk_atual))
+                
+                # Repete o fim do chunk anterior, dentro da sobreposição pedida
+                sobreposicao = []
+                tokens_sobreposicao = 0
+                for anterior in reversed(chunk_atual):
+                    if tokens_sobreposicao + anterior[1] > self.sobreposicao_tokens:
+                        break
+                    sobreposicao.insert(0, anterior)
+                    tokens_sobreposicao += anterior[1]
+                if tokens_sobreposicao + tokens > limite:
+                    sobreposicao, tokens_sobreposicao = [], 0
+                
+                chunk_atual = sobreposicao
+                tokens_chunk_atual = tokens_sobreposicao
+            
+            chunk_atual.append(unidade)
+            tokens_chunk_atual += tokens
         
         if chunk_atual:
-            chunks.append('\n'.join(chunk_atual))
+            chunks.append(self._juntar_unidades(chunk_atual))
         
         return chunks
     
-    def processar_chunk(self, chunk: str, numero_chunk: int, total_chunks: int) -> Dict:
-        """Processa cada chunk extraindo informações relevantes"""
-        
-        # ✅ CORREÇÃO: Usar f-strings corretamente
+    @staticmethod
+    def _juntar_unidades(unidades: List[tuple]) -> str:
+        texto = unidades[0][0]
+        for trecho, _, separador in unidades[1:]:
+            texto += separador + trecho
+        return texto
+    
+    def _montar_prefixo_prompt(self) -> str:
+        """Parte do prompt igual para todos os chunks: instruções e exemplos"""
         exemplos_str = ""
         for i, exemplo in enumerate(self.exemplos_ementas):
-            exemplos_str += f"EXEMPLO {i+1}:\n{exemplo['documento']}\n\nEMENTA:\n{exemplo['ementa']}\n\n---\n"
+            ementa = exemplo['ementa']
+            if self.saida_estruturada:
+                ementa = json.dumps(self._extrair_campos_ementa(ementa), ensure_ascii=False)
+            exemplos_str += f"EXEMPLO {i+1}:\n{exemplo['documento']}\n\nEMENTA:\n{ementa}\n\n---\n"
         
-        prompt = f"""
-Analise este documento oficial e extraia informações para criar uma ementa:
-
-EXEMPLOS DE REFERÊNCIA:
-{exemplos_str}
-
-TEXTO PARA ANÁLISE (parte {numero_chunk}/{total_chunks}):
-{chunk[:2000]}
+        formato = "Formate a resposta exatamente como os exemplos."
+        if self.saida_estruturada:
+            formato = (
+                "Responda apenas com um objeto JSON com as chaves dos exemplos. "
+                "Deixe vazio (\"\") o campo que não estiver no documento."
+            )
+        
+        return f"""
+Analise este documento oficial e extraia informações para criar uma ementa.
 
 Extraia estas informações se presentes:
 - Tipo de documento
@@ -80,24 +310,144 @@ Extraia estas informações se presentes:
 - Valor do benefício (se aplicável)
 - Observações importantes
 
-Formate a resposta exatamente como os exemplos.
+{formato}
+
+EXEMPLOS DE REFERÊNCIA:
+{exemplos_str}
 """
+    
+    def _partes_sufixo_prompt(self, chunk: str, numero_chunk: int, total_chunks: int) -> tuple:
+        """Texto fixo antes do chunk, o chunk e o texto fixo depois dele"""
+        return f"TEXTO PARA ANÁLISE (parte {numero_chunk}/{total_chunks}):\n", chunk, "\n\nEMENTA:\n"
+    
+    def _montar_sufixo_prompt(self, chunk: str, numero_chunk: int, total_chunks: int) -> str:
+        """Parte do prompt própria de cada chunk"""
+        return "".join(self._partes_sufixo_prompt(chunk, numero_chunk, total_chunks))
+    
+    def _parametros_geracao(self) -> Dict:
+        return {
+            "max_tokens": self.max_tokens_resposta,
+            "temperature": self.temperatura,
+            # Em JSON, "---" pode aparecer dentro de um campo; a gramática já encerra a geração
+            "stop": [] if self.saida_estruturada else self.parar_em,
+        }
+    
+    def chave_chunk(self, chunk: str, numero_chunk: int, total_chunks: int) -> str:
+        """Chave do cache para a resposta do modelo a um chunk"""
+        return chave_cache(
+            "chunk", self.modelo, self._parametros_geracao(), self.gramatica,
+            self._montar_prefixo_prompt(), self._montar_sufixo_prompt(chunk, numero_chunk, total_chunks)
+        )
+    
+    def chave_documento(self, texto_completo: str) -> str:
+        """Chave do cache para a ementa final de um documento.
+        
+        Inclui o que decide a divisão em chunks (n_ctx e sobreposição), além
+        do prompt, do modelo e dos parâmetros de geração.
+        """
+        return chave_cache(
+            "ementa", self.modelo, self._parametros_geracao(), self.gramatica, self.n_ctx,
+            self.sobreposicao_tokens, self.margem_tokens,
+            self._montar_prefixo_prompt(), self._montar_sufixo_prompt("", 0, 0), texto_completo
+        )
+    
+    def gerar_resposta_chunk(self, chunk: str, numero_chunk: int, total_chunks: int) -> str:
+        """Texto gerado pelo modelo para o chunk"""
+        # O prefixo (instruções + exemplos) já está avaliado no modelo;
+        # só os tokens do chunk são processados
+        cache = obter_cache_prefixo(self.llm, self._montar_prefixo_prompt())
+        cache.preparar()
+        prompt = cache.montar_prompt(*self._partes_sufixo_prompt(chunk, numero_chunk, total_chunks))
+        
+        parametros = self._parametros_geracao()
+        if self.gramatica:
+            parametros["grammar"] = obter_gramatica(self.gramatica)
+        
+        # O prompt já é uma lista de tokens (prefixo + chunk)
+        with medir("llm_chunk", estruturada=self.saida_estruturada) as span:
+            if self.ao_gerar is None:
+                resposta = self.llm(prompt, echo=False, **parametros)
+                texto_resposta = resposta["choices"][0]["text"].strip()
+                tokens_gerados = resposta.get("usage", {}).get("completion_tokens", 0)
+            else:
+                # No modo stream não há "usage": cada pedaço é um token
+                partes = []
+                for pedaco in self.llm(prompt, echo=False, stream=True, **parametros):
+                    texto = pedaco["choices"][0]["text"]
+                    partes.append(texto)
+                    self.ao_gerar(texto)
+                texto_resposta = "".join(partes).strip()
+                tokens_gerados = len(partes)
+            span.anotar(tokens_prompt=len(prompt), tokens_gerados=tokens_gerados)
+        
+        contar("llm_tokens_prompt", len(prompt))
+        contar("llm_tokens_gerados", tokens_gerados)
+        return texto_resposta
+    
+    def obter_resposta_chunk(self, chunk: str, numero_chunk: int, total_chunks: int):
+        """Resposta do modelo para o chunk, do cache quando possível; None em caso de erro"""
+        if self.ao_gerar is not None and numero_chunk > 1:
+            self.ao_gerar("\n\n")
+        
+        chave = None
+        if self.cache is not None:
+            chave = self.chave_chunk(chunk, numero_chunk, total_chunks)
+            texto_resposta = self.cache.obter(chave, "chunk")
+            if texto_resposta is not None:
+                if self.ao_gerar is not None:
+                    self.ao_gerar(texto_resposta)
+                return texto_resposta
         
         try:
-            resposta = self.llm(
-                prompt,
-                max_tokens=800,
-                temperature=0.1,
-                stop=["###", "---"],
-                echo=False
-            )
-            
-            texto_resposta = resposta["choices"][0]["text"].strip()
-            return self._extrair_campos_ementa(texto_resposta)
-            
+            texto_resposta = self.gerar_resposta_chunk(chunk, numero_chunk, total_chunks)
         except Exception as e:
             print(f"Erro no chunk {numero_chunk}: {e}")
+            return None
+        
+        if chave is not None:
+            self.cache.guardar(chave, "chunk", texto_resposta)
+        return texto_resposta
+    
+    def processar_chunk(self, chunk: str, numero_chunk: int, total_chunks: int) -> Dict:
+        """Processa cada chunk extraindo informações relevantes"""
+        texto_resposta = self.obter_resposta_chunk(chunk, numero_chunk, total_chunks)
+        if texto_resposta is None:
             return {}
+        return self.interpretar_resposta(texto_resposta)
+    
+    def interpretar_resposta(self, texto_resposta: str) -> Dict:
+        """Campos da ementa a partir da resposta do modelo, no formato do modo atual"""
+        if self.saida_estruturada:
+            return self._ler_campos_json(texto_resposta)
+        return self._extrair_campos_ementa(texto_resposta)
+    
+    def _ler_campos_json(self, texto_resposta: str) -> Dict:
+        """Lê os campos do JSON gerado sob a gramática"""
+        campos = {campo: "" for campo in LIMITES_CAMPOS}
+        try:
+            dados = json.loads(texto_resposta)
+        except json.JSONDecodeError:
+            # Geração cortada por max_tokens: aproveita os campos que fecharam
+            dados = self._campos_fechados(texto_resposta)
+        if not isinstance(dados, dict):
+            return campos
+        
+        for campo, limite in LIMITES_CAMPOS.items():
+            valor = dados.get(campo)
+            if isinstance(valor, str):
+                campos[campo] = valor.strip()[:limite]
+        return campos
+    
+    @staticmethod
+    def _campos_fechados(texto_resposta: str) -> Dict:
+        """Pares "campo": "valor" completos de um objeto JSON incompleto"""
+        dados = {}
+        for campo, valor in re.findall(r'"(\w+)"\s*:\s*"((?:[^"\\]|\\.)*)"', texto_resposta):
+            try:
+                dados[campo] = json.loads(f'"{valor}"')
+            except json.JSONDecodeError:
+                continue
+        return dados
     
     def _extrair_campos_ementa(self, texto_ementa: str) -> Dict:
         """Extrai os campos da ementa formatada"""
@@ -178,20 +528,41 @@ Formate a resposta exatamente como os exemplos.
         return '\n'.join(ementa_final) if ementa_final else "Ementa não disponível"
 
 # Função principal para uso externo
-def processar_documento_para_ementa(texto_completo, llm):
+def processar_documento_para_ementa(texto_completo, llm, cache: CacheEmentas = None,
+                                    saida_estruturada: bool = SAIDA_ESTRUTURADA,
+                                    ao_gerar: Callable[[str], None] = None):
     """Função principal para processar documento e gerar ementa"""
-    processador = ProcessadorEmentasAvancado(llm)
+    processador = ProcessadorEmentasAvancado(
+        llm, cache=cache, saida_estruturada=saida_estruturada, ao_gerar=ao_gerar
+    )
+    
+    # Documento idêntico a um já resumido: nem divide em chunks
+    chave = None
+    if cache is not None:
+        chave = processador.chave_documento(texto_completo)
+        ementa_final = cache.obter(chave, "ementa")
+        if ementa_final is not None:
+            return ementa_final
     
     chunks = processador.dividir_documento_em_chunks(texto_completo)
     informacoes_chunks = []
+    completo = True
     
     for i, chunk in enumerate(chunks):
-        informacoes = processador.processar_chunk(chunk, i+1, len(chunks))
-        informacoes_chunks.append(informacoes)
+        texto_resposta = processador.obter_resposta_chunk(chunk, i+1, len(chunks))
+        if texto_resposta is None:
+            completo = False
+            informacoes_chunks.append({})
+        else:
+            informacoes_chunks.append(processador.interpretar_resposta(texto_resposta))
     
     informacoes_consolidadas = processador.consolidar_informacoes_chunks(informacoes_chunks)
     ementa_final = processador.gerar_ementa_final(informacoes_consolidadas)
     
+    # Ementas com chunks que falharam não são guardadas
+    if chave is not None and completo:
+        cache.guardar(chave, "ementa", ementa_final)
+    
     return ementa_final
 
 def criar_secao_ementa_colapsavel(ementa_gerada):
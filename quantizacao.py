@@ -0,0 +1,248 @@
+import os
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from embeddings import DIMENSAO_EMBEDDINGS
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DOS VETORES
+# =====================================================
+# Como os embeddings ficam no índice:
+#   - "float": float32 no grafo HNSW (4 bytes por dimensão)
+#   - "int8": float32 no documento e o HNSW quantizado pelo próprio
+#     Elasticsearch (index_options int8_hnsw, a partir da versão 8.12)
+#   - "byte": quantizados aqui, antes do envio (element_type byte, 1 byte
+#     por dimensão); funciona em qualquer 8.x
+# Nos modos quantizados os vetores completos ficam no armazém local e a
+# busca reordena os candidatos do kNN com eles.
+
+MODOS_VETORES = ("float", "int8", "byte")
+MODO_VETORES_PADRAO = "float"
+
+# Primeira versão do Elasticsearch com o int8_hnsw
+VERSAO_MINIMA_INT8_HNSW = (8, 12)
+
+# Pasta do armazém de vetores completos (vetores.f32 + indice.json)
+PASTA_VETORES_COMPLETOS = "cache/vetores"
+
+# Candidatos buscados nos vetores compactos para cada resultado devolvido
+FATOR_REESCORE = 4
+
+# Fração de linhas descartadas no armazém a partir da qual ele é compactado
+FRACAO_COMPACTACAO = 0.5
+
+
+def resolver_modo(es, modo: str) -> str:
+    """Modo efetivo: sem int8_hnsw no cluster, a quantização é feita aqui"""
+    if modo != "int8":
+        return modo
+    numero = es.info()["version"]["number"]
+    versao = tuple(int(parte) for parte in numero.split("-")[0].split(".")[:2])
+    if versao < VERSAO_MINIMA_INT8_HNSW:
+        print(f"⚠️ Elasticsearch {numero} não tem int8_hnsw; os vetores serão quantizados no cliente (modo byte).")
+        return "byte"
+    return modo
+
+
+def mapeamento_vetor(modo: str, dimensao: int = DIMENSAO_EMBEDDINGS, indexado: bool = True) -> Dict:
+    """Mapeamento de um campo dense_vector no modo pedido.
+
+    Com ``indexado=False`` o vetor só é guardado, sem grafo HNSW: não entra
+    no kNN nem ocupa a memória da busca vetorial.
+    """
+    if not indexado:
+        campo = {"type": "dense_vector", "dims": dimensao, "index": False}
+        if modo == "byte":
+            campo["element_type"] = "byte"
+        elif modo not in ("float", "int8"):
+            raise ValueError(f"Modo de vetores desconhecido: {modo}")
+        return campo
+
+    campo = {"type": "dense_vector", "dims": dimensao, "index": True, "similarity": "cosine"}
+    if modo == "int8":
+        campo["index_options"] = {"type": "int8_hnsw"}
+    elif modo == "byte":
+        campo["element_type"] = "byte"
+    elif modo != "float":
+        raise ValueError(f"Modo de vetores desconhecido: {modo}")
+    return campo
+
+
+def modo_do_indice(es, index: str) -> str:
+    """Modo com que o índice foi criado (registrado no _meta do mapeamento)"""
+    mapeamento = es.indices.get_mapping(index=index)[index]["mappings"]
+    return mapeamento.get("_meta", {}).get("modo_vetores", "float")
+
+
+def quantizar(vetores) -> np.ndarray:
+    """Converte vetores para int8 em [-127, 127], com uma escala por vetor.
+
+    A similaridade é o cosseno, que não depende da norma, então cada vetor
+    pode usar a faixa inteira dos bytes sem guardar a escala.
+    """
+    vetores = np.asarray(vetores, dtype=np.float32)
+    maximo = np.max(np.abs(vetores), axis=-1, keepdims=True)
+    return np.round(vetores * (127.0 / np.maximum(maximo, 1e-12))).astype(np.int8)
+
+
+def vetor_para_indice(vetor, modo: str) -> List:
+    """Vetor no formato aceito pelo campo (lista de floats ou de bytes)"""
+    if modo == "byte":
+        return quantizar(vetor).tolist()
+    return np.asarray(vetor, dtype=np.float32).tolist()
+
+
+def bytes_por_vetor(modo: str, dimensao: int = DIMENSAO_EMBEDDINGS) -> int:
+    """Memória de cada vetor no grafo HNSW (o int8 guarda também uma correção em float)"""
+    if modo == "float":
+        return 4 * dimensao
+    return dimensao + (4 if modo == "int8" else 0)
+
+# =====================================================
+# 🗄️ ARMAZÉM DE VETORES COMPLETOS
+# =====================================================
+
+class ArmazemVetores:
+    """Vetores float32 dos trechos de cada documento, fora do Elasticsearch.
+
+    Os vetores são acrescentados ao fim de ``vetores.f32``; ``indice.json``
+    diz onde estão os de cada documento. Um documento reindexado ganha linhas
+    novas e as antigas viram lixo, descartado quando o arquivo é compactado.
+    Quem só lê (o app) mapeia o arquivo em memória e o reabre quando o índice
+    é regravado.
+    """
+
+    def __init__(self, pasta: str = PASTA_VETORES_COMPLETOS, dimensao: int = DIMENSAO_EMBEDDINGS):
+        self.pasta = pasta
+        self.dimensao = dimensao
+        self.arquivo_vetores = os.path.join(pasta, "vetores.f32")
+        self.arquivo_indice = os.path.join(pasta, "indice.json")
+        # doc_id -> [primeira linha, quantidade de linhas]
+        self.posicoes: Dict[str, List[int]] = {}
+        self.linhas = 0
+        self._mapa = None
+        self._lido_em = None
+        self._recarregar_se_mudou()
+
+    def _recarregar_se_mudou(self):
+        try:
+            modificado = os.stat(self.arquivo_indice).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if modificado == self._lido_em:
+            return
+
+        with open(self.arquivo_indice, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        if dados["dimensao"] != self.dimensao:
+            raise ValueError(f"Armazém com vetores de {dados['dimensao']} dimensões, esperado {self.dimensao}")
+        self.posicoes = dados["documentos"]
+        self.linhas = dados["linhas"]
+        self._mapa = None
+        self._lido_em = modificado
+
+    def _matriz(self) -> np.ndarray:
+        if self._mapa is None:
+            if not self.linhas:
+                return np.zeros((0, self.dimensao), dtype=np.float32)
+            self._mapa = np.memmap(self.arquivo_vetores, dtype=np.float32, mode="r",
+                                   shape=(self.linhas, self.dimensao))
+        return self._mapa
+
+    def vetores(self, doc_id: str) -> Optional[np.ndarray]:
+        """Vetores completos dos trechos do documento, ou None"""
+        self._recarregar_se_mudou()
+        posicao = self.posicoes.get(doc_id)
+        if posicao is None:
+            return None
+        inicio, quantidade = posicao
+        return self._matriz()[inicio:inicio + quantidade]
+
+    def guardar(self, doc_id: str, vetores):
+        vetores = np.ascontiguousarray(vetores, dtype=np.float32).reshape(-1, self.dimensao)
+        os.makedirs(self.pasta, exist_ok=True)
+        with open(self.arquivo_vetores, "ab") as f:
+            f.seek(self.linhas * self.dimensao * 4)
+            f.truncate()
+            f.write(vetores.tobytes())
+        self.posicoes[doc_id] = [self.linhas, len(vetores)]
+        self.linhas += len(vetores)
+        self._mapa = None
+
+    def remover(self, doc_id: str):
+        self.posicoes.pop(doc_id, None)
+
+    def limpar(self):
+        self.posicoes = {}
+        self.linhas = 0
+        self._mapa = None
+        # O índice vazio é gravado antes: nunca aponta para um arquivo que já não existe
+        if os.path.exists(self.arquivo_indice):
+            self._gravar_indice()
+        if os.path.exists(self.arquivo_vetores):
+            os.remove(self.arquivo_vetores)
+
+    def linhas_em_uso(self) -> int:
+        return sum(quantidade for _, quantidade in self.posicoes.values())
+
+    def salvar(self):
+        """Grava o índice de forma atômica, compactando o arquivo se houver muito lixo"""
+        if self.linhas and 1 - self.linhas_em_uso() / self.linhas > FRACAO_COMPACTACAO:
+            self._compactar()
+        self._gravar_indice()
+
+    def _gravar_indice(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        temporario = self.arquivo_indice + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({"dimensao": self.dimensao, "linhas": self.linhas, "documentos": self.posicoes}, f)
+        os.replace(temporario, self.arquivo_indice)
+
+    def _compactar(self):
+        # Um novo arquivo substitui o antigo; quem já o tinha mapeado continua
+        # lendo a versão anterior até recarregar o índice
+        matriz = self._matriz()
+        temporario = self.arquivo_vetores + ".tmp"
+        posicoes, linha = {}, 0
+        with open(temporario, "wb") as f:
+            for doc_id, (inicio, quantidade) in self.posicoes.items():
+                f.write(np.ascontiguousarray(matriz[inicio:inicio + quantidade]).tobytes())
+                posicoes[doc_id] = [linha, quantidade]
+                linha += quantidade
+        os.replace(temporario, self.arquivo_vetores)
+        self.posicoes, self.linhas, self._mapa = posicoes, linha, None
+
+# =====================================================
+# 🎯 REORDENAÇÃO E AVALIAÇÃO
+# =====================================================
+
+def nota_cosseno(vetor_consulta: np.ndarray, vetores: np.ndarray) -> float:
+    """Nota do melhor trecho, na escala do Elasticsearch para o cosseno: (1 + cos) / 2"""
+    normas = np.maximum(np.linalg.norm(vetores, axis=1), 1e-12)
+    return float((1.0 + np.max(vetores @ vetor_consulta / normas)) / 2.0)
+
+
+def reescorar(hits: List[Dict], vetor, armazem: ArmazemVetores) -> List[Dict]:
+    """Reordena os candidatos do kNN pela similaridade com os vetores completos.
+
+    Documentos ausentes do armazém mantêm a nota da primeira fase.
+    """
+    consulta = np.asarray(vetor, dtype=np.float32)
+    consulta /= max(np.linalg.norm(consulta), 1e-12)
+
+    reordenados = []
+    for hit in hits:
+        vetores = armazem.vetores(hit["_id"])
+        if vetores is not None and len(vetores):
+            hit = {**hit, "_score": nota_cosseno(consulta, vetores)}
+        reordenados.append(hit)
+    return sorted(reordenados, key=lambda hit: -hit["_score"])
+
+
+def recall(obtidos: List[str], esperados: List[str]) -> float:
+    """Fração dos ``esperados`` presentes em ``obtidos``"""
+    if not esperados:
+        return 1.0
+    return len(set(obtidos) & set(esperados)) / len(esperados)
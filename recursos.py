@@ -0,0 +1,138 @@
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import streamlit as st
+from elasticsearch import Elasticsearch
+
+from embeddings import MODELO_EMBEDDINGS
+from busca import INDEX
+from cache_resultados import CacheResultados
+from geracao_indice import ler_geracao
+from ementas_sob_demanda import GeradorSobDemanda, GeradorSobDemandaLocal
+from busca_local import IndiceLocal, usar_indice_local
+from instrumentacao import medir, opcoes_elasticsearch
+from quantizacao import ArmazemVetores, modo_do_indice
+
+# =====================================================
+# ⚙️ RECURSOS COMPARTILHADOS ENTRE AS SESSÕES DO APP
+# =====================================================
+# O Streamlit reexecuta o script a cada interação e cria uma sessão por
+# navegador. Tudo aqui é criado uma vez por processo e reaproveitado por
+# todas as sessões e reexecuções.
+
+ES_URL = "http://localhost:9200"
+
+# Conexões HTTP mantidas abertas com o Elasticsearch, compartilhadas pelas sessões
+CONEXOES_POR_NO = 16
+
+# Consultas cujo embedding fica guardado em memória
+TAMANHO_CACHE_CONSULTAS = 1024
+
+
+@st.cache_resource(show_spinner=False)
+def obter_cliente_elasticsearch() -> Elasticsearch:
+    """Cliente único, com pool de conexões, para todo o processo.
+
+    Se o Elasticsearch estiver fora do ar a exceção é propagada e nada é
+    guardado, então a próxima execução tenta conectar de novo.
+    """
+    es = Elasticsearch(
+        ES_URL,
+        connections_per_node=CONEXOES_POR_NO,
+        request_timeout=30,
+        retry_on_timeout=True,
+        **opcoes_elasticsearch(),
+    )
+    es.info()
+    return es
+
+
+@st.cache_resource(show_spinner=False)
+def obter_indice_local() -> IndiceLocal:
+    """Índice local (IFAL_BACKEND=local), mapeado em memória e compartilhado pelas sessões"""
+    return IndiceLocal()
+
+
+def obter_backend():
+    """Onde as buscas são feitas: o cliente do Elasticsearch ou o índice local"""
+    return obter_indice_local() if usar_indice_local() else obter_cliente_elasticsearch()
+
+
+@st.cache_resource(show_spinner="Carregando modelo de embeddings...")
+def obter_modelo_embeddings():
+    """Carrega o modelo de embeddings uma vez por processo e já o aquece"""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(MODELO_EMBEDDINGS)
+    # A primeira chamada inicializa o tokenizer e os kernels; melhor pagar aqui
+    # do que na primeira busca
+    model.encode("aquecimento")
+    return model
+
+
+@st.cache_resource(show_spinner=False)
+def obter_cache_resultados() -> CacheResultados:
+    """Cache de resultados de busca compartilhado, invalidado quando o índice muda"""
+    if usar_indice_local():
+        return CacheResultados(obter_indice_local().geracao)
+    es = obter_cliente_elasticsearch()
+    return CacheResultados(lambda: ler_geracao(es, INDEX))
+
+
+def _criar_llm():
+    """Carrega o modelo de ementas (só quando a primeira ementa é pedida)"""
+    from llama_cpp import Llama
+    from gerar_ementas import MODEL_PATH, N_CTX
+    from pool_llm import THREADS_POR_WORKER
+
+    return Llama(model_path=MODEL_PATH, n_ctx=N_CTX, n_threads=THREADS_POR_WORKER, verbose=False)
+
+
+@st.cache_resource(show_spinner=False)
+def obter_gerador_sob_demanda() -> GeradorSobDemanda:
+    """Gerador de ementas sob demanda, com um único modelo para todas as sessões"""
+    from cache_ementas import CacheEmentas
+
+    if usar_indice_local():
+        return GeradorSobDemandaLocal(
+            obter_indice_local(), _criar_llm,
+            cache=CacheEmentas(),
+            ao_gravar=obter_cache_resultados().invalidar,
+        )
+    return GeradorSobDemanda(
+        obter_cliente_elasticsearch(), INDEX, _criar_llm,
+        cache=CacheEmentas(),
+        ao_gravar=obter_cache_resultados().invalidar,
+    )
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def obter_modo_vetores() -> str:
+    """Modo dos vetores do índice (float, int8 ou byte), relido a cada minuto"""
+    return modo_do_indice(obter_cliente_elasticsearch(), INDEX)
+
+
+@st.cache_resource(show_spinner=False)
+def obter_armazem_vetores() -> ArmazemVetores:
+    """Vetores completos gravados pelo indexador; recarregados quando ele os atualiza"""
+    return ArmazemVetores()
+
+
+def opcoes_vetores() -> Dict:
+    """Argumentos da busca híbrida para o modo dos vetores do índice"""
+    if usar_indice_local():
+        # O índice local guarda os vetores completos
+        return {}
+    modo = obter_modo_vetores()
+    return {"modo_vetores": modo, "armazem": obter_armazem_vetores() if modo != "float" else None}
+
+
+@lru_cache(maxsize=TAMANHO_CACHE_CONSULTAS)
+def _embedding_consulta(termo: str) -> Tuple[float, ...]:
+    with medir("embedding_consulta"):
+        return tuple(obter_modelo_embeddings().encode(termo).tolist())
+
+
+def embedding_consulta(termo: str) -> list:
+    """Embedding de uma consulta, reaproveitado entre buscas e páginas"""
+    return list(_embedding_consulta(" ".join(termo.split())))
@@ -0,0 +1,589 @@
+import os
+import time
+import sqlite3
+import argparse
+import threading
+from typing import Dict, List, Optional, Set
+
+from manifesto import Manifesto
+from busca_local import BACKEND, PASTA_INDICE_LOCAL, EscritorIndiceLocal, IndiceLocal
+from embeddings import CacheEmbeddings, MODELO_EMBEDDINGS, CAPACIDADE_CACHE
+from extracao_pdfs import CacheTextos, BACKENDS_EXTRACAO, BACKEND_EXTRACAO_PADRAO
+from geracao_indice import MarcadorGeracao, marcar_nova_geracao
+from instrumentacao import contar, iniciar_servidor, medir
+from quantizacao import ArmazemVetores, MODO_VETORES_PADRAO, modo_do_indice
+from duplicatas import (
+    ARQUIVO_DUPLICATAS, ARQUIVO_DUPLICATAS_LOCAL, DetectorDuplicatas, IndiceDuplicatas, ReaproveitamentoEmentas,
+    criar_leitor_canonicos
+)
+from indexar_pdfs import (
+    INDEX, PASTA_PDFS, conectar_elasticsearch, criar_indice, mapeamento_atualizado, listar_pdfs,
+    remover_documentos, indexar_pdfs
+)
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DO SERVIÇO DE INGESTÃO
+# =====================================================
+# Processo de longa duração que observa a pasta de PDFs e leva cada arquivo
+# novo ou alterado pela extração, embeddings, indexação e ementa, sem
+# esperar alguém rodar os scripts. O trabalho pendente fica em uma fila em
+# SQLite: depois de um reinício, o serviço continua dela.
+
+ARQUIVO_FILA_INGESTAO = "cache/fila_ingestao.sqlite"
+
+# Um arquivo só é processado depois de ficar esse tempo sem mudar de tamanho
+# nem de data (cópias e downloads gravam o PDF aos poucos)
+SEGUNDOS_ESTAVEL = 3.0
+
+# Sem o watchdog, a pasta é varrida a cada tantos segundos
+INTERVALO_VARREDURA = 10.0
+
+# Intervalo entre verificações da fila e dos arquivos em espera
+INTERVALO_VERIFICACAO = 0.5
+
+# PDFs levados juntos a cada passagem do indexador
+LOTE_INDEXACAO = 16
+
+# Tentativas de cada tarefa antes de desistir, com espera crescente entre elas
+MAX_TENTATIVAS = 3
+ESPERA_NOVA_TENTATIVA = 60.0
+
+# =====================================================
+# 📥 FILA PERSISTENTE
+# =====================================================
+
+class FilaIngestao:
+    """Tarefas pendentes por etapa ("indexar" um caminho, "ementa" de um doc_id).
+
+    Uma tarefa só sai da fila quando a etapa termina. Se o processo cair no
+    meio, ela continua lá e é retomada no próximo início.
+    """
+
+    def __init__(self, caminho: str = ARQUIVO_FILA_INGESTAO):
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("""
+            CREATE TABLE IF NOT EXISTS tarefas (
+                etapa TEXT NOT NULL,
+                alvo TEXT NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                disponivel_em REAL NOT NULL,
+                erro TEXT,
+                PRIMARY KEY (etapa, alvo)
+            )
+        """)
+        self._conexao.commit()
+
+    def adicionar(self, etapa: str, alvo: str):
+        """Enfileira (ou reenfileira do zero) uma tarefa"""
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO tarefas (etapa, alvo, tentativas, disponivel_em) VALUES (?, ?, 0, ?)",
+                (etapa, alvo, time.time())
+            )
+            self._conexao.commit()
+        contar("ingestao_tarefas", etapa=etapa, resultado="enfileirada")
+
+    def proximas(self, etapa: str, limite: int, excluir: Set[str] = frozenset()) -> List[str]:
+        """Alvos prontos para processar, dos mais antigos para os mais novos"""
+        with self._lock:
+            linhas = self._conexao.execute(
+                "SELECT alvo FROM tarefas WHERE etapa = ? AND tentativas < ? AND disponivel_em <= ? "
+                "ORDER BY disponivel_em LIMIT ?",
+                (etapa, MAX_TENTATIVAS, time.time(), limite + len(excluir))
+            ).fetchall()
+        return [alvo for alvo, in linhas if alvo not in excluir][:limite]
+
+    def concluir(self, etapa: str, alvo: str):
+        with self._lock:
+            self._conexao.execute("DELETE FROM tarefas WHERE etapa = ? AND alvo = ?", (etapa, alvo))
+            self._conexao.commit()
+        contar("ingestao_tarefas", etapa=etapa, resultado="concluida")
+
+    def falhar(self, etapa: str, alvo: str, erro):
+        """Registra a falha; a tarefa volta mais tarde, até MAX_TENTATIVAS vezes"""
+        with self._lock:
+            self._conexao.execute(
+                "UPDATE tarefas SET tentativas = tentativas + 1, erro = ?, "
+                "disponivel_em = ? + ? * (tentativas + 1) WHERE etapa = ? AND alvo = ?",
+                (str(erro), time.time(), ESPERA_NOVA_TENTATIVA, etapa, alvo)
+            )
+            self._conexao.commit()
+        contar("ingestao_tarefas", etapa=etapa, resultado="falha")
+
+    def pendentes(self) -> Dict[str, int]:
+        """Quantidade de tarefas ainda a processar, por etapa"""
+        with self._lock:
+            linhas = self._conexao.execute(
+                "SELECT etapa, COUNT(*) FROM tarefas WHERE tentativas < ? GROUP BY etapa", (MAX_TENTATIVAS,)
+            ).fetchall()
+        return dict(linhas)
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
+
+# =====================================================
+# 👀 OBSERVAÇÃO DA PASTA
+# =====================================================
+
+class EsperaEstabilidade:
+    """Arquivos que mudaram há pouco, à espera de pararem de ser gravados"""
+
+    def __init__(self, segundos_estavel: float = SEGUNDOS_ESTAVEL):
+        self.segundos_estavel = segundos_estavel
+        self._lock = threading.Lock()
+        # caminho -> ((tamanho, mtime), desde quando está assim)
+        self._arquivos: Dict[str, tuple] = {}
+
+    def notificar(self, caminho: str):
+        if not caminho.endswith(".pdf"):
+            return
+        with self._lock:
+            self._arquivos.setdefault(caminho, (None, time.monotonic()))
+
+    def estaveis(self) -> List[str]:
+        """Retira e retorna os arquivos que não mudam há ``segundos_estavel`` (ou que sumiram)"""
+        prontos = []
+        agora = time.monotonic()
+        with self._lock:
+            for caminho, (assinatura, desde) in list(self._arquivos.items()):
+                try:
+                    stat = os.stat(caminho)
+                    atual = (stat.st_size, stat.st_mtime)
+                except FileNotFoundError:
+                    atual = "removido"
+
+                if atual != assinatura:
+                    self._arquivos[caminho] = (atual, agora)
+                elif agora - desde >= self.segundos_estavel:
+                    prontos.append(caminho)
+                    del self._arquivos[caminho]
+        return prontos
+
+
+def observar_com_watchdog(pasta: str, espera: EsperaEstabilidade):
+    """Eventos do sistema de arquivos (inotify no Linux). Retorna o observador, ou None sem o watchdog."""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class Eventos(FileSystemEventHandler):
+        def on_any_event(self, evento):
+            if evento.is_directory:
+                return
+            espera.notificar(os.path.join(pasta, os.path.basename(evento.src_path)))
+            destino = getattr(evento, "dest_path", "")
+            if destino:
+                espera.notificar(os.path.join(pasta, os.path.basename(destino)))
+
+    observador = Observer()
+    observador.schedule(Eventos(), pasta, recursive=False)
+    observador.daemon = True
+    observador.start()
+    return observador
+
+
+class VarreduraPeriodica:
+    """Alternativa ao watchdog: compara tamanho e data dos PDFs a cada intervalo"""
+
+    def __init__(self, pasta: str, espera: EsperaEstabilidade, parar: threading.Event,
+                 intervalo: float = INTERVALO_VARREDURA):
+        self.pasta = pasta
+        self.espera = espera
+        self.parar = parar
+        self.intervalo = intervalo
+        self._vistos = self._assinaturas()
+        self._thread = threading.Thread(target=self._varrer, daemon=True)
+        self._thread.start()
+
+    def _assinaturas(self) -> Dict[str, tuple]:
+        assinaturas = {}
+        for caminho in listar_pdfs(self.pasta):
+            try:
+                stat = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            assinaturas[caminho] = (stat.st_size, stat.st_mtime)
+        return assinaturas
+
+    def _varrer(self):
+        while not self.parar.wait(self.intervalo):
+            atuais = self._assinaturas()
+            for caminho in set(atuais) | set(self._vistos):
+                if atuais.get(caminho) != self._vistos.get(caminho):
+                    self.espera.notificar(caminho)
+            self._vistos = atuais
+
+# =====================================================
+# 🏭 SERVIÇO
+# =====================================================
+
+class ServicoIngestao:
+    """Indexa e gera as ementas dos PDFs conforme eles chegam à pasta.
+
+    Três etapas em threads próprias, ligadas pela fila persistente:
+    observação (com espera até o arquivo parar de mudar), indexação em lotes
+    (a mesma do ``indexar_pdfs.py``, incremental pelo manifesto) e ementas
+    (o mesmo gerador do ``gerar_ementas.py``, com no máximo dois documentos
+    por processo do modelo em andamento).
+    """
+
+    def __init__(self, pasta: str = PASTA_PDFS, backend: str = BACKEND, gerar_ementas: bool = True,
+                 workers: int = None, workers_llm: int = None, threads_llm: int = None,
+                 backend_extracao: str = BACKEND_EXTRACAO_PADRAO, forcar_varredura: bool = False,
+                 intervalo_varredura: float = INTERVALO_VARREDURA, fila: FilaIngestao = None):
+        self.pasta = pasta
+        self.local = backend == "local"
+        self.gerar_ementas = gerar_ementas
+        self.workers = workers
+        self.workers_llm = workers_llm
+        self.threads_llm = threads_llm
+        self.backend_extracao = backend_extracao
+        self.forcar_varredura = forcar_varredura
+        self.intervalo_varredura = intervalo_varredura
+
+        self.fila = fila or FilaIngestao()
+        self.espera = EsperaEstabilidade()
+        self.parar = threading.Event()
+        self._observador = None
+        self._threads: List[threading.Thread] = []
+
+        self.es = None
+        self.modo_vetores = MODO_VETORES_PADRAO
+        self.armazem = None
+        self.indice_local: Optional[EscritorIndiceLocal] = None
+        self.leitor_local: Optional[IndiceLocal] = None
+        self.duplicatas = IndiceDuplicatas.carregar(ARQUIVO_DUPLICATAS_LOCAL if self.local else ARQUIVO_DUPLICATAS)
+        if self.local:
+            self.indice_local = EscritorIndiceLocal()
+            self.manifesto = Manifesto.carregar(os.path.join(PASTA_INDICE_LOCAL, "manifesto.json"))
+            if self.indice_local.vazio:
+                self.manifesto.limpar()
+                self.duplicatas.limpar()
+        else:
+            self.es = conectar_elasticsearch()
+            self.manifesto = Manifesto.carregar()
+            self._preparar_indice()
+        # As ementas são gravadas uma a uma; a geração é marcada no máximo uma vez por intervalo
+        self._geracao = MarcadorGeracao(self.es, INDEX) if self.es is not None else None
+
+        self._model = None
+        self._cache_embeddings = None
+
+    def _preparar_indice(self):
+        if not self.es.indices.exists(index=INDEX):
+            criar_indice(self.es)
+            self.manifesto.limpar()
+            self.duplicatas.limpar()
+        elif not mapeamento_atualizado(self.es):
+            raise RuntimeError(f"O índice '{INDEX}' foi criado com um mapeamento antigo. Rode indexar_pdfs.py --recriar.")
+        self.modo_vetores = modo_do_indice(self.es, INDEX)
+        if self.modo_vetores != "float":
+            self.armazem = ArmazemVetores()
+
+    # ---------------------------------------------
+    # Ciclo de vida
+    # ---------------------------------------------
+
+    def reconciliar(self):
+        """Põe em espera o que mudou enquanto o serviço estava parado (só compara tamanho e data)"""
+        caminhos = listar_pdfs(self.pasta)
+        nomes = set()
+        for caminho in caminhos:
+            arquivo = os.path.basename(caminho)
+            nomes.add(arquivo)
+            entrada = self.manifesto.entradas.get(arquivo)
+            stat = os.stat(caminho)
+            if not entrada or entrada["tamanho"] != stat.st_size or entrada["mtime"] != stat.st_mtime:
+                self.espera.notificar(caminho)
+        for arquivo in self.manifesto.entradas:
+            if arquivo not in nomes:
+                self.espera.notificar(os.path.join(self.pasta, arquivo))
+
+    def iniciar(self):
+        self.reconciliar()
+
+        if not self.forcar_varredura:
+            self._observador = observar_com_watchdog(self.pasta, self.espera)
+        if self._observador is None:
+            print(f"👀 Varrendo {self.pasta} a cada {self.intervalo_varredura:g}s (instale o watchdog para eventos imediatos)")
+            VarreduraPeriodica(self.pasta, self.espera, self.parar, self.intervalo_varredura)
+        else:
+            print(f"👀 Observando {self.pasta}")
+
+        etapas = [self._etapa_espera, self._etapa_indexacao]
+        if self.gerar_ementas:
+            etapas.append(self._etapa_ementas)
+        for etapa in etapas:
+            thread = threading.Thread(target=self._protegida, args=(etapa,), name=etapa.__name__, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        pendentes = self.fila.pendentes()
+        if pendentes:
+            print(f"↩️ Retomando a fila: {pendentes}")
+
+    def _protegida(self, etapa):
+        # Um erro inesperado derruba o serviço inteiro, não só uma etapa
+        try:
+            etapa()
+        except Exception as e:
+            print(f"❌ Etapa {etapa.__name__} interrompida: {e}")
+            self.parar.set()
+
+    def executar(self):
+        """Roda até Ctrl-C (ou até uma etapa falhar)"""
+        self.iniciar()
+        try:
+            while not self.parar.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            print("\n⏸️ Encerrando...")
+        finally:
+            self.encerrar()
+
+    def encerrar(self):
+        self.parar.set()
+        if self._observador is not None:
+            self._observador.stop()
+        for thread in self._threads:
+            thread.join()
+        if self._geracao is not None:
+            self._geracao.descarregar()
+        self.fila.fechar()
+
+    # ---------------------------------------------
+    # Etapas
+    # ---------------------------------------------
+
+    def _etapa_espera(self):
+        """Enfileira os arquivos que pararam de mudar"""
+        while not self.parar.wait(INTERVALO_VERIFICACAO):
+            for caminho in self.espera.estaveis():
+                self.fila.adicionar("indexar", caminho)
+
+    def _etapa_indexacao(self):
+        while not self.parar.is_set():
+            caminhos = self.fila.proximas("indexar", LOTE_INDEXACAO)
+            if not caminhos:
+                self.parar.wait(INTERVALO_VERIFICACAO)
+                continue
+            with medir("ingestao_lote", backend="local" if self.local else "elasticsearch") as span:
+                self._indexar(caminhos)
+                span.anotar(arquivos=len(caminhos))
+
+    def _indexar(self, caminhos: List[str]):
+        presentes = [caminho for caminho in caminhos if os.path.exists(caminho)]
+        ausentes = {os.path.basename(caminho) for caminho in caminhos} - {os.path.basename(c) for c in presentes}
+
+        # Só os arquivos do lote: o resto da pasta pode estar sendo gravado agora
+        alterados, _ = self.manifesto.comparar(presentes)
+        removidos = [dict(entrada, arquivo=arquivo) for arquivo, entrada in self.manifesto.entradas.items()
+                     if arquivo in ausentes]
+        print(f"🔎 Lote: {len(alterados)} PDFs novos ou alterados, {len(removidos)} removidos.")
+
+        try:
+            if self.local:
+                self._indexar_local(alterados, removidos)
+            else:
+                self._indexar_elasticsearch(alterados, removidos)
+        except Exception as e:
+            print(f"❌ Erro ao indexar o lote: {e}")
+            for caminho in caminhos:
+                self.fila.falhar("indexar", caminho, e)
+            return
+        finally:
+            self.manifesto.salvar()
+            self.duplicatas.salvar()
+            if self._cache_embeddings is not None:
+                self._cache_embeddings.salvar()
+            if self.armazem is not None:
+                self.armazem.salvar()
+
+        # Confirmados são os que o manifesto registrou com o hash novo
+        por_caminho = {entrada["caminho"]: entrada for entrada in alterados}
+        for caminho in caminhos:
+            entrada = por_caminho.get(caminho)
+            registrada = entrada and self.manifesto.entradas.get(entrada["arquivo"], {}).get("hash") == entrada["hash"]
+            if entrada is not None and not registrada:
+                self.fila.falhar("indexar", caminho, "não foi indexado")
+                continue
+            self.fila.concluir("indexar", caminho)
+            if entrada is not None and self.gerar_ementas:
+                self.fila.adicionar("ementa", entrada["doc_id"])
+
+    def _modelo_embeddings(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(MODELO_EMBEDDINGS)
+            self._cache_embeddings = CacheEmbeddings(capacidade=CAPACIDADE_CACHE)
+        return self._model
+
+    def _opcoes_indexacao(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "cache": self._cache_embeddings,
+            "backend_extracao": self.backend_extracao,
+            "cache_textos": CacheTextos(),
+        }
+
+    def _indexar_elasticsearch(self, alterados: List[Dict], removidos: List[Dict]):
+        if removidos:
+            remover_documentos(self.es, self.manifesto, removidos, self.armazem, self.duplicatas)
+        if alterados:
+            model = self._modelo_embeddings()
+            detector = DetectorDuplicatas(self.duplicatas, criar_leitor_canonicos(self.es, INDEX, self.armazem))
+            indexar_pdfs(self.es, model, alterados, self.manifesto, modo_vetores=self.modo_vetores,
+                         armazem=self.armazem, duplicatas=detector, **self._opcoes_indexacao())
+        if alterados or removidos:
+            # Documentos novos aparecem na busca já na próxima consulta
+            self.es.indices.refresh(index=INDEX)
+            marcar_nova_geracao(self.es, INDEX)
+
+    def _indexar_local(self, alterados: List[Dict], removidos: List[Dict]):
+        for entrada in removidos:
+            self.indice_local.remover(entrada["doc_id"])
+            self.duplicatas.remover(entrada["doc_id"])
+        if alterados:
+            model = self._modelo_embeddings()
+            # Os canônicos são lidos da versão gravada do índice
+            leitor = None if self.indice_local.vazio else criar_leitor_canonicos(self.indice_local.leitor, None)
+            indexar_pdfs(None, model, alterados, self.manifesto, indice_local=self.indice_local,
+                         duplicatas=DetectorDuplicatas(self.duplicatas, leitor), **self._opcoes_indexacao())
+        elif removidos or self.indice_local.vazio:
+            self.indice_local.salvar()
+        for entrada in removidos:
+            self.manifesto.remover(entrada["arquivo"])
+            print(f"🗑️ {entrada['arquivo']} removido do índice.")
+
+    def _etapa_ementas(self):
+        from gerar_ementas import criar_gerador
+        from pool_llm import escolher_divisao
+        from cache_ementas import CacheEmentas
+
+        gerador = None
+        cache = None
+        reaproveitamento = None
+        # doc_id -> hash do conteúdo de que a ementa está sendo gerada
+        em_andamento: Dict[str, Optional[str]] = {}
+        try:
+            while not self.parar.is_set():
+                limite = 2 * (gerador.workers if gerador is not None else 1)
+                doc_ids = self.fila.proximas("ementa", limite - len(em_andamento), set(em_andamento))
+
+                for doc_id in doc_ids:
+                    fonte = self._ler_documento(doc_id)
+                    if fonte is None or (fonte.get("tem_ementa")
+                                         and fonte.get("hash_conteudo_ementa") == fonte.get("hash_conteudo")):
+                        # Removido depois de indexado, ou a ementa já está em dia
+                        self.fila.concluir("ementa", doc_id)
+                        continue
+                    if gerador is None:
+                        workers, threads = escolher_divisao(threads_por_worker=self.threads_llm)
+                        print("🔄 Carregando modelo LLM...")
+                        cache = CacheEmentas()
+                        gerador = criar_gerador(self.workers_llm or workers, self.threads_llm or threads, cache)
+                        reaproveitamento = ReaproveitamentoEmentas(
+                            self.duplicatas, self.leitor_local if self.local else self.es, INDEX
+                        )
+                    texto, ementa_pronta = reaproveitamento.preparar(doc_id, fonte["conteudo"])
+                    if ementa_pronta is not None:
+                        # Mesmo texto do canônico: a ementa dele vale como está
+                        self._gravar_ementa(doc_id, {
+                            "ementa": ementa_pronta,
+                            "tem_ementa": True,
+                            "hash_conteudo_ementa": fonte.get("hash_conteudo"),
+                        })
+                        self.fila.concluir("ementa", doc_id)
+                        print(f"🔁 Ementa de {doc_id} copiada do canônico")
+                        continue
+                    em_andamento[doc_id] = fonte.get("hash_conteudo")
+                    gerador.submeter(doc_id, texto)
+
+                if not em_andamento:
+                    self.parar.wait(INTERVALO_VERIFICACAO)
+                    continue
+
+                for doc_id, ementa, erro in gerador.avancar(timeout=INTERVALO_VERIFICACAO):
+                    hash_conteudo = em_andamento.pop(doc_id)
+                    ementa = reaproveitamento.concluir(doc_id, ementa)
+                    if erro is not None:
+                        print(f"❌ Erro ao gerar ementa de {doc_id}: {erro}")
+                        self.fila.falhar("ementa", doc_id, erro)
+                        continue
+                    self._gravar_ementa(doc_id, {
+                        "ementa": ementa,
+                        "tem_ementa": True,
+                        "hash_conteudo_ementa": hash_conteudo,
+                    })
+                    self.fila.concluir("ementa", doc_id)
+                    print(f"✅ Ementa gerada para {doc_id}")
+        finally:
+            # Tarefas em andamento continuam na fila e são refeitas no próximo início
+            if gerador is not None:
+                gerador.fechar()
+            if cache is not None:
+                cache.fechar()
+
+    def _ler_documento(self, doc_id: str) -> Optional[Dict]:
+        campos = ["conteudo", "hash_conteudo", "tem_ementa", "hash_conteudo_ementa"]
+        if self.local:
+            if self.leitor_local is None:
+                # O mesmo leitor do escritor: a poda das ementas em cada nova
+                # versão e a gravação de cada ementa usam o mesmo lock
+                self.leitor_local = self.indice_local.leitor
+            try:
+                return self.leitor_local.documento(doc_id, campos)["_source"]
+            except KeyError:
+                return None
+
+        from elasticsearch import NotFoundError
+        try:
+            return self.es.get(index=INDEX, id=doc_id, source_includes=campos)["_source"]
+        except NotFoundError:
+            return None
+
+    def _gravar_ementa(self, doc_id: str, campos: Dict):
+        if self.local:
+            self.leitor_local.gravar_ementas({doc_id: campos})
+            return
+        self.es.update(index=INDEX, id=doc_id, doc=campos)
+        self._geracao.marcar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexa e gera ementas dos PDFs conforme chegam a documentos/pdfs")
+    parser.add_argument("--backend", choices=("elasticsearch", "local"), default=BACKEND,
+                        help="Onde gravar o índice (padrão: variável IFAL_BACKEND ou elasticsearch)")
+    parser.add_argument("--sem-ementas", action="store_true",
+                        help="Só indexa; as ementas ficam para o gerar_ementas.py ou para o app")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos de extração (padrão: número de núcleos)")
+    parser.add_argument("--workers-llm", type=int, default=None,
+                        help="Processos com o modelo de ementas carregado (padrão: núcleos / threads por processo)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Threads do llama.cpp por processo (padrão: 6)")
+    parser.add_argument("--backend-extracao", choices=sorted(BACKENDS_EXTRACAO), default=BACKEND_EXTRACAO_PADRAO,
+                        help="Biblioteca que extrai o texto dos PDFs")
+    parser.add_argument("--varredura", action="store_true",
+                        help="Varre a pasta periodicamente mesmo com o watchdog instalado")
+    parser.add_argument("--intervalo-varredura", type=float, default=INTERVALO_VARREDURA,
+                        help="Segundos entre varreduras da pasta, sem o watchdog")
+    args = parser.parse_args()
+    iniciar_servidor()
+
+    servico = ServicoIngestao(
+        backend=args.backend, gerar_ementas=not args.sem_ementas, workers=args.workers,
+        workers_llm=args.workers_llm, threads_llm=args.threads, backend_extracao=args.backend_extracao,
+        forcar_varredura=args.varredura, intervalo_varredura=args.intervalo_varredura,
+    )
+    servico.executar()
+
+
+if __name__ == "__main__":
+    main()
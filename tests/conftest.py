@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório, fora de um pacote; os
+# modelos falsos dos benchmarks servem também aos testes
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+
+@pytest.fixture
+def llm():
+    """LLM falso em que cada palavra é um token"""
+    from falsos import LlamaFalso
+
+    modelo = LlamaFalso()
+    yield modelo
+    modelo.fechar()
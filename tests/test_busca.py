@@ -0,0 +1,91 @@
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import ApiError
+
+import busca
+from busca import busca_hibrida, fundir_resultados, montar_consulta_hibrida
+
+
+def test_consulta_rrf():
+    consulta = montar_consulta_hibrida("bolsa", [0.1, 0.2], pagina=7, tamanho_pagina=10, k=50, constante_rrf=60)
+
+    assert consulta["from"] == 60
+    assert consulta["knn"]["k"] == 70
+    assert consulta["knn"]["num_candidates"] >= 70
+    assert consulta["rank"] == {"rrf": {"window_size": 70, "rank_constant": 60}}
+
+
+def test_consulta_ponderada_com_filtros():
+    consulta = montar_consulta_hibrida("bolsa", [0.1], modo_fusao="ponderada", peso_textual=2.0,
+                                       peso_semantico=3.0, filtros={"tem_ementa": True})
+
+    assert "rank" not in consulta
+    assert consulta["query"]["bool"]["boost"] == 2.0
+    assert consulta["knn"]["boost"] == 3.0
+    assert consulta["knn"]["filter"]
+
+
+def test_modo_de_fusao_desconhecido():
+    with pytest.raises(ValueError):
+        montar_consulta_hibrida("bolsa", [0.1], modo_fusao="outro")
+
+
+
+class _ClienteRecusaRrf:
+    """Responde com ``erro`` às consultas com RRF e com zero hits às demais"""
+
+    def __init__(self, erro: ApiError):
+        self.erro = erro
+        self.consultas = []
+
+    def search(self, index, body):
+        self.consultas.append(body)
+        if "rank" in body:
+            raise self.erro
+        return {"hits": {"hits": [], "total": {"value": 0}}}
+
+
+def _erro(status: int, mensagem: str) -> ApiError:
+    meta = ApiResponseMeta(status=status, http_version="1.1", headers=HttpHeaders(), duration=0.0,
+                           node=NodeConfig("http", "localhost", 9200))
+    return ApiError(mensagem, meta, {"error": {"reason": mensagem}, "status": status})
+
+
+@pytest.mark.parametrize("status, mensagem", [
+    (403, "current license is non-compliant for [Reciprocal Rank Fusion (RRF)]"),
+    (400, "unknown key [rank] for create request"),
+])
+def test_cluster_sem_rrf_passa_para_a_fusao_ponderada(monkeypatch, status, mensagem):
+    monkeypatch.setattr(busca, "_rrf_disponivel", True)
+    es = _ClienteRecusaRrf(_erro(status, mensagem))
+
+    busca_hibrida(es, "bolsa", [0.1])
+    busca_hibrida(es, "bolsa", [0.1])
+
+    assert not busca._rrf_disponivel
+    # A segunda busca já vai direto com a fusão ponderada
+    assert ["rank" in consulta for consulta in es.consultas] == [True, False, False]
+
+
+def test_erro_da_propria_consulta_nao_desliga_o_rrf(monkeypatch):
+    monkeypatch.setattr(busca, "_rrf_disponivel", True)
+    es = _ClienteRecusaRrf(_erro(400, "failed to create query: For input string: \"abc\""))
+
+    with pytest.raises(ApiError):
+        busca_hibrida(es, "bolsa", [0.1])
+
+    assert busca._rrf_disponivel
+    assert len(es.consultas) == 1
+
+
+def test_fusao_rrf_e_ponderada():
+    textuais = [{"_id": "a", "_score": 10.0, "_source": {"arquivo": "a.pdf"}}, {"_id": "b", "_score": 5.0}]
+    semanticos = [{"_id": "b", "_score": 0.9}, {"_id": "c", "_score": 0.8}]
+
+    rrf = fundir_resultados(textuais, semanticos, "rrf", constante_rrf=60)
+    assert [hit["_id"] for hit in rrf] == ["b", "a", "c"]
+    assert rrf[1]["_source"] == {"arquivo": "a.pdf"}
+
+    ponderada = fundir_resultados(textuais, semanticos, "ponderada", peso_textual=1.0, peso_semantico=20.0)
+    assert [hit["_id"] for hit in ponderada] == ["b", "c", "a"]
+    assert ponderada[0]["_score"] == pytest.approx(5.0 + 18.0)
@@ -0,0 +1,123 @@
+import threading
+
+import numpy as np
+import pytest
+
+from busca_local import EscritorIndiceLocal, IndiceLocal, ResultadoLocal, tokenizar
+
+DIMENSAO = 4
+
+
+def _acao(doc_id: str, conteudo: str, vetores) -> dict:
+    return {
+        "_op_type": "index",
+        "_id": doc_id,
+        "_source": {
+            "arquivo": f"{doc_id}.pdf",
+            "conteudo": conteudo,
+            "hash_conteudo": f"hash-{doc_id}",
+            "trechos": [{"embedding": vetor} for vetor in vetores],
+        },
+    }
+
+
+@pytest.fixture
+def indice(tmp_path):
+    pasta = str(tmp_path / "indice")
+    escritor = EscritorIndiceLocal(pasta, dimensao=DIMENSAO)
+    escritor.gravar([
+        _acao("edital", "Edital de bolsa de monitoria para estudantes.", [[1, 0, 0, 0], [0, 1, 0, 0]]),
+        _acao("portaria", "Portaria sobre férias dos servidores.", [[0, 0, 1, 0]]),
+        _acao("auxilio", "Auxílio estudantil: bolsa permanência e bolsa alimentação.", [[0, 0, 0, 1]]),
+    ])
+    return IndiceLocal(pasta)
+
+
+def test_tokenizar_como_o_analisador_padrao():
+    assert tokenizar("Edital Nº 12/2024 — Bolsa") == ["edital", "nº", "12", "2024", "bolsa"]
+
+
+def test_bm25_favorece_o_documento_com_mais_ocorrencias(indice):
+    leitura = indice.atual()
+
+    posicoes, notas = leitura.notas_textuais("bolsa")
+
+    assert [leitura.versao.ids[p] for p in posicoes] == ["auxilio", "edital"]
+    assert notas[0] > notas[1] > 0
+
+
+def test_knn_usa_o_melhor_trecho_de_cada_documento(indice):
+    leitura = indice.atual()
+
+    posicoes, notas = leitura.notas_semanticas([0, 2, 0, 0.1], k=2)
+
+    assert leitura.versao.ids[posicoes[0]] == "edital"
+    assert len(posicoes) == 2
+    assert 0.5 < notas[0] <= 1.0
+
+
+def test_vetores_do_documento_na_ordem_dos_trechos(indice):
+    assert np.allclose(indice.vetores_documento("edital"), [[1, 0, 0, 0], [0, 1, 0, 0]])
+    assert indice.vetores_documento("inexistente") is None
+
+
+def test_nova_versao_mantem_os_documentos_que_nao_mudaram(tmp_path, indice):
+    escritor = EscritorIndiceLocal(indice.pasta, dimensao=DIMENSAO)
+    escritor.gravar([{"_op_type": "delete", "_id": "portaria"},
+                     _acao("auxilio", "Auxílio transporte.", [[0, 3, 0, 0]])])
+
+    leitura = indice.atual()
+    assert sorted(leitura.versao.ids) == ["auxilio", "edital"]
+    assert indice.documento("auxilio")["_source"]["conteudo"] == "Auxílio transporte."
+    assert np.allclose(indice.vetores_documento("edital"), [[1, 0, 0, 0], [0, 1, 0, 0]])
+    assert np.allclose(indice.vetores_documento("auxilio"), [[0, 1, 0, 0]])
+    with pytest.raises(KeyError):
+        indice.documento("portaria")
+
+
+def test_ementas_gravadas_mudam_a_geracao_e_os_pendentes(indice):
+    geracao = indice.geracao()
+    assert indice.contar_pendentes() == 3
+
+    indice.gravar_ementas({"edital": {"ementa": "Tipo: Edital", "tem_ementa": True,
+                                      "hash_conteudo_ementa": "hash-edital"}})
+
+    assert indice.geracao() != geracao
+    assert indice.contar_pendentes() == 2
+    assert indice.documento("edital")["_source"]["ementa"] == "Tipo: Edital"
+
+
+def test_resultado_hibrido_pagina_sem_repetir(indice):
+    resultado = ResultadoLocal(indice, "bolsa", vetor=[0, 0, 1, 0], janela=3)
+
+    ids = [hit["_id"] for pagina in (1, 2) for hit in resultado.pagina(pagina, 2)]
+
+    assert resultado.total == len(ids) == len(set(ids)) == 3
+    destacados = [hit for hit in resultado.pagina(1, 2) if hit["_id"] != "portaria"]
+    assert all("<mark>bolsa</mark>" in hit["highlight"]["conteudo"][0] for hit in destacados)
+
+
+def test_depois_da_janela_so_o_texto(indice):
+    # A portaria só é encontrada pelo kNN e fica fora da janela de fusão
+    resultado = ResultadoLocal(indice, "bolsa", vetor=[0, 0, 1, 0], janela=1)
+
+    ids = [hit["_id"] for hit in resultado.pagina(1, 10)]
+
+    assert sorted(ids) == ["auxilio", "edital"]
+
+
+def test_nova_versao_poda_as_ementas_sob_o_lock_do_leitor(indice):
+    escritor = EscritorIndiceLocal(indice.pasta, dimensao=DIMENSAO)
+    escritor.leitor.gravar_ementas({"edital": {"ementa": "Tipo: Edital"}, "portaria": {"ementa": "Tipo: Portaria"}})
+    escritor.remover("portaria")
+
+    # Enquanto uma ementa é gravada pelo leitor, a nova versão espera
+    with escritor.leitor._lock:
+        gravacao = threading.Thread(target=escritor.salvar)
+        gravacao.start()
+        gravacao.join(0.2)
+        assert gravacao.is_alive()
+    gravacao.join()
+
+    assert set(escritor.leitor.atual().ementas) == {"edital"}
+    assert indice.documento("edital")["_source"]["ementa"] == "Tipo: Edital"
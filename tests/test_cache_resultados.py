@@ -0,0 +1,41 @@
+from cache_resultados import CacheResultados
+
+
+class _Valor:
+    def __init__(self):
+        self.fechado = False
+
+    def fechar(self):
+        self.fechado = True
+
+
+def test_cache_descarta_quando_a_geracao_muda():
+    geracao = [1]
+    cache = CacheResultados(lambda: geracao[0], intervalo_geracao=0)
+    primeiro = cache.obter_ou_criar("bolsa", _Valor)
+
+    assert cache.obter_ou_criar("bolsa", _Valor) is primeiro
+    geracao[0] = 2
+    segundo = cache.obter_ou_criar("bolsa", _Valor)
+
+    assert segundo is not primeiro and primeiro.fechado
+    assert (cache.acertos, cache.faltas) == (1, 2)
+
+
+def test_cache_expira_e_respeita_o_limite():
+    cache = CacheResultados(lambda: 0, ttl=0, intervalo_geracao=0)
+    primeiro = cache.obter_ou_criar("bolsa", _Valor)
+    assert cache.obter_ou_criar("bolsa", _Valor) is not primeiro and primeiro.fechado
+
+    cache = CacheResultados(lambda: 0, max_buscas=2)
+    valores = [cache.obter_ou_criar(chave, _Valor) for chave in "abc"]
+    assert [valor.fechado for valor in valores] == [True, False, False]
+
+
+def test_invalidar():
+    cache = CacheResultados(lambda: 0)
+    valor = cache.obter_ou_criar("bolsa", _Valor)
+    cache.invalidar()
+
+    assert valor.fechado
+    assert cache.obter_ou_criar("bolsa", _Valor) is not valor
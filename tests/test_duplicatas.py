@@ -0,0 +1,193 @@
+import numpy as np
+
+from duplicatas import (
+    LIMIAR_SIMILARIDADE, DetectorDuplicatas, IndiceDuplicatas, assinatura, comparar_textos, mesclar_ementas,
+    reaproveitar_vetores, similaridade
+)
+
+
+def _texto(semente: int, frases: int = 30) -> str:
+    """Frases de 10 palavras; sementes diferentes não têm palavras em comum"""
+    return " ".join(" ".join(f"s{semente}f{f}p{p}" for p in range(9)) + f" s{semente}f{f}fim." for f in range(frases))
+
+
+def _alterar_frase(texto: str, frase: int) -> str:
+    frases = texto.split(". ")
+    frases[frase] = " ".join(f"nova{p}" for p in range(10))
+    return ". ".join(frases)
+
+
+# ---------------------------------------------
+# Assinaturas e LSH
+# ---------------------------------------------
+
+def test_assinatura_estima_a_similaridade():
+    original = _texto(1)
+    copia = _alterar_frase(original, 28)
+
+    assert similaridade(assinatura(original), assinatura(original)) == 1.0
+    assert similaridade(assinatura(original), assinatura(copia)) >= LIMIAR_SIMILARIDADE
+    assert similaridade(assinatura(original), assinatura(_texto(2))) < 0.1
+    assert assinatura("   ...  ") is None
+
+
+def test_copia_se_liga_ao_canonico(tmp_path):
+    indice = IndiceDuplicatas(str(tmp_path / "duplicatas.npz"))
+    original = _texto(1)
+
+    assert indice.registrar("a", "a.pdf", assinatura(original)) == (None, 0.0)
+    canonico, nota = indice.registrar("b", "b.pdf", assinatura(_alterar_frase(original, 28)))
+    assert canonico == "a" and nota >= LIMIAR_SIMILARIDADE
+    assert indice.registrar("c", "c.pdf", assinatura(_texto(2)))[0] is None
+    assert indice.total_duplicatas == 1
+
+
+def test_remover_o_canonico_religa_as_copias(tmp_path):
+    indice = IndiceDuplicatas(str(tmp_path / "duplicatas.npz"))
+    original = _texto(1)
+    indice.registrar("a", "a.pdf", assinatura(original))
+    indice.registrar("b", "b.pdf", assinatura(_alterar_frase(original, 28)))
+    indice.registrar("c", "c.pdf", assinatura(_alterar_frase(original, 27)))
+
+    indice.remover("a")
+
+    # A primeira cópia vira canônico e a outra passa a apontar para ela
+    assert indice.canonico("b") is None
+    assert indice.canonico("c") == "b"
+    assert indice.procurar(assinatura(original))[0] == "b"
+
+
+def test_salvar_e_carregar(tmp_path):
+    caminho = str(tmp_path / "duplicatas.npz")
+    indice = IndiceDuplicatas(caminho)
+    original = _texto(1)
+    indice.registrar("a", "a.pdf", assinatura(original))
+    indice.registrar("b", "b.pdf", assinatura(_alterar_frase(original, 28)))
+    indice.salvar()
+
+    lido = IndiceDuplicatas.carregar(caminho)
+
+    assert lido.canonicos == {"a": None, "b": "a"}
+    assert lido.arquivos == {"a": "a.pdf", "b": "b.pdf"}
+    assert lido.procurar(assinatura(original))[0] == "a"
+    assert IndiceDuplicatas.carregar(str(tmp_path / "outro.npz")).assinaturas == {}
+
+
+# ---------------------------------------------
+# Detector do indexador
+# ---------------------------------------------
+
+def _acao(doc_id: str, conteudo: str) -> dict:
+    return {"_op_type": "index", "_id": doc_id, "_source": {"arquivo": f"{doc_id}.pdf", "conteudo": conteudo}}
+
+
+def test_assinatura_so_entra_no_indice_quando_confirmada(tmp_path):
+    indice = IndiceDuplicatas(str(tmp_path / "duplicatas.npz"))
+    detector = DetectorDuplicatas(indice)
+    original = _texto(1)
+
+    list(detector.marcar([_acao("a", original), _acao("b", _alterar_frase(original, 28))]))
+
+    # As cópias do mesmo lote já se ligam ao canônico ainda não confirmado
+    assert detector.canonico_pendente("b") == "a"
+    assert indice.assinaturas == {}
+
+    detector.confirmar(True, "index", "a")
+    detector.confirmar(True, "index", "b")
+    assert indice.canonicos == {"a": None, "b": "a"}
+
+
+def test_canonico_recusado_nao_fica_no_indice(tmp_path):
+    indice = IndiceDuplicatas(str(tmp_path / "duplicatas.npz"))
+    detector = DetectorDuplicatas(indice)
+    original = _texto(1)
+    list(detector.marcar([_acao("a", original), _acao("b", _alterar_frase(original, 28))]))
+
+    detector.confirmar(False, "index", "a")
+    list(detector.marcar([_acao("c", _alterar_frase(original, 27))]))
+    detector.confirmar(True, "index", "b")
+    detector.confirmar(True, "index", "c")
+
+    # A cópia confirmada vira o canônico; ninguém aponta para o documento recusado
+    assert "a" not in indice.assinaturas
+    assert indice.canonicos == {"b": None, "c": "b"}
+
+
+def test_documento_alterado_nao_se_liga_a_si_mesmo(tmp_path):
+    indice = IndiceDuplicatas(str(tmp_path / "duplicatas.npz"))
+    original = _texto(1)
+    indice.registrar("a", "a.pdf", assinatura(original))
+    detector = DetectorDuplicatas(indice)
+
+    list(detector.marcar([_acao("a", _alterar_frase(original, 28))]))
+    detector.confirmar(True, "index", "a")
+
+    assert detector.canonico_pendente("a") is None
+    assert indice.canonicos == {"a": None}
+
+
+def test_remocao_so_sai_do_indice_quando_confirmada(tmp_path):
+    indice = IndiceDuplicatas(str(tmp_path / "duplicatas.npz"))
+    indice.registrar("a", "a.pdf", assinatura(_texto(1)))
+    detector = DetectorDuplicatas(indice)
+
+    detector.confirmar(False, "delete", "a")
+    assert "a" in indice.assinaturas
+    detector.confirmar(True, "delete", "a")
+    assert "a" not in indice.assinaturas
+
+
+# ---------------------------------------------
+# Diferenças e reaproveitamento
+# ---------------------------------------------
+
+def test_comparar_textos_traz_so_as_secoes_alteradas():
+    original = _texto(1)
+    copia = _alterar_frase(original, 28)
+
+    comparacao = comparar_textos(original, copia)
+
+    assert len(comparacao["secoes"]) == 1
+    assert comparacao["secoes"][0].startswith("s1f27p0")
+    assert "nova0" in comparacao["secoes"][0]
+    assert comparacao["proporcao"] == 20 / 600
+    assert comparacao["blocos"] == [(0, 0, 280), (290, 290, 10)]
+
+
+def test_reaproveita_os_vetores_dos_trechos_iguais():
+    original = _texto(1)
+    comparacao = comparar_textos(original, _alterar_frase(original, 28))
+    vetores = np.arange(4, dtype=np.float32)[:, None] * np.ones((1, 3), dtype=np.float32)
+
+    reaproveitados = reaproveitar_vetores(comparacao, 300, 300, vetores)
+
+    # O último trecho (palavras 240 a 300) contém a frase alterada
+    assert sorted(reaproveitados) == [0, 1, 2]
+    assert all(np.array_equal(reaproveitados[i], vetores[i]) for i in reaproveitados)
+
+
+def test_trechos_deslocados_nao_sao_reaproveitados():
+    original = _texto(1)
+    comparacao = comparar_textos(original, " ".join(f"extra{p}" for p in range(50)) + ". " + original)
+
+    assert reaproveitar_vetores(comparacao, 350, 300, np.zeros((4, 3), dtype=np.float32)) == {}
+
+
+def test_trechos_de_outros_parametros_nao_sao_reaproveitados():
+    original = _texto(1)
+    comparacao = comparar_textos(original, original)
+
+    assert reaproveitar_vetores(comparacao, 300, 300, np.zeros((7, 3), dtype=np.float32)) == {}
+
+
+# ---------------------------------------------
+# Ementas
+# ---------------------------------------------
+
+def test_mesclar_so_substitui_os_campos_alteraveis():
+    canonico = "Tipo: Edital\nObjetivo: Selecionar monitores\nPrazos: Inscrições até 10/03"
+    alteracoes = "Tipo: Retificação\nObjetivo: Corrigir o edital\nPrazos: Inscrições até 20/03\nValor do benefício: R$ 400"
+
+    assert mesclar_ementas(canonico, alteracoes) == (
+        "Tipo: Edital\nObjetivo: Selecionar monitores\nPrazos: Inscrições até 20/03\nValor do benefício: R$ 400"
+    )
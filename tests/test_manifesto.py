@@ -0,0 +1,122 @@
+import os
+
+from es_memoria import ElasticsearchMemoria
+from manifesto import Manifesto, gerar_id_documento, hash_arquivo
+from indexar_pdfs import criar_confirmacao, remover_documentos
+
+
+def _escrever(pasta, nome, conteudo: bytes, mtime=None):
+    caminho = os.path.join(pasta, nome)
+    with open(caminho, "wb") as f:
+        f.write(conteudo)
+    if mtime is not None:
+        os.utime(caminho, (mtime, mtime))
+    return caminho
+
+
+def _indexar(manifesto, alterados):
+    for entrada in alterados:
+        manifesto.registrar(entrada)
+
+
+def test_arquivos_novos_sao_alterados(tmp_path):
+    caminho = _escrever(tmp_path, "a.pdf", b"conteudo a")
+    manifesto = Manifesto(str(tmp_path / "manifesto.json"))
+
+    alterados, removidos = manifesto.comparar([caminho])
+
+    assert [entrada["arquivo"] for entrada in alterados] == ["a.pdf"]
+    assert alterados[0]["hash"] == hash_arquivo(caminho)
+    assert alterados[0]["doc_id"] == gerar_id_documento("a.pdf")
+    assert removidos == []
+
+
+def test_arquivo_sem_mudanca_nao_e_relido(tmp_path):
+    caminho = _escrever(tmp_path, "a.pdf", b"conteudo a")
+    manifesto = Manifesto(str(tmp_path / "manifesto.json"))
+    _indexar(manifesto, manifesto.comparar([caminho])[0])
+
+    assert manifesto.comparar([caminho]) == ([], [])
+
+
+def test_arquivo_tocado_so_atualiza_o_mtime(tmp_path):
+    caminho = _escrever(tmp_path, "a.pdf", b"conteudo a", mtime=1_000_000)
+    manifesto = Manifesto(str(tmp_path / "manifesto.json"))
+    _indexar(manifesto, manifesto.comparar([caminho])[0])
+
+    os.utime(caminho, (2_000_000, 2_000_000))
+    alterados, removidos = manifesto.comparar([caminho])
+
+    assert alterados == [] and removidos == []
+    assert manifesto.entradas["a.pdf"]["mtime"] == 2_000_000
+
+
+def test_conteudo_alterado_e_arquivo_removido(tmp_path):
+    a = _escrever(tmp_path, "a.pdf", b"conteudo a", mtime=1_000_000)
+    b = _escrever(tmp_path, "b.pdf", b"conteudo b")
+    manifesto = Manifesto(str(tmp_path / "manifesto.json"))
+    _indexar(manifesto, manifesto.comparar([a, b])[0])
+
+    _escrever(tmp_path, "a.pdf", b"conteudo a, retificado", mtime=2_000_000)
+    alterados, removidos = manifesto.comparar([a])
+
+    assert [entrada["arquivo"] for entrada in alterados] == ["a.pdf"]
+    assert [entrada["arquivo"] for entrada in removidos] == ["b.pdf"]
+    assert removidos[0]["doc_id"] == gerar_id_documento("b.pdf")
+
+
+def test_salvar_e_carregar(tmp_path):
+    caminho = _escrever(tmp_path, "a.pdf", b"conteudo a")
+    arquivo_manifesto = str(tmp_path / "cache" / "manifesto.json")
+    manifesto = Manifesto(arquivo_manifesto)
+    _indexar(manifesto, manifesto.comparar([caminho])[0])
+    manifesto.salvar()
+
+    carregado = Manifesto.carregar(arquivo_manifesto)
+
+    assert carregado.entradas == manifesto.entradas
+    assert carregado.comparar([caminho]) == ([], [])
+
+
+def test_so_documentos_confirmados_entram_no_manifesto(tmp_path):
+    a = _escrever(tmp_path, "a.pdf", b"conteudo a")
+    b = _escrever(tmp_path, "b.pdf", b"conteudo b")
+    manifesto = Manifesto(str(tmp_path / "manifesto.json"))
+    alterados, _ = manifesto.comparar([a, b])
+    ao_confirmar, totais = criar_confirmacao(alterados, manifesto)
+
+    ao_confirmar(True, {"index": {"_id": gerar_id_documento("a.pdf"), "status": 201}})
+    ao_confirmar(False, {"index": {"_id": gerar_id_documento("b.pdf"), "status": 500, "error": "falha"}})
+
+    assert list(manifesto.entradas) == ["a.pdf"]
+    assert totais["processados"] == 1
+    # O que falhou continua pendente na próxima comparação
+    assert [entrada["arquivo"] for entrada in manifesto.comparar([a, b])[0]] == ["b.pdf"]
+
+
+class _FalhaAoRemover(ElasticsearchMemoria):
+    """Elasticsearch em memória que recusa a remoção de alguns documentos"""
+
+    def __init__(self, falhas):
+        super().__init__()
+        self.falhas = falhas
+
+    def bulk(self, operations, **parametros):
+        resposta = super().bulk(operations, **parametros)
+        for item in resposta["items"]:
+            if item["delete"]["_id"] in self.falhas:
+                item["delete"].update(status=500, error={"type": "falha"})
+        resposta["errors"] = any(item["delete"]["status"] >= 300 for item in resposta["items"])
+        return resposta
+
+
+def test_so_remocoes_confirmadas_saem_do_manifesto(tmp_path):
+    caminhos = [_escrever(tmp_path, nome, nome.encode()) for nome in ("a.pdf", "b.pdf")]
+    manifesto = Manifesto(str(tmp_path / "manifesto.json"))
+    _indexar(manifesto, manifesto.comparar(caminhos)[0])
+    _, removidos = manifesto.comparar([])
+
+    remover_documentos(_FalhaAoRemover({gerar_id_documento("b.pdf")}), manifesto, removidos)
+
+    # O b.pdf continua no manifesto e é removido de novo na próxima execução
+    assert [entrada["arquivo"] for entrada in manifesto.comparar([])[1]] == ["b.pdf"]
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+import quantizacao
+from quantizacao import ArmazemVetores, mapeamento_vetor, nota_cosseno, quantizar, recall, reescorar
+
+
+def test_quantizar_usa_a_faixa_inteira_e_preserva_a_direcao():
+    vetores = np.random.default_rng(1).normal(size=(5, 32)).astype(np.float32)
+
+    quantizados = quantizar(vetores)
+
+    assert quantizados.dtype == np.int8
+    assert np.all(np.abs(quantizados).max(axis=1) == 127)
+    cossenos = np.sum(vetores * quantizados, axis=1) / (
+        np.linalg.norm(vetores, axis=1) * np.linalg.norm(quantizados.astype(np.float32), axis=1))
+    assert np.all(cossenos > 0.999)
+
+
+def test_quantizar_vetor_nulo():
+    assert not quantizar(np.zeros(8)).any()
+
+
+def test_mapeamento_do_vetor_do_documento_nao_indexado():
+    assert mapeamento_vetor("byte", 8, indexado=False) == {
+        "type": "dense_vector", "dims": 8, "index": False, "element_type": "byte"}
+    assert mapeamento_vetor("float", 8)["index"] is True
+
+
+def test_nota_cosseno_na_escala_do_elasticsearch():
+    consulta = np.array([1.0, 0.0], dtype=np.float32)
+    vetores = np.array([[0.0, 3.0], [2.0, 0.0]], dtype=np.float32)
+
+    assert nota_cosseno(consulta, vetores) == 1.0
+    assert nota_cosseno(consulta, vetores[:1]) == 0.5
+
+
+def test_reescorar_reordena_pelos_vetores_completos(tmp_path):
+    armazem = ArmazemVetores(str(tmp_path), dimensao=2)
+    armazem.guardar("a", [[0.0, 1.0]])
+    armazem.guardar("b", [[1.0, 0.1], [0.0, 1.0]])
+    hits = [{"_id": "a", "_score": 0.9}, {"_id": "b", "_score": 0.8}, {"_id": "c", "_score": 0.85}]
+
+    reordenados = reescorar(hits, [1.0, 0.0], armazem)
+
+    assert [hit["_id"] for hit in reordenados] == ["b", "c", "a"]
+    # Quem não está no armazém mantém a nota da primeira fase
+    assert reordenados[1]["_score"] == 0.85
+
+
+def test_armazem_compacta_e_recarrega(tmp_path):
+    armazem = ArmazemVetores(str(tmp_path), dimensao=2)
+    armazem.guardar("a", [[1.0, 0.0]])
+    armazem.guardar("b", [[0.0, 1.0]])
+    armazem.guardar("a", [[0.5, 0.5], [0.2, 0.8]])
+    armazem.guardar("a", [[0.3, 0.7]])
+    armazem.salvar()
+
+    assert armazem.linhas == armazem.linhas_em_uso() == 2
+    lido = ArmazemVetores(str(tmp_path), dimensao=2)
+    assert np.array_equal(lido.vetores("a"), np.float32([[0.3, 0.7]]))
+    assert np.array_equal(lido.vetores("b"), np.float32([[0.0, 1.0]]))
+    assert lido.vetores("c") is None
+
+
+def test_recall():
+    assert recall(["a", "b", "x"], ["a", "b", "c", "d"]) == 0.5
+    assert recall([], []) == 1.0
+
+
+def test_limpar_grava_o_indice_vazio_antes_de_apagar_os_vetores(tmp_path, monkeypatch):
+    armazem = ArmazemVetores(str(tmp_path), dimensao=2)
+    armazem.guardar("a", [[1.0, 0.0]])
+    armazem.salvar()
+
+    def cair(caminho):
+        raise OSError("queda no meio da limpeza")
+
+    monkeypatch.setattr(quantizacao.os, "remove", cair)
+    with pytest.raises(OSError):
+        armazem.limpar()
+
+    # O índice no disco já não aponta para os vetores que iam ser apagados
+    lido = ArmazemVetores(str(tmp_path), dimensao=2)
+    assert lido.posicoes == {} and lido.linhas == 0
+    assert lido.vetores("a") is None
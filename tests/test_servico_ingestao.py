@@ -0,0 +1,87 @@
+import time
+
+import servico_ingestao
+from servico_ingestao import MAX_TENTATIVAS, EsperaEstabilidade, FilaIngestao
+
+
+def _fila(tmp_path) -> FilaIngestao:
+    return FilaIngestao(str(tmp_path / "fila.sqlite"))
+
+
+def test_tarefa_so_sai_da_fila_quando_concluida(tmp_path):
+    fila = _fila(tmp_path)
+    fila.adicionar("indexar", "a.pdf")
+    fila.adicionar("indexar", "b.pdf")
+    fila.adicionar("ementa", "doc1")
+
+    assert fila.proximas("indexar", 10) == ["a.pdf", "b.pdf"]
+    assert fila.proximas("indexar", 10, excluir={"a.pdf"}) == ["b.pdf"]
+    assert fila.pendentes() == {"indexar": 2, "ementa": 1}
+
+    fila.concluir("indexar", "a.pdf")
+    assert fila.proximas("indexar", 10) == ["b.pdf"]
+    fila.fechar()
+
+
+def test_fila_persiste_entre_execucoes(tmp_path):
+    fila = _fila(tmp_path)
+    fila.adicionar("ementa", "doc1")
+    fila.fechar()
+
+    fila = _fila(tmp_path)
+    assert fila.proximas("ementa", 10) == ["doc1"]
+    fila.fechar()
+
+
+def test_falha_adia_e_desiste_depois_de_max_tentativas(tmp_path, monkeypatch):
+    monkeypatch.setattr(servico_ingestao, "ESPERA_NOVA_TENTATIVA", 0.0)
+    fila = _fila(tmp_path)
+    fila.adicionar("indexar", "a.pdf")
+
+    for _ in range(MAX_TENTATIVAS - 1):
+        fila.falhar("indexar", "a.pdf", RuntimeError("falhou"))
+        assert fila.proximas("indexar", 10) == ["a.pdf"]
+
+    fila.falhar("indexar", "a.pdf", RuntimeError("falhou"))
+    assert fila.proximas("indexar", 10) == []
+    assert fila.pendentes() == {}
+
+    # Reenfileirar recomeça as tentativas
+    fila.adicionar("indexar", "a.pdf")
+    assert fila.proximas("indexar", 10) == ["a.pdf"]
+    fila.fechar()
+
+
+def test_falha_espera_antes_de_voltar(tmp_path):
+    fila = _fila(tmp_path)
+    fila.adicionar("indexar", "a.pdf")
+    fila.falhar("indexar", "a.pdf", "erro")
+
+    assert fila.proximas("indexar", 10) == []
+    assert fila.pendentes() == {"indexar": 1}
+    fila.fechar()
+
+
+def test_arquivo_so_fica_pronto_quando_para_de_mudar(tmp_path):
+    caminho = tmp_path / "novo.pdf"
+    caminho.write_bytes(b"%PDF-1.4")
+    espera = EsperaEstabilidade(segundos_estavel=0.05)
+
+    espera.notificar(str(tmp_path / "notas.txt"))
+    espera.notificar(str(caminho))
+    # A primeira verificação só registra o tamanho e a data
+    assert espera.estaveis() == []
+
+    caminho.write_bytes(b"%PDF-1.4 mais conteudo")
+    assert espera.estaveis() == []
+    time.sleep(0.06)
+    assert espera.estaveis() == [str(caminho)]
+    assert espera.estaveis() == []
+
+
+def test_arquivo_removido_tambem_fica_pronto(tmp_path):
+    espera = EsperaEstabilidade(segundos_estavel=0.0)
+    espera.notificar(str(tmp_path / "sumiu.pdf"))
+
+    assert espera.estaveis() == []
+    assert espera.estaveis() == [str(tmp_path / "sumiu.pdf")]
@@ -0,0 +1,33 @@
+import pytest
+
+from trechos import dividir_em_trechos, juntar_paragrafos
+
+
+def test_trechos_sobrepostos_com_paginas():
+    paginas = [" ".join(f"a{i}" for i in range(60)), " ".join(f"b{i}" for i in range(60))]
+
+    trechos = dividir_em_trechos(paginas, palavras_por_trecho=50, sobreposicao=10)
+
+    assert [len(trecho["texto"].split()) for trecho in trechos] == [50, 50, 40]
+    assert trechos[0]["texto"].split()[-10:] == trechos[1]["texto"].split()[:10]
+    assert [(trecho["pagina_inicio"], trecho["pagina_fim"]) for trecho in trechos] == [(1, 1), (1, 2), (2, 2)]
+
+
+def test_sobreposicao_invalida():
+    with pytest.raises(ValueError):
+        dividir_em_trechos(["texto"], palavras_por_trecho=10, sobreposicao=10)
+
+
+def test_junta_as_linhas_quebradas_pela_pagina():
+    paginas = ["Art. 1º Fica instituído o programa\nde assistência estudantil.\nArt. 2º O auxílio",
+               "será pago mensalmente.\n\nParágrafo único"]
+
+    assert juntar_paragrafos(paginas) == (
+        "Art. 1º Fica instituído o programa de assistência estudantil.\n"
+        "Art. 2º O auxílio será pago mensalmente.\n"
+        "Parágrafo único"
+    )
+
+
+def test_espacos_sao_normalizados():
+    assert juntar_paragrafos(["  muitos    espaços\t aqui.  \n\n\n  fim "]) == "muitos espaços aqui.\nfim"
@@ -0,0 +1,58 @@
+import re
+from typing import Dict, List
+
+# =====================================================
+# ⚙️ CONFIGURAÇÕES DOS TRECHOS
+# =====================================================
+
+# O all-MiniLM-L6-v2 trunca a entrada em 256 word pieces; em português cada
+# palavra vira em média cerca de 2 word pieces no vocabulário do modelo
+PALAVRAS_POR_TRECHO = 100
+
+# Palavras repetidas entre trechos vizinhos, para não cortar frases ao meio
+SOBREPOSICAO = 20
+
+# Fim de parágrafo no texto extraído: linha em branco ou quebra de linha
+# logo depois de uma pontuação final
+_FIM_PARAGRAFO = re.compile(r"\n\s*\n|(?<=[.!?:;])[ \t]*\n")
+
+
+def juntar_paragrafos(paginas: List[str]) -> str:
+    """Texto do documento com um parágrafo por linha.
+
+    O PDF quebra as linhas pela largura da página. Só as quebras que
+    encerram um parágrafo são mantidas; os demais espaços viram um só.
+    """
+    paragrafos = (" ".join(bloco.split()) for bloco in _FIM_PARAGRAFO.split("\n".join(paginas)))
+    return "\n".join(paragrafo for paragrafo in paragrafos if paragrafo)
+
+
+def dividir_em_trechos(paginas: List[str], palavras_por_trecho: int = PALAVRAS_POR_TRECHO,
+                       sobreposicao: int = SOBREPOSICAO) -> List[Dict]:
+    """Divide o texto de um documento em trechos sobrepostos.
+
+    Recebe o texto de cada página e retorna uma lista de dicionários com
+    ``texto``, ``pagina_inicio`` e ``pagina_fim`` (numeração a partir de 1).
+    """
+    if sobreposicao >= palavras_por_trecho:
+        raise ValueError("A sobreposição deve ser menor que o tamanho do trecho")
+
+    # Cada palavra guarda a página de onde veio
+    palavras = []
+    for numero_pagina, texto_pagina in enumerate(paginas, 1):
+        palavras.extend((palavra, numero_pagina) for palavra in texto_pagina.split())
+
+    trechos = []
+    passo = palavras_por_trecho - sobreposicao
+    for inicio in range(0, len(palavras), passo):
+        janela = palavras[inicio:inicio + palavras_por_trecho]
+        trechos.append({
+            "texto": " ".join(palavra for palavra, _ in janela),
+            "pagina_inicio": janela[0][1],
+            "pagina_fim": janela[-1][1],
+        })
+        # A última janela já alcançou o fim do documento
+        if inicio + palavras_por_trecho >= len(palavras):
+            break
+
+    return trechos